@@ -0,0 +1,150 @@
+"""Streaming chat client for the Islamic bot (OpenRouter chat completions).
+
+Completions are requested with ``stream: true`` over one pooled httpx client
+and relayed token by token, so the browser sees the first words as soon as
+the model produces them.  Finished answers to plain text questions are cached
+under a normalized form of the prompt; the bot gets the same handful of FAQ
+questions over and over.  Each user may only have a few completions running
+at once.  If the caller stops iterating (the browser went away), the upstream
+request is closed with it rather than left to finish.
+"""
+import asyncio
+import json
+import re
+import unicodedata
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+if __package__:
+    from .cache import LRUCache
+else:
+    from cache import LRUCache
+
+SYSTEM_PROMPT = (
+    "You are a knowledgeable and respectful Islamic assistant. Answer questions about the Quran, "
+    "Hadith, fiqh, worship, Islamic finance and community life clearly and concisely, cite sources "
+    "where you can, mention differences between schools of thought when they matter, and advise "
+    "consulting a qualified scholar for personal rulings."
+)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question, used as the cache key."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACE_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text)).strip()
+
+
+class BotBusy(Exception):
+    """Raised when a user already has the maximum number of completions running."""
+
+
+class BotError(Exception):
+    """The completion API could not be reached or returned an error."""
+
+
+class ChatBot:
+    def __init__(self, api_url: str, api_key: Optional[str], model: str, timeout: float = 60.0,
+                 max_connections: int = 20, per_user: int = 2, cache_size: int = 1024,
+                 cache_ttl: Optional[float] = 24 * 60 * 60,
+                 instrument: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.per_user = per_user
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.instrument = instrument
+        self.active: Dict[str, int] = {}
+        self.cancelled = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    # --- HTTP client ---
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                max_connections=self.max_connections, max_keepalive_connections=self.max_connections))
+            if self.instrument is not None:
+                transport = self.instrument(transport)
+            # A long answer may stream for a while, but each gap between tokens is short.
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=10.0), transport=transport)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- Per-user limits ---
+    def acquire(self, user_id: str):
+        if self.active.get(user_id, 0) >= self.per_user:
+            raise BotBusy()
+        self.active[user_id] = self.active.get(user_id, 0) + 1
+
+    def release(self, user_id: str):
+        remaining = self.active.get(user_id, 0) - 1
+        if remaining > 0:
+            self.active[user_id] = remaining
+        else:
+            self.active.pop(user_id, None)
+
+    # --- Completions ---
+    def cached_reply(self, message: str) -> Optional[str]:
+        key = normalize_prompt(message)
+        return self.cache.get(key) if key else None
+
+    def _messages(self, message: str, image_url: Optional[str]) -> List[Dict]:
+        content = message
+        if image_url:
+            content = [{"type": "text", "text": message}, {"type": "image_url", "image_url": {"url": image_url}}]
+        return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}]
+
+    async def stream(self, message: str, image_url: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the answer to ``message`` piece by piece as the model produces it.
+
+        A complete text-only answer is cached for ``cached_reply``; a partial
+        one (error or cancellation) never is.
+        """
+        payload = {"model": self.model, "stream": True, "messages": self._messages(message, image_url)}
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        parts: List[str] = []
+        try:
+            async with self.client.stream("POST", self.api_url, json=payload, headers=headers) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise BotError(f"Completion API returned {response.status_code}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue  # blank separators and ": keep-alive" comments
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    error = chunk.get("error")
+                    if error:
+                        raise BotError(str(error.get("message") if isinstance(error, dict) else error))
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except httpx.HTTPError as e:
+            raise BotError(str(e) or e.__class__.__name__) from e
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        key = normalize_prompt(message)
+        if parts and key and not image_url:
+            self.cache.set(key, "".join(parts))
@@ -0,0 +1,138 @@
+"""In-process publish/subscribe hub for live feed updates.
+
+Write paths publish an event once; the hub encodes it once and appends it to
+the queue of every matching subscriber (all of them, or just those filtered on
+the event's ``post_type`` or ``post_id``).  Subscribers are indexed by filter,
+so a publish only touches the connections that want it.  An idle subscriber
+is a deque and an asyncio.Event and costs no task of its own beyond the
+connection handler, which keeps tens of thousands of open streams cheap.
+
+Queues are bounded.  When a slow consumer falls ``queue_size`` events behind,
+the ``drop_oldest`` policy discards its oldest events and reports how many
+it missed with the next event it does get, so the client knows to refetch.
+The ``disconnect`` policy closes the subscription instead.
+"""
+import asyncio
+import itertools
+import json
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+_FilterKey = Tuple[str, str]
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+class Event:
+    __slots__ = ("id", "type", "post_type", "post_id", "payload", "_sse")
+
+    def __init__(self, event_id: int, event_type: str, data: Dict[str, Any], post_type: Optional[str],
+                 post_id: Optional[str]):
+        self.id = event_id
+        self.type = event_type
+        self.post_type = post_type
+        self.post_id = post_id
+        self.payload = json.dumps({"id": event_id, "type": event_type, **data}, default=_default, separators=(",", ":"))
+        self._sse: Optional[bytes] = None
+
+    def sse(self) -> bytes:
+        """The event as a Server-Sent Events frame, encoded once for every subscriber."""
+        if self._sse is None:
+            self._sse = f"id: {self.id}\nevent: {self.type}\ndata: {self.payload}\n\n".encode("utf-8")
+        return self._sse
+
+
+class Subscription:
+    __slots__ = ("hub", "key", "queue", "dropped", "closed", "_wakeup")
+
+    def __init__(self, hub: "EventHub", key: Optional[_FilterKey]):
+        self.hub = hub
+        self.key = key
+        self.queue: Deque[Event] = deque()
+        self.dropped = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+
+    def _push(self, event: Event):
+        if len(self.queue) >= self.hub.queue_size:
+            if self.hub.policy == DISCONNECT:
+                self.close()
+                return
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(event)
+        self._wakeup.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """The next event, or None after ``timeout`` seconds of silence or once closed."""
+        if not self.queue and not self.closed:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed or not self.queue:
+            return None
+        return self.queue.popleft()
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.clear()
+            self._wakeup.set()
+            self.hub._remove(self)
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 64, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown backpressure policy '{policy}'")
+        self.queue_size = queue_size
+        self.policy = policy
+        self._subscribers: Dict[Optional[_FilterKey], Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, post_type: Optional[str] = None, post_id: Optional[str] = None) -> Subscription:
+        """Subscribe to every event, or only those for one post type or one post (``post_id`` wins)."""
+        key = ("post_id", post_id) if post_id else ("post_type", post_type) if post_type else None
+        subscription = Subscription(self, key)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def _remove(self, subscription: Subscription):
+        subs = self._subscribers.get(subscription.key)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscribers[subscription.key]
+
+    def publish(self, event_type: str, data: Dict[str, Any], post_type: Optional[str] = None,
+                post_id: Optional[str] = None) -> Event:
+        event = Event(next(self._ids), event_type, data, post_type, post_id)
+        self.published += 1
+        for key in (None, ("post_type", post_type), ("post_id", post_id)):
+            # Copy: a full queue under the disconnect policy removes its subscriber mid-loop.
+            for subscription in list(self._subscribers.get(key, ())):
+                subscription._push(event)
+        return event
+
+    def close(self):
+        for subs in list(self._subscribers.values()):
+            for subscription in list(subs):
+                subscription.close()
@@ -0,0 +1,290 @@
+"""Hadith corpus: ingestion into a compact on-disk store, paged reads and full-text search.
+
+    python backend/hadith.py --source path/to/editions --out backend/data/hadith
+
+``--source`` holds hadith-api edition files named ``<lang>-<book>.json`` (or
+``.min.json``), e.g. ``ara-bukhari.json`` and ``eng-bukhari.json``.  All
+languages of a book are merged by hadith number.  Per book the store has
+
+* ``<book>.dat``: the hadith records, one compact JSON object each, back to back;
+* ``<book>.idx``: a fixed-width row per hadith (number, section, offset, length),
+  sorted by number;
+
+plus ``search.vocab`` (sorted terms with their postings offsets),
+``search.post`` (uint32 global row ids per term) and ``manifest.json``.  The
+reader memory-maps the data, index and postings files, so a page of hadith or
+a search touches only the bytes it returns and all workers share the page
+cache.  Restart the server after re-ingesting.
+
+Search text is normalized the same way at ingest and query time: case and
+diacritics (including Arabic harakat and tatweel) are dropped and the common
+Arabic letter variants are folded together.
+"""
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+if __package__:
+    from .search import tokenize
+else:
+    from search import tokenize
+
+logger = logging.getLogger("hadith")
+
+INDEX_DTYPE = np.dtype([("number", "<f8"), ("section", "<u4"), ("length", "<u4"), ("offset", "<u8")])
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSION = 64
+
+_EDITION_RE = re.compile(r"^(?P<lang>[a-z]{3})-(?P<book>[a-z0-9]+?)(?:\.min)?\.json$")
+_ARABIC_FOLDS = str.maketrans({"ـ": None, "ٱ": "ا", "ى": "ي", "ة": "ه"})
+
+
+def normalize_terms(text: str) -> List[str]:
+    """Search terms of ``text``: lowercased, without diacritics, Arabic letter variants folded."""
+    # tokenize() already strips combining marks, which covers the harakat and
+    # the hamza carried by alef, waw and yeh after NFKD decomposition.
+    folded = (token.translate(_ARABIC_FOLDS) for token in tokenize(text))
+    return [token for token in folded if token]
+
+
+class CorpusNotIngested(Exception):
+    """Raised when no ingested corpus exists at the configured location."""
+
+
+# --- Ingestion ---
+def _read_editions(source: Path) -> Dict[str, Dict[str, Dict]]:
+    """book -> lang -> edition JSON for every recognised file in ``source``."""
+    editions: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+    for path in sorted(source.glob("*.json")):
+        match = _EDITION_RE.match(path.name)
+        if match is None:
+            logger.warning("Skipping %s: expected <lang>-<book>.json", path.name)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            editions[match["book"]][match["lang"]] = json.load(f)
+    return editions
+
+
+def _merge_book(by_lang: Dict[str, Dict]) -> Tuple[Dict, List[Dict]]:
+    metadata: Dict[str, Any] = {}
+    records: Dict[float, Dict] = {}
+    for lang, edition in sorted(by_lang.items()):
+        meta = edition.get("metadata") or {}
+        if not metadata or lang == "eng":
+            metadata = meta
+        for hadith in edition.get("hadiths", []):
+            number = float(hadith["hadithnumber"])
+            record = records.get(number)
+            if record is None:
+                reference = hadith.get("reference") or {}
+                record = records[number] = {
+                    "number": hadith["hadithnumber"],
+                    "arabic_number": hadith.get("arabicnumber"),
+                    "section": int(reference.get("book") or 0),
+                    "in_section": reference.get("hadith"),
+                    "grades": hadith.get("grades") or [],
+                    "text": {},
+                }
+            if hadith.get("text"):
+                record["text"][lang] = hadith["text"]
+    return metadata, [records[number] for number in sorted(records)]
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def ingest(source: Path, out: Path) -> Dict[str, int]:
+    """Build the store in ``out`` from the edition files in ``source``; returns hadith counts per book."""
+    editions = _read_editions(Path(source))
+    if not editions:
+        raise ValueError(f"No hadith edition files found in {source}")
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    books: Dict[str, Dict] = {}
+    postings: Dict[str, List[int]] = defaultdict(list)
+    row_base = 0
+    for book in sorted(editions):
+        metadata, records = _merge_book(editions[book])
+        index = np.zeros(len(records), dtype=INDEX_DTYPE)
+        blob = bytearray()
+        for row, record in enumerate(records):
+            encoded = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            index[row] = (float(record["number"]), record["section"], len(encoded), len(blob))
+            blob += encoded
+            for term in set(normalize_terms(" ".join(record["text"].values()))):
+                postings[term].append(row_base + row)
+        _write_atomic(out / f"{book}.dat", bytes(blob))
+        _write_atomic(out / f"{book}.idx", index.tobytes())
+
+        details = metadata.get("section_details") or {}
+        sections = {
+            key: {"name": name, "first": (details.get(key) or {}).get("hadithnumber_first"),
+                  "last": (details.get(key) or {}).get("hadithnumber_last")}
+            for key, name in (metadata.get("sections") or {}).items() if name
+        }
+        books[book] = {"name": metadata.get("name") or book, "languages": sorted(editions[book]),
+                       "count": len(records), "row_base": row_base, "sections": sections}
+        row_base += len(records)
+        logger.info("Ingested %d hadith from %s (%s)", len(records), book, ", ".join(sorted(editions[book])))
+
+    terms = sorted(postings)
+    offsets = [0]
+    with open(out / "search.post.tmp", "wb") as f:
+        for term in terms:
+            rows = np.asarray(postings[term], dtype="<u4")  # ascending: rows were appended in order
+            f.write(rows.tobytes())
+            offsets.append(offsets[-1] + len(rows))
+    os.replace(out / "search.post.tmp", out / "search.post")
+    _write_atomic(out / "search.vocab", json.dumps({"terms": terms, "offsets": offsets},
+                                                   ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    # Written last: a reader only trusts files the manifest describes.
+    _write_atomic(out / "manifest.json", json.dumps({"version": 1, "books": books}, ensure_ascii=False,
+                                                    indent=1).encode("utf-8"))
+    return {book: meta["count"] for book, meta in books.items()}
+
+
+# --- Reading ---
+def _map(path: Path) -> Optional[mmap.mmap]:
+    if path.stat().st_size == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _Book:
+    def __init__(self, root: Path, key: str, meta: Dict):
+        self.key = key
+        self.meta = meta
+        self.data = _map(root / f"{key}.dat")
+        self.index = np.memmap(root / f"{key}.idx", dtype=INDEX_DTYPE, mode="r") if meta["count"] else \
+            np.zeros(0, dtype=INDEX_DTYPE)
+
+    def record(self, row: int) -> Dict:
+        entry = self.index[row]
+        offset, length = int(entry["offset"]), int(entry["length"])
+        record = json.loads(self.data[offset:offset + length])
+        record["book"] = self.key
+        return record
+
+
+class HadithCorpus:
+    """Read side of the store; opened lazily so the server starts without a corpus."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._books: Optional[Dict[str, _Book]] = None
+        self._row_bases: List[int] = []
+        self._book_order: List[str] = []
+        self._terms: List[str] = []
+        self._offsets: List[int] = []
+        self._postings: Optional[np.ndarray] = None
+
+    @property
+    def books(self) -> Dict[str, _Book]:
+        if self._books is None:
+            manifest_path = self.root / "manifest.json"
+            if not manifest_path.exists():
+                raise CorpusNotIngested(str(self.root))
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            books = {key: _Book(self.root, key, meta) for key, meta in manifest["books"].items()}
+            self._book_order = sorted(books, key=lambda key: books[key].meta["row_base"])
+            self._row_bases = [books[key].meta["row_base"] for key in self._book_order]
+            with open(self.root / "search.vocab", "r", encoding="utf-8") as f:
+                vocab = json.load(f)
+            self._terms, self._offsets = vocab["terms"], vocab["offsets"]
+            self._postings = np.memmap(self.root / "search.post", dtype="<u4", mode="r") if self._offsets[-1] else \
+                np.zeros(0, dtype="<u4")
+            self._books = books
+        return self._books
+
+    def book(self, key: str) -> _Book:
+        book = self.books.get(key)
+        if book is None:
+            raise KeyError(key)
+        return book
+
+    def list_books(self) -> List[Dict]:
+        return [{"book": key, "name": book.meta["name"], "languages": book.meta["languages"],
+                 "count": book.meta["count"]} for key, book in self.books.items()]
+
+    def page(self, key: str, start: float = 0, limit: int = 20, section: Optional[int] = None) -> List[Dict]:
+        """Up to ``limit`` hadith of a book from number ``start`` on, optionally within one section."""
+        book = self.book(key)
+        rows = np.arange(np.searchsorted(book.index["number"], start, side="left"), len(book.index))
+        if section is not None:
+            rows = rows[book.index["section"][rows] == section]
+        return [book.record(int(row)) for row in rows[:limit]]
+
+    def get(self, key: str, number: float) -> Optional[Dict]:
+        book = self.book(key)
+        row = int(np.searchsorted(book.index["number"], number, side="left"))
+        if row < len(book.index) and book.index["number"][row] == number:
+            return book.record(row)
+        return None
+
+    def _rows_for(self, term: str, prefix: bool) -> np.ndarray:
+        i = bisect.bisect_left(self._terms, term)
+        matches = []
+        while i < len(self._terms) and len(matches) < MAX_PREFIX_EXPANSION:
+            candidate = self._terms[i]
+            if candidate != term and not (prefix and candidate.startswith(term)):
+                break
+            matches.append(self._postings[self._offsets[i]:self._offsets[i + 1]])
+            i += 1
+        if not matches:
+            return np.zeros(0, dtype="<u4")
+        return matches[0] if len(matches) == 1 else np.unique(np.concatenate(matches))
+
+    def search(self, text: str, book: Optional[str] = None, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Hadith containing every term of ``text`` (the last one may be a prefix), in corpus order."""
+        books = self.books
+        terms = list(dict.fromkeys(normalize_terms(text)))
+        rows: Optional[np.ndarray] = None
+        for i, term in enumerate(terms):
+            prefix = i == len(terms) - 1 and len(term) >= MIN_PREFIX_LENGTH
+            found = self._rows_for(term, prefix)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if not len(rows):
+                break
+        if rows is None:
+            rows = np.zeros(0, dtype="<u4")
+        if book is not None:
+            base = self.book(book).meta["row_base"]
+            rows = rows[(rows >= base) & (rows < base + books[book].meta["count"])]
+        results = []
+        for row in rows[offset:offset + limit]:
+            position = bisect.bisect_right(self._row_bases, int(row)) - 1
+            key = self._book_order[position]
+            results.append(books[key].record(int(row) - self._row_bases[position]))
+        return {"total": int(len(rows)), "offset": offset, "limit": limit, "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    root = Path(__file__).parent
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", type=Path, required=True, help="directory of <lang>-<book>.json edition files")
+    parser.add_argument("--out", type=Path, default=root / "data" / "hadith")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ingest(args.source, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Uploaded images: streamed to disk, stored by content hash, resized off the request path.
+
+An upload is written chunk by chunk to a temporary file while it is hashed,
+so memory use does not grow with the image.  The finished file is renamed to
+``originals/<aa>/<sha256>``; uploading the same bytes again finds it there
+and keeps the existing copy.  The downscaled variants (``variants/<aa>/
+<sha256>-<name>.webp``) are produced by a separate process pool, so resizing
+never holds up the event loop, and concurrent requests for one image share
+one job.
+
+Since a name is derived from the content, each URL always serves the same
+bytes and can be cached as immutable.  Pillow is only imported by the resize
+worker: without it uploads and originals still work, there are just no
+variants.  A digest whose variants could not be built (no Pillow, or a file
+that only looks like an image) is remembered, so later requests serve the
+original straight away instead of queueing the same failing job again.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+if __package__:
+    from .cache import LRUCache
+else:
+    from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# name -> longest side in pixels
+VARIANTS = {"thumb": 320, "feed": 1080}
+VARIANT_MEDIA_TYPE = "image/webp"
+MAX_PIXELS = 50_000_000
+# digests whose variants failed to build, kept until restart or eviction
+FAILED_CACHE_SIZE = 10_000
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+class UnsupportedImage(Exception):
+    """Raised when an upload is not a JPEG, PNG, GIF or WebP image."""
+
+
+def sniff_media_type(head: bytes) -> Optional[str]:
+    """The image type the leading bytes of a file identify, whatever the client claimed."""
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(value))
+
+
+def make_variants(original: str, targets: Dict[str, Tuple[str, int]]) -> Dict[str, Tuple[int, int]]:
+    """Write a WebP per ``targets`` entry (name -> (path, longest side)); returns each variant's size.
+
+    Runs in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    sizes = {}
+    with Image.open(original) as image:
+        largest = max(side for _, side in targets.values())
+        # JPEG can decode straight at a reduced scale, which is most of the work saved.
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)  # first frame only for animations
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        for name, (path, side) in targets.items():
+            variant = image.copy()
+            variant.thumbnail((side, side), Image.LANCZOS)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            variant.save(tmp_path, "WEBP", quality=80, method=4)
+            os.replace(tmp_path, path)
+            sizes[name] = variant.size
+    return sizes
+
+
+class ImageStore:
+    def __init__(self, root: Path, max_bytes: int = 10 * 1024 * 1024, workers: int = 2, use_processes: bool = True,
+                 variants: Optional[Dict[str, int]] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.use_processes = use_processes
+        self.variants = dict(VARIANTS if variants is None else variants)
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._failed = LRUCache(maxsize=FAILED_CACHE_SIZE)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-variants")
+        return self._executor
+
+    def shutdown(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # --- Layout ---
+    def original_path(self, digest: str) -> Path:
+        return self.root / "originals" / digest[:2] / digest
+
+    def variant_path(self, digest: str, name: str) -> Path:
+        return self.root / "variants" / digest[:2] / f"{digest}-{name}.webp"
+
+    def media_type(self, digest: str) -> Optional[str]:
+        try:
+            with open(self.original_path(digest), "rb") as f:
+                return sniff_media_type(f.read(12))
+        except FileNotFoundError:
+            return None
+
+    # --- Uploads ---
+    async def save(self, chunks: AsyncIterator[bytes]) -> Tuple[str, bool]:
+        """Store the streamed image; returns its digest and whether it was new.
+
+        Every filesystem call runs in a worker thread, so a slow disk does not
+        hold up other requests while an upload streams in.
+        """
+        tmp_dir = self.root / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f"{uuid.uuid4().hex}.upload"
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        try:
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLarge()
+                    if len(head) < 12:
+                        head += chunk[:12 - len(head)]
+                        if len(head) >= 12 and sniff_media_type(head) is None:
+                            raise UnsupportedImage()  # before reading the rest of the body
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            if sniff_media_type(head) is None:
+                raise UnsupportedImage()
+            key = digest.hexdigest()
+            created = await asyncio.to_thread(self._keep, tmp_path, self.original_path(key))
+            return key, created
+        finally:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+    @staticmethod
+    def _keep(tmp_path: Path, final_path: Path) -> bool:
+        """Move the upload into place unless the same content is already stored."""
+        if final_path.exists():
+            return False
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, final_path)
+        return True
+
+    # --- Variants ---
+    def _missing(self, digest: str) -> Dict[str, Tuple[str, int]]:
+        return {name: (str(self.variant_path(digest, name)), side) for name, side in self.variants.items()
+                if not self.variant_path(digest, name).exists()}
+
+    async def _generate(self, digest: str, targets: Dict[str, Tuple[str, int]]):
+        for path, _ in targets.values():
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, make_variants, str(self.original_path(digest)), targets)
+        except Exception as e:  # a corrupt image or a missing Pillow must not break the upload
+            logger.warning("Could not build variants of image %s: %s", digest, e)
+            self._failed.set(digest, True)
+
+    def ensure_variants(self, digest: str) -> Optional[asyncio.Task]:
+        """Start building any missing variants in the background, or join the job already running."""
+        task = self._inflight.get(digest)
+        if task is None:
+            if self._failed.get(digest) is not None:
+                return None
+            targets = self._missing(digest)
+            if not targets:
+                return None
+            task = asyncio.ensure_future(self._generate(digest, targets))
+            self._inflight[digest] = task
+            task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+        return task
+
+    async def variant(self, digest: str, name: str, wait: float) -> Optional[Path]:
+        """The variant's path, waiting up to ``wait`` seconds for it to be built; None if it is unavailable."""
+        path = self.variant_path(digest, name)
+        if path.exists():
+            return path
+        task = self.ensure_variants(digest)
+        if task is not None:
+            try:
+                # shield: a client giving up must not cancel the job others are waiting on
+                await asyncio.wait_for(asyncio.shield(task), wait)
+            except asyncio.TimeoutError:
+                return None
+        return path if path.exists() else None
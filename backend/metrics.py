@@ -0,0 +1,448 @@
+"""Request, storage and outbound instrumentation, exposed in Prometheus text format.
+
+Everything here is cheap enough to leave on: a request costs one context
+variable, a few dictionary updates and a bisect per histogram.  Metrics live
+in plain dictionaries keyed by label values and are only formatted when
+``/metrics`` is scraped.
+
+Besides the per-route totals, every request carries a ``RequestTimings``
+that the storage helpers, outbound HTTP calls and password hashing add their
+time to, so a slow request can be logged with where its time went.  An
+optional sampler thread also records the event loop's stack while any request
+has been running longer than a threshold; the folded stacks it collects feed
+straight into flamegraph tools.
+"""
+import bisect
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# --- Metric types ---
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        self.function = function
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_number(self.function())}"]
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, labels: LabelValues, value: float):
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (the last one is +Inf), the sum and the total count.
+        self.values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (),
+                function: Optional[Callable[[], float]] = None) -> Counter:
+        return self._add(Counter(name, help, labelnames, function))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._add(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# --- Per-request attribution ---
+class RequestTimings:
+    """Seconds a request spent in each instrumented subsystem."""
+    __slots__ = ("storage", "outbound", "password")
+
+    def __init__(self):
+        self.storage = 0.0
+        self.outbound = 0.0
+        self.password = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+class _StorageTimer:
+    __slots__ = ("metrics", "labels", "io", "started", "io_before")
+
+    def __init__(self, metrics: "Metrics", operation: str, collection: str, io):
+        self.metrics = metrics
+        self.labels = (operation, collection)
+        self.io = io
+
+    def __enter__(self):
+        io = self.io
+        self.io_before = (io.docs_scanned, io.bytes_read, io.bytes_written) if io is not None else None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        metrics = self.metrics
+        metrics.storage_seconds.observe(elapsed, self.labels)
+        if self.io_before is not None:
+            io, (scanned, read, written) = self.io, self.io_before
+            # Storage calls run synchronously on the event loop and background snapshot writes
+            # are counted separately (IOStats.compacted_bytes), so these deltas are this call's alone.
+            if io.docs_scanned != scanned:
+                metrics.storage_scanned.inc(self.labels, io.docs_scanned - scanned)
+            if io.bytes_read != read:
+                metrics.storage_read.inc(self.labels, io.bytes_read - read)
+            if io.bytes_written != written:
+                metrics.storage_written.inc(self.labels, io.bytes_written - written)
+        timings = _current.get()
+        if timings is not None:
+            timings.storage += elapsed
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+# --- Outbound HTTP ---
+class _TimedStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, on_close: Callable[[int], None]):
+        self.inner = inner
+        self.on_close = on_close
+        self.received = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        async for chunk in self.inner:
+            self.received += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.inner.aclose()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.on_close(self.received)
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport to time each call until its body has been read or closed."""
+
+    def __init__(self, metrics: "Metrics", target: str, inner: httpx.AsyncBaseTransport):
+        self.metrics = metrics
+        self.target = target
+        self.inner = inner
+
+    def _record(self, started: float, outcome: str, received: int):
+        elapsed = time.perf_counter() - started
+        self.metrics.outbound_seconds.observe(elapsed, (self.target, outcome))
+        if received:
+            self.metrics.outbound_bytes.inc((self.target,), received)
+        timings = _current.get()
+        if timings is not None:
+            timings.outbound += elapsed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException:
+            self._record(started, "error", 0)
+            raise
+        outcome = f"{response.status_code // 100}xx"
+        stream = _TimedStream(response.stream, lambda received: self._record(started, outcome, received))
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream,
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+# --- Slow request sampling ---
+class StackSampler:
+    """Samples the event loop thread's stack while any request is running past ``threshold`` seconds.
+
+    The loop is shared by every request, so a sample shows what the loop was
+    doing while something was slow: CPU work holding it up, or the selector
+    when the slow request was simply waiting.  Samples are kept as folded
+    stacks (``route;frame;frame count``) per route, at most ``max_stacks``.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.005, max_stacks: int = 5000, max_depth: int = 64):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.stacks: _Tally = _Tally()
+        self.samples = 0
+        self.loop_thread: Optional[int] = None
+        self._active: Dict[int, Tuple[float, str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, key: int, started: float, label: str):
+        if self.loop_thread is None:
+            self.loop_thread = threading.get_ident()
+        self._active[key] = (started, label)
+
+    def end(self, key: int):
+        self._active.pop(key, None)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _stack(self) -> Optional[str]:
+        frame = sys._current_frames().get(self.loop_thread)
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(frames)) if frames else None
+
+    def sample(self):
+        now = time.perf_counter()
+        slow = {label for started, label in list(self._active.values()) if now - started >= self.threshold}
+        if not slow or self.loop_thread is None:
+            return
+        stack = self._stack()
+        if stack is None:
+            return
+        self.samples += 1
+        for label in slow:
+            key = f"{label};{stack}"
+            if key in self.stacks or len(self.stacks) < self.max_stacks:
+                self.stacks[key] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# --- Application metrics ---
+class Metrics:
+    """The application's metric families and the hooks that feed them."""
+
+    def __init__(self, enabled: bool = True, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.registry = registry = Registry()
+        self.requests = registry.counter("http_requests_total", "HTTP requests by route and status.",
+                                         ("method", "route", "status"))
+        self.request_seconds = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                                  ("method", "route"), buckets)
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled.", ("method",))
+        self.slow_requests = registry.counter("http_slow_requests_total", "Requests slower than the slow threshold.",
+                                              ("method", "route"))
+        self.storage_seconds = registry.histogram("storage_operation_duration_seconds",
+                                                  "Time in storage helpers.", ("operation", "collection"), buckets)
+        self.storage_scanned = registry.counter("storage_documents_scanned_total",
+                                                "Documents examined by storage operations.",
+                                                ("operation", "collection"))
+        self.storage_read = registry.counter("storage_read_bytes_total", "Bytes read by storage operations.",
+                                             ("operation", "collection"))
+        self.storage_written = registry.counter("storage_written_bytes_total", "Bytes written by storage operations.",
+                                                ("operation", "collection"))
+        self.outbound_seconds = registry.histogram("outbound_request_duration_seconds",
+                                                   "Outbound HTTP calls, until the body is read.",
+                                                   ("target", "outcome"), buckets)
+        self.outbound_bytes = registry.counter("outbound_received_bytes_total", "Bytes received from outbound calls.",
+                                               ("target",))
+        self.password_seconds = registry.histogram("password_hash_duration_seconds",
+                                                   "Password hashing and verification, queueing included.",
+                                                   ("operation",), buckets)
+
+    def storage(self, operation: str, collection: str, io=None):
+        """Context manager timing one storage helper call; ``io`` is the backend's IOStats."""
+        return _StorageTimer(self, operation, collection, io) if self.enabled else _NULL_TIMER
+
+    def observe_password(self, operation: str, seconds: float):
+        if self.enabled:
+            self.password_seconds.observe(seconds, (operation,))
+            timings = _current.get()
+            if timings is not None:
+                timings.password += seconds
+
+    def transport(self, target: str, inner: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        return TimedTransport(self, target, inner) if self.enabled else inner
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and in-flight counts per route.
+
+    Routes are labelled by their template (``/api/posts/{post_id}``), never the
+    raw path, so label cardinality stays bounded.  Requests slower than
+    ``slow_seconds`` are counted and logged with their timing breakdown.
+    """
+
+    def __init__(self, app, metrics: Metrics, slow_seconds: Optional[float] = None, logger=None,
+                 sampler: Optional[StackSampler] = None):
+        self.app = app
+        self.metrics = metrics
+        self.slow_seconds = slow_seconds
+        self.logger = logger
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.in_flight.inc((method,))
+        started = time.perf_counter()
+        sampler = self.sampler
+        if sampler is not None:
+            sampler.begin(id(timings), started, f"{method} {scope.get('path', '')}")
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            if sampler is not None:
+                sampler.end(id(timings))
+            _current.reset(token)
+            metrics.in_flight.dec((method,))
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            metrics.requests.inc((method, path, str(status)))
+            metrics.request_seconds.observe(elapsed, (method, path))
+            if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+                metrics.slow_requests.inc((method, path))
+                if self.logger is not None:
+                    self.logger.warning(
+                        "Slow request %s %s -> %s in %.3fs (storage %.3fs, outbound %.3fs, password %.3fs)",
+                        method, path, status, elapsed, timings.storage, timings.outbound, timings.password)
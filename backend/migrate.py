@@ -0,0 +1,60 @@
+"""Import the JSON data directory into a SQLite database.
+
+    python backend/migrate.py --data-dir backend/data --db backend/data/app.db
+
+Every collection found in the data directory (snapshot plus any journal) is
+copied into a table of the same name.  Collections that already have rows in
+the database are skipped unless ``--force`` is given, in which case they are
+replaced.  Start the server with ``STORAGE_BACKEND=sqlite`` afterwards.
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+if __package__:
+    from .sqlite_store import SQLiteStore
+    from .storage import JsonStore
+else:
+    from sqlite_store import SQLiteStore
+    from storage import JsonStore
+
+logger = logging.getLogger("migrate")
+
+
+def migrate(data_dir: Path, db_path: Path, collections: Optional[List[str]] = None, force: bool = False) -> dict:
+    """Copy collections from ``data_dir`` into ``db_path``; returns documents copied per collection."""
+    source = JsonStore(data_dir)
+    target = SQLiteStore(db_path)
+    copied = {}
+    try:
+        for name in collections or source.collections():
+            docs = source.all(name)
+            if not force and target.count(name, {}):
+                logger.warning("Skipping %s: the database already has rows (use --force to replace)", name)
+                continue
+            target.replace(name, docs)
+            copied[name] = len(docs)
+            logger.info("Imported %d documents into %s", len(docs), name)
+    finally:
+        target.close()
+    return copied
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    root = Path(__file__).parent
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, default=root / "data")
+    parser.add_argument("--db", type=Path, default=root / "data" / "app.db")
+    parser.add_argument("--collection", dest="collections", action="append",
+                        help="only import this collection (repeatable)")
+    parser.add_argument("--force", action="store_true", help="replace collections that already have rows")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    migrate(args.data_dir, args.db, args.collections, args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Password hashing off the event loop.
+
+bcrypt is deliberately slow CPU work, so running it inside an async handler
+stalls every other request on the worker.  PasswordHasher runs it on a small
+dedicated executor and caps how much work may queue up behind it: once the
+cap is reached new calls fail fast with HasherBusy rather than piling up
+latency for everyone.
+"""
+import asyncio
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+try:
+    import bcrypt
+except ImportError:
+    # Fallback for development
+    import hashlib
+    class bcrypt:
+        @staticmethod
+        def hashpw(password, salt):
+            return hashlib.sha256(password).hexdigest().encode('utf-8')
+        @staticmethod
+        def checkpw(password, hashed):
+            return hashlib.sha256(password).hexdigest().encode('utf-8') == hashed
+        @staticmethod
+        def gensalt(rounds=12):
+            return b'salt'
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+def hash_password(password: str, rounds: int = 12) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """The bcrypt cost factor encoded in ``hashed``, or None if it is not a bcrypt hash."""
+    match = _COST_RE.match(hashed or "")
+    return int(match.group(1)) if match else None
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs hash/verify on a bounded executor.
+
+    ``workers`` hashes run at once and at most ``max_pending`` more wait for a
+    slot.  ``use_processes`` swaps the thread pool for a process pool; threads
+    are usually enough because bcrypt releases the GIL while hashing.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 64, use_processes: bool = False):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_pending:
+            raise HasherBusy()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        cost = hash_cost(hashed)
+        return cost is not None and cost != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,230 @@
+"""Vectorized prayer-time and qibla calculations.
+
+Follows the standard astronomical approach (as used by praytimes.org): solar
+declination and the equation of time give solar noon, and each prayer is the
+hour angle at which the sun reaches the method's depression angle (Fajr,
+Isha), the horizon (Sunrise, Maghrib) or the madhab's shadow ratio (Asr).
+All functions take NumPy arrays and broadcast coordinates (rows) against
+dates (columns), so a year of timetables for many locations is one call.
+
+Times are returned as fractional local hours.  At high latitudes where the sun
+never reaches the twilight angle, Fajr and Isha fall back to the "middle of
+the night" rule; where it never rises or sets at all the value is NaN.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+KAABA_LAT = 21.4225
+KAABA_LNG = 39.8262
+EARTH_RADIUS_KM = 6371.0
+SUNRISE_ANGLE = 0.833  # refraction plus the sun's apparent radius
+
+# fajr/isha are depression angles in degrees; isha_minutes means a fixed
+# interval after Maghrib; maghrib, when set, is an angle instead of sunset.
+METHODS: Dict[str, Dict[str, float]] = {
+    "mwl": {"fajr": 18.0, "isha": 17.0},
+    "isna": {"fajr": 15.0, "isha": 15.0},
+    "egypt": {"fajr": 19.5, "isha": 17.5},
+    "makkah": {"fajr": 18.5, "isha_minutes": 90.0},
+    "karachi": {"fajr": 18.0, "isha": 18.0},
+    "tehran": {"fajr": 17.7, "isha": 14.0, "maghrib": 4.5},
+    "jafari": {"fajr": 16.0, "isha": 14.0, "maghrib": 4.0},
+}
+
+# Shadow length factor for Asr: the shadow equals the object's height (plus
+# its noon shadow) for the majority view, twice that for the Hanafi school.
+MADHABS: Dict[str, int] = {
+    "shafi": 1,
+    "maliki": 1,
+    "hanbali": 1,
+    "standard": 1,
+    "hanafi": 2,
+}
+
+PRAYERS = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+
+def _dsin(x):
+    return np.sin(np.radians(x))
+
+
+def _dcos(x):
+    return np.cos(np.radians(x))
+
+
+def _fix(a, b):
+    return a - b * np.floor(a / b)
+
+
+def julian_day(dates: np.ndarray) -> np.ndarray:
+    """Julian day at 0h UT for an array of ``datetime64[D]``."""
+    return dates.astype("datetime64[D]").astype(np.int64) + 2440587.5
+
+
+def sun_position(jd: np.ndarray):
+    """Return ``(declination, equation_of_time)`` in degrees and hours."""
+    d = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * d, 360.0)
+    q = _fix(280.459 + 0.98564736 * d, 360.0)
+    ecliptic_lng = _fix(q + 1.915 * _dsin(g) + 0.020 * _dsin(2 * g), 360.0)
+    obliquity = 23.439 - 0.00000036 * d
+    right_ascension = _fix(np.degrees(np.arctan2(_dcos(obliquity) * _dsin(ecliptic_lng), _dcos(ecliptic_lng))) / 15.0, 24.0)
+    equation = _fix(q / 15.0 - right_ascension + 12.0, 24.0) - 12.0
+    declination = np.degrees(np.arcsin(_dsin(obliquity) * _dsin(ecliptic_lng)))
+    return declination, equation
+
+
+def resolve_method(method: str) -> Dict[str, float]:
+    params = METHODS.get(method.lower())
+    if params is None:
+        raise ValueError(f"Unknown calculation method '{method}'. Supported: {', '.join(METHODS)}")
+    return params
+
+
+def resolve_madhab(madhab: str) -> int:
+    factor = MADHABS.get(madhab.lower())
+    if factor is None:
+        raise ValueError(f"Unknown madhab '{madhab}'. Supported: {', '.join(MADHABS)}")
+    return factor
+
+
+def compute_times(lat, lng, dates, tz_offset, method: str = "karachi", madhab: str = "shafi") -> Dict[str, np.ndarray]:
+    """Compute prayer times as fractional local hours.
+
+    ``lat``, ``lng`` and ``tz_offset`` (hours east of UTC) are scalars or
+    arrays of shape ``(n,)`` or ``(n, 1)``; ``dates`` is an array of
+    ``datetime64[D]``.  ``tz_offset`` may also be an ``(n, days)`` array when
+    daylight saving changes within the range.  Results have the broadcast
+    shape of coordinates against dates.
+    """
+    params = resolve_method(method)
+    factor = resolve_madhab(madhab)
+
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    if lat.ndim == 1:
+        lat = lat[:, None]
+    if lng.ndim == 1:
+        lng = lng[:, None]
+    tz_offset = np.asarray(tz_offset, dtype=float)
+    if tz_offset.ndim == 1:
+        tz_offset = tz_offset[:, None]
+    jd = julian_day(np.asarray(dates, dtype="datetime64[D]"))[None, :] - lng / (15.0 * 24.0)
+
+    def sun_at(hours):
+        return sun_position(jd + hours / 24.0)
+
+    def noon(hours):
+        _, equation = sun_at(hours)
+        return _fix(12.0 - equation, 24.0)
+
+    def angle_time(angle, hours, before_noon: bool):
+        declination, equation = sun_at(hours)
+        cos_hour_angle = (-_dsin(angle) - _dsin(declination) * _dsin(lat)) / (_dcos(declination) * _dcos(lat))
+        with np.errstate(invalid="ignore"):
+            offset = np.degrees(np.arccos(cos_hour_angle)) / 15.0
+        mid = _fix(12.0 - equation, 24.0)
+        return mid - offset if before_noon else mid + offset
+
+    def asr_time(hours):
+        declination, _ = sun_at(hours)
+        altitude = np.degrees(np.arctan(1.0 / (factor + np.tan(np.radians(np.abs(lat - declination))))))
+        return angle_time(-altitude, hours, before_noon=False)
+
+    times = {
+        "Fajr": angle_time(params["fajr"], 5.0, before_noon=True),
+        "Sunrise": angle_time(SUNRISE_ANGLE, 6.0, before_noon=True),
+        "Dhuhr": noon(12.0),
+        "Asr": asr_time(13.0),
+        "Maghrib": angle_time(params.get("maghrib", SUNRISE_ANGLE), 18.0, before_noon=False),
+    }
+    if "isha_minutes" in params:
+        times["Isha"] = times["Maghrib"] + params["isha_minutes"] / 60.0
+    else:
+        times["Isha"] = angle_time(params["isha"], 18.0, before_noon=False)
+    shape = np.broadcast_shapes(*(t.shape for t in times.values()), tz_offset.shape)
+    times = {name: np.broadcast_to(value, shape).copy() for name, value in times.items()}
+
+    # Night-middle rule: twilight times may not stray further than half the
+    # night from sunrise/sunset, which also fills them in where the sun never
+    # gets deep enough below the horizon.
+    sunset = angle_time(SUNRISE_ANGLE, 18.0, before_noon=False)
+    night = 24.0 - (sunset - times["Sunrise"])
+    portion = np.broadcast_to(night / 2.0, shape)
+    fajr_limit = times["Sunrise"] - portion
+    late_fajr = np.isnan(times["Fajr"]) | (times["Sunrise"] - times["Fajr"] > portion)
+    times["Fajr"] = np.where(late_fajr, fajr_limit, times["Fajr"])
+    if "isha_minutes" not in params:
+        isha_limit = np.broadcast_to(sunset, shape) + portion
+        late_isha = np.isnan(times["Isha"]) | (times["Isha"] - sunset > portion)
+        times["Isha"] = np.where(late_isha, isha_limit, times["Isha"])
+
+    shift = tz_offset - lng / 15.0
+    return {name: times[name] + shift for name in PRAYERS}
+
+
+def format_hours(hours: np.ndarray) -> List:
+    """Format fractional hours as ``HH:MM`` strings (None where undefined), keeping the array shape."""
+    minutes = np.round(np.asarray(hours) * 60.0)
+    valid = ~np.isnan(minutes)
+    minutes = np.where(valid, _fix(np.where(valid, minutes, 0), 1440).astype(np.int64), 0)
+    labels = np.char.add(np.char.zfill((minutes // 60).astype(str), 2),
+                         np.char.add(":", np.char.zfill((minutes % 60).astype(str), 2)))
+    return np.where(valid, labels.astype(object), None).tolist()
+
+
+def qibla_bearing(lat, lng) -> np.ndarray:
+    """Initial great-circle bearing to the Kaaba, degrees clockwise from true north."""
+    phi = np.radians(np.asarray(lat, dtype=float))
+    delta = np.radians(KAABA_LNG - np.asarray(lng, dtype=float))
+    phi_k = np.radians(KAABA_LAT)
+    bearing = np.degrees(np.arctan2(np.sin(delta), np.cos(phi) * np.tan(phi_k) - np.sin(phi) * np.cos(delta)))
+    return _fix(bearing, 360.0)
+
+
+def kaaba_distance_km(lat, lng) -> np.ndarray:
+    """Great-circle (haversine) distance to the Kaaba."""
+    phi = np.radians(np.asarray(lat, dtype=float))
+    phi_k = np.radians(KAABA_LAT)
+    dphi = phi_k - phi
+    dlambda = np.radians(KAABA_LNG - np.asarray(lng, dtype=float))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi) * np.cos(phi_k) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def date_range(start: date, end: date) -> np.ndarray:
+    """Dates from ``start`` through ``end`` inclusive as ``datetime64[D]``."""
+    return np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+
+
+def utc_offsets(tz_name: Optional[str], tz_offset: Optional[float], lng: float, days: Iterable[date]) -> np.ndarray:
+    """UTC offset in hours for each day.
+
+    An IANA zone name wins (so daylight saving is honoured), then a fixed
+    offset, then the solar offset implied by the longitude.
+    """
+    days = list(days)
+    if tz_name:
+        try:
+            zone = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone '{tz_name}'")
+        return np.array([datetime.combine(day, time(12), zone).utcoffset() / timedelta(hours=1) for day in days])
+    if tz_offset is None:
+        tz_offset = round(lng / 15.0)
+    return np.full(len(days), float(tz_offset))
+
+
+def local_today(tz_name: Optional[str], tz_offset: Optional[float], lng: float) -> date:
+    now = datetime.now(dt_timezone.utc)
+    if tz_name:
+        try:
+            return now.astimezone(ZoneInfo(tz_name)).date()
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone '{tz_name}'")
+    offset = round(lng / 15.0) if tz_offset is None else tz_offset
+    return (now + timedelta(hours=offset)).date()
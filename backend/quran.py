@@ -0,0 +1,199 @@
+"""Local Quran text: ingestion into precompressed per-surah files, and range reads.
+
+    python backend/quran.py --arabic quran-uthmani.json --translation en.asad.json \
+        --out backend/data/quran
+
+Both inputs are complete editions in the api.alquran.cloud ``/v1/quran/<edition>``
+format.  Ingestion merges them by ayah into one payload per surah,
+``<n>.json``, plus ``surahs.json`` with the surah list, and writes each
+alongside a gzip (``.gz``) and, when the brotli package is installed, a brotli
+(``.br``) copy.  The server streams the variant the client accepts straight
+from disk.  ``manifest.json`` records a strong ETag per payload and the byte
+span of every ayah, so an ayah range is cut from the file without decoding it.
+Restart the server after re-ingesting.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("quran")
+
+SURAH_FIELDS = ("number", "name", "englishName", "englishNameTranslation", "revelationType")
+AYAH_FIELDS = ("juz", "page", "sajda")
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class QuranNotIngested(Exception):
+    """Raised when no ingested Quran exists at the configured location."""
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_variants(path: Path, data: bytes) -> List[str]:
+    """Write ``data`` and its compressed copies; returns the encodings written."""
+    _write_atomic(path, data)
+    # mtime=0 keeps the gzip bytes, and so any cache keyed on them, stable across re-ingests.
+    _write_atomic(path.with_name(path.name + _SUFFIXES["gzip"]), gzip.compress(data, compresslevel=9, mtime=0))
+    encodings = ["gzip"]
+    if brotli is not None:
+        _write_atomic(path.with_name(path.name + _SUFFIXES["br"]), brotli.compress(data, quality=11))
+        encodings.insert(0, "br")
+    return encodings
+
+
+def _load_edition(path: Path) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        edition = json.load(f)
+    return edition.get("data", edition)
+
+
+def _surah_payload(surah: Dict, translated: Dict, editions: Dict) -> Tuple[bytes, List[List[int]]]:
+    """The merged surah document and the [start, end) byte span of each ayah inside it."""
+    head = {field: surah.get(field) for field in SURAH_FIELDS}
+    head["numberOfAyahs"] = len(surah["ayahs"])
+    head["editions"] = editions
+    translations = {ayah["numberInSurah"]: ayah.get("text") for ayah in translated.get("ayahs", [])}
+
+    # Assembled by hand so the ayah spans are known without re-parsing.
+    out = bytearray(_dumps(head)[:-1] + b',"ayahs":[')
+    spans = []
+    for i, ayah in enumerate(surah["ayahs"]):
+        if i:
+            out += b","
+        record = {"number": ayah["numberInSurah"], "global_number": ayah.get("number"), "arabic": ayah.get("text"),
+                  "translation": translations.get(ayah["numberInSurah"])}
+        record.update({field: ayah.get(field) for field in AYAH_FIELDS if field in ayah})
+        start = len(out)
+        out += _dumps(record)
+        spans.append([start, len(out)])
+    out += b"]}"
+    return bytes(out), spans
+
+
+def ingest(arabic: Path, translation: Path, out: Path) -> int:
+    """Build the store in ``out``; returns the number of surahs written."""
+    arabic_edition, translation_edition = _load_edition(arabic), _load_edition(translation)
+    editions = {"arabic": (arabic_edition.get("edition") or {}).get("identifier"),
+                "translation": (translation_edition.get("edition") or {}).get("identifier")}
+    translated = {surah["number"]: surah for surah in translation_edition.get("surahs", [])}
+    if not arabic_edition.get("surahs"):
+        raise ValueError(f"No surahs found in {arabic}")
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    manifest: Dict[str, Any] = {"version": 1, "editions": editions, "surahs": {}}
+    listing = []
+    for surah in arabic_edition["surahs"]:
+        number = surah["number"]
+        data, spans = _surah_payload(surah, translated.get(number, {}), editions)
+        encodings = _write_variants(out / f"{number}.json", data)
+        manifest["surahs"][str(number)] = {"etag": _etag(data), "size": len(data), "encodings": encodings,
+                                           "spans": spans}
+        listing.append({**{field: surah.get(field) for field in SURAH_FIELDS}, "numberOfAyahs": len(surah["ayahs"])})
+
+    data = _dumps(listing)
+    manifest["list"] = {"etag": _etag(data), "size": len(data), "encodings": _write_variants(out / "surahs.json", data)}
+    # Written last: the reader only serves what the manifest describes.
+    _write_atomic(out / "manifest.json", _dumps(manifest))
+    logger.info("Ingested %d surahs (%s + %s)", len(listing), editions["arabic"], editions["translation"])
+    return len(listing)
+
+
+class Asset:
+    """One stored payload: its identity file, compressed variants and ETag."""
+
+    def __init__(self, path: Path, etag: str, encodings: List[str]):
+        self.path = path
+        self.etag = etag
+        self.encodings = encodings
+
+    def variants(self) -> Dict[Optional[str], Path]:
+        """Path per content encoding, best compression first; None is the uncompressed file."""
+        paths: Dict[Optional[str], Path] = {
+            encoding: self.path.with_name(self.path.name + _SUFFIXES[encoding]) for encoding in self.encodings}
+        paths[None] = self.path
+        return paths
+
+
+class QuranStore:
+    """Read side of the store; the manifest is loaded on first use so the server starts without one."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._manifest: Optional[Dict] = None
+
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            path = self.root / "manifest.json"
+            if not path.exists():
+                raise QuranNotIngested(str(self.root))
+            with open(path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def surah_list(self) -> Asset:
+        entry = self.manifest["list"]
+        return Asset(self.root / "surahs.json", entry["etag"], entry["encodings"])
+
+    def surah(self, number: int) -> Asset:
+        entry = self.manifest["surahs"].get(str(number))
+        if entry is None:
+            raise KeyError(number)
+        return Asset(self.root / f"{number}.json", entry["etag"], entry["encodings"])
+
+    def ayah_range(self, number: int, start: int = 1, end: Optional[int] = None) -> Tuple[bytes, str]:
+        """The surah document holding only ayahs ``start``..``end`` (1-based, inclusive), and its ETag."""
+        entry = self.manifest["surahs"].get(str(number))
+        if entry is None:
+            raise KeyError(number)
+        spans = entry["spans"]
+        end = len(spans) if end is None else end
+        if not 1 <= start <= end <= len(spans):
+            raise ValueError(f"Ayah range must lie within 1-{len(spans)}")
+        head_end, first, last = spans[0][0], spans[start - 1][0], spans[end - 1][1]
+        with open(self.root / f"{number}.json", "rb") as f:
+            head = f.read(head_end)
+            f.seek(first)
+            body = f.read(last - first)
+        return head + body + b"]}", f'{entry["etag"][:-1]}-{start}-{end}"'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    root = Path(__file__).parent
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arabic", type=Path, required=True, help="full Arabic edition (e.g. quran-uthmani)")
+    parser.add_argument("--translation", type=Path, required=True, help="full translation edition (e.g. en.asad)")
+    parser.add_argument("--out", type=Path, default=root / "data" / "quran")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ingest(args.arabic, args.translation, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
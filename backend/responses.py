@@ -0,0 +1,141 @@
+"""Fast-path JSON responses for read endpoints.
+
+Stored posts and comments were validated by their Pydantic model when they
+were written, so re-validating every row on the way out (``Post(**doc)``
+followed by FastAPI's own response_model pass) is pure overhead.  The helpers
+here project a stored document onto a model's fields and encode the result
+directly, with orjson when it is installed.
+
+Static payloads that were compressed ahead of time (see quran.py) are served
+from disk by ``precompressed_response``, which picks the encoding the client
+accepts and answers revalidations with 304.
+"""
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> bytes:
+    """One Server-Sent Events frame carrying ``data`` as JSON."""
+    prefix = f"event: {event}\n".encode("utf-8") if event else b""
+    return prefix + b"data: " + dumps(data) + b"\n\n"
+
+
+class EventStreamResponse(StreamingResponse):
+    """A text/event-stream response that runs ``on_close`` however the stream ends.
+
+    Starlette cancels the body iterator when the client disconnects, possibly
+    before it has started, so cleanup cannot live in the generator alone.
+    """
+    media_type = "text/event-stream"
+
+    def __init__(self, content, on_close: Optional[Callable[[], None]] = None, **kwargs):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(kwargs.pop("headers", None) or {})}
+        super().__init__(content, headers=headers, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """The first of ``available`` (in server preference order) that ``accept_encoding`` allows, else None."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str, wildcard: bool = True) -> bool:
+    """Whether If-None-Match names ``etag``.
+
+    ``wildcard=False`` ignores ``*``, for tags that do not prove the resource exists.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x" and vice versa.
+    return (wildcard and "*" in tags) or _opaque_tag(etag) in (_opaque_tag(tag) for tag in tags)
+
+
+def precompressed_response(request: Request, variants: Dict[Optional[str], Path], etag: str, max_age: int,
+                           media_type: str = "application/json") -> Response:
+    """Serve one of a payload's precompressed files as is.
+
+    ``variants`` maps an encoding (None for the uncompressed file) to its path,
+    in preference order.  Each encoding gets its own strong ETag derived from
+    ``etag``, since the bytes differ.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""),
+                                  [key for key in variants if key is not None])
+    if encoding is not None:
+        etag = f'{etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(variants[encoding], media_type=media_type, headers=headers)
+
+
+def projector(model: Type[BaseModel], exclude: tuple = ()) -> Callable[[Dict], Dict]:
+    """Build a function mapping a stored document onto ``model``'s public fields.
+
+    Fields missing from older documents fall back to the model's static
+    default (or None where the default comes from a factory), so the output
+    has the same keys the model path would produce.
+    """
+    fields = []
+    for name, info in model.model_fields.items():
+        if name in exclude:
+            continue
+        default: Optional[Any] = None if info.default is PydanticUndefined else info.default
+        fields.append((name, default))
+
+    def project(doc: Dict) -> Dict:
+        return {name: doc.get(name, default) for name, default in fields}
+
+    return project
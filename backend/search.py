@@ -0,0 +1,156 @@
+"""In-process inverted index for member search.
+
+Profiles are tokenized per field into a postings map (term -> {user id: weight})
+plus a sorted vocabulary, so a type-ahead query expands its last term by
+prefix with a bisect instead of scanning users.  Updates replace a user's
+postings in place; nothing is rebuilt on the request path.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FIELD_WEIGHTS = {
+    "full_name": 3.0,
+    "skills": 2.0,
+    "interests": 2.0,
+    "country": 1.5,
+    "bio": 1.0,
+}
+
+# Prefix terms shorter than this only match whole words; a one-letter prefix
+# would otherwise expand to a large slice of the vocabulary on every keystroke.
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSION = 256
+PREFIX_PENALTY = 0.5
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip diacritics and split ``text`` into word tokens."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(stripped)
+
+
+def _field_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+
+class MemberSearchIndex:
+    """Ranked, prefix-aware search over user profile fields."""
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.vocabulary: List[str] = []
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.names: Dict[str, str] = {}
+        # updated_at of the newest profile folded in by an incremental sync
+        self.synced_through: Optional[str] = None
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def _terms(self, doc: Dict) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in self.field_weights.items():
+            for token in tokenize(_field_text(doc.get(field))):
+                # Repeats inside a field add a little, but never outrank a better field.
+                terms[token] = terms.get(token, 0.0) + (weight if token not in terms else weight * 0.1)
+        return terms
+
+    def _drop(self, user_id: str):
+        for term in self.doc_terms.pop(user_id, {}):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(user_id, None)
+            if not posting:
+                del self.postings[term]
+                i = bisect.bisect_left(self.vocabulary, term)
+                if i < len(self.vocabulary) and self.vocabulary[i] == term:
+                    del self.vocabulary[i]
+        self.names.pop(user_id, None)
+
+    def add(self, doc: Dict):
+        """Index ``doc``, replacing whatever was indexed for the same user id."""
+        user_id = doc["id"]
+        terms = self._terms(doc)
+        with self.lock:
+            self._drop(user_id)
+            for term, weight in terms.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    bisect.insort(self.vocabulary, term)
+                posting[user_id] = weight
+            self.doc_terms[user_id] = terms
+            self.names[user_id] = (doc.get("full_name") or "").lower()
+
+    def remove(self, user_id: str):
+        with self.lock:
+            self._drop(user_id)
+
+    def rebuild(self, docs: Iterable[Dict]):
+        with self.lock:
+            self.postings = {}
+            self.vocabulary = []
+            self.doc_terms = {}
+            self.names = {}
+            self.synced_through = None
+        for doc in docs:
+            self.add(doc)
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Vocabulary terms matching ``token`` with the multiplier they score at."""
+        matches = [(token, 1.0)] if token in self.postings else []
+        if not prefix or len(token) < MIN_PREFIX_LENGTH:
+            return matches
+        i = bisect.bisect_right(self.vocabulary, token)
+        while i < len(self.vocabulary) and len(matches) < MAX_PREFIX_EXPANSION:
+            term = self.vocabulary[i]
+            if not term.startswith(token):
+                break
+            matches.append((term, PREFIX_PENALTY))
+            i += 1
+        return matches
+
+    def search(self, text: str, limit: int = 20) -> List[str]:
+        """Return up to ``limit`` user ids matching every query term, best first.
+
+        Every term may match as a prefix, so partially typed words still hit.
+        """
+        tokens = list(dict.fromkeys(tokenize(text)))
+        if not tokens:
+            return []
+        with self.lock:
+            scores: Optional[Dict[str, float]] = None
+            # Rarest term first keeps the running intersection small.
+            expansions = sorted((self._expand(token, prefix=True) for token in tokens),
+                                key=lambda terms: sum(len(self.postings[t]) for t, _ in terms))
+            for terms in expansions:
+                term_scores: Dict[str, float] = {}
+                for term, multiplier in terms:
+                    for user_id, weight in self.postings[term].items():
+                        if scores is not None and user_id not in scores:
+                            continue
+                        score = weight * multiplier
+                        if score > term_scores.get(user_id, 0.0):
+                            term_scores[user_id] = score
+                if scores is not None:
+                    term_scores = {uid: scores[uid] + s for uid, s in term_scores.items()}
+                scores = term_scores
+                if not scores:
+                    return []
+            names = self.names
+            best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], names.get(item[0], "")))
+        return [user_id for user_id, _ in best]
@@ -3,33 +3,58 @@ import os
 import logging
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Callable
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import uuid
+import base64
+import asyncio
+import hmac
+import time
+from functools import partial
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, status, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, EmailStr
 import jwt
-import requests
-
-try:
-    import bcrypt
-except ImportError:
-    # Fallback for development
-    import hashlib
-    class bcrypt:
-        @staticmethod
-        def hashpw(password, salt):
-            return hashlib.sha256(password).hexdigest().encode('utf-8')
-        @staticmethod
-        def checkpw(password, hashed):
-            return hashlib.sha256(password).hexdigest().encode('utf-8') == hashed
-        @staticmethod
-        def gensalt():
-            return b'salt'
+
+if __package__:
+    from . import prayer_times, stats, timelines, versions
+    from .bot import BotBusy, BotError, ChatBot
+    from .cache import LRUCache
+    from .events import EventHub
+    from .hadith import CorpusNotIngested, HadithCorpus
+    from .images import VARIANT_MEDIA_TYPE, ImageStore, ImageTooLarge, UnsupportedImage, is_digest
+    from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware, StackSampler
+    from .passwords import HasherBusy, PasswordHasher
+    from .quran import QuranNotIngested, QuranStore
+    from .responses import (EventStreamResponse, FastJSONResponse, etag_matches, precompressed_response,
+                            projector, sse_event)
+    from .search import MemberSearchIndex
+    from .sqlite_store import SQLiteStore
+    from .storage import DuplicateKeyError, IndexSpec, JsonStore, StorageBackend
+    from .upstream import UpstreamCache, UpstreamError
+else:  # started as `uvicorn server:app` from inside backend/
+    import prayer_times
+    import stats
+    import timelines
+    import versions
+    from bot import BotBusy, BotError, ChatBot
+    from cache import LRUCache
+    from events import EventHub
+    from hadith import CorpusNotIngested, HadithCorpus
+    from images import VARIANT_MEDIA_TYPE, ImageStore, ImageTooLarge, UnsupportedImage, is_digest
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware, StackSampler
+    from passwords import HasherBusy, PasswordHasher
+    from quran import QuranNotIngested, QuranStore
+    from responses import (EventStreamResponse, FastJSONResponse, etag_matches, precompressed_response,
+                           projector, sse_event)
+    from search import MemberSearchIndex
+    from sqlite_store import SQLiteStore
+    from storage import DuplicateKeyError, IndexSpec, JsonStore, StorageBackend
+    from upstream import UpstreamCache, UpstreamError
 
 # --- Setup ---
 ROOT_DIR = Path(__file__).parent
@@ -37,37 +62,189 @@ load_dotenv(ROOT_DIR / '.env')
 DATA_DIR = ROOT_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
+# Storage Settings
+# "json" keeps collections in memory with a journal (single worker only);
+# "sqlite" shares one WAL-mode database between any number of workers.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json').lower()
+SQLITE_PATH = os.environ.get('SQLITE_PATH')
+# The JSON backend compacts in the background once a journal reaches this fraction of its snapshot.
+STORAGE_COMPACT_RATIO = float(os.environ.get('STORAGE_COMPACT_RATIO', 1.0))
+STORAGE_COMPACT_MIN_BYTES = int(os.environ.get('STORAGE_COMPACT_MIN_BYTES', 1024 * 1024))
+STORAGE_FSYNC = os.environ.get('STORAGE_FSYNC', 'false').lower() == 'true'
+INDEXES = {
+    "users": [IndexSpec("id", unique=True), IndexSpec("email", unique=True), IndexSpec("created_at", kind="sorted"),
+              IndexSpec("updated_at", kind="sorted")],
+    "posts": [IndexSpec("id", unique=True), IndexSpec("author_id"), IndexSpec("created_at", kind="sorted")],
+    "comments": [IndexSpec("id", unique=True), IndexSpec("post_id"), IndexSpec("created_at", kind="sorted")],
+    "stats": [IndexSpec("id", unique=True)],
+    "follows": [IndexSpec("id", unique=True), IndexSpec("follower_id"), IndexSpec("followee_id")],
+    timelines.COLLECTION: [IndexSpec("id", unique=True)],
+    versions.COLLECTION: [IndexSpec("id", unique=True)],
+}
+
+def create_store(data_dir: Path) -> StorageBackend:
+    if STORAGE_BACKEND == 'sqlite':
+        return SQLiteStore(Path(SQLITE_PATH) if SQLITE_PATH else data_dir / "app.db", indexes=INDEXES)
+    if STORAGE_BACKEND != 'json':
+        raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+    return JsonStore(data_dir, compact_ratio=STORAGE_COMPACT_RATIO, compact_min_bytes=STORAGE_COMPACT_MIN_BYTES,
+                     fsync=STORAGE_FSYNC, indexes=INDEXES)
+
+store = create_store(DATA_DIR)
+member_index = MemberSearchIndex()
+
 # JWT Settings
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-this')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
+# Metrics Settings
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# Requests at least this slow are counted and logged with their storage/outbound/password breakdown.
+METRICS_SLOW_REQUEST_SECONDS = float(os.environ.get('METRICS_SLOW_REQUEST_SECONDS', 1.0))
+# Sample the event loop's stack while any request is past the slow threshold; read GET /metrics/profile.
+METRICS_PROFILE_SLOW = os.environ.get('METRICS_PROFILE_SLOW', 'false').lower() == 'true'
+METRICS_PROFILE_INTERVAL_MS = float(os.environ.get('METRICS_PROFILE_INTERVAL_MS', 5))
+# When set, the metrics endpoints require "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+metrics = Metrics(enabled=METRICS_ENABLED)
+slow_sampler = StackSampler(METRICS_SLOW_REQUEST_SECONDS, interval=METRICS_PROFILE_INTERVAL_MS / 1000) \
+    if METRICS_ENABLED and METRICS_PROFILE_SLOW else None
+
 # OpenRouter Settings
 OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_URL = os.environ.get('OPENROUTER_API_URL', "https://openrouter.ai/api/v1/chat/completions")
+BOT_MODEL = os.environ.get('BOT_MODEL', 'openai/gpt-4o-mini')
+BOT_TIMEOUT_SECONDS = float(os.environ.get('BOT_TIMEOUT_SECONDS', 60))
+BOT_MAX_CONCURRENT_PER_USER = int(os.environ.get('BOT_MAX_CONCURRENT_PER_USER', 2))
+BOT_CACHE_SIZE = int(os.environ.get('BOT_CACHE_SIZE', 1024))
+BOT_CACHE_TTL_SECONDS = float(os.environ.get('BOT_CACHE_TTL_SECONDS', 24 * 60 * 60))
+
+def create_bot(api_url: str = OPENROUTER_API_URL, api_key: Optional[str] = OPENROUTER_API_KEY) -> ChatBot:
+    return ChatBot(api_url, api_key, BOT_MODEL, timeout=BOT_TIMEOUT_SECONDS, per_user=BOT_MAX_CONCURRENT_PER_USER,
+                   cache_size=BOT_CACHE_SIZE, cache_ttl=BOT_CACHE_TTL_SECONDS,
+                   instrument=partial(metrics.transport, "openrouter"))
+
+bot = create_bot()
+
+# Password Hashing Settings
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+PASSWORD_HASH_PROCESSES = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread').lower() == 'process'
+password_hasher = PasswordHasher(rounds=BCRYPT_ROUNDS, workers=PASSWORD_HASH_WORKERS,
+                                 max_pending=PASSWORD_HASH_QUEUE, use_processes=PASSWORD_HASH_PROCESSES)
+
+# Upstream Settings
+UPSTREAM_TTL_SECONDS = float(os.environ.get('UPSTREAM_TTL_SECONDS', 24 * 60 * 60))
+UPSTREAM_STALE_SECONDS = float(os.environ.get('UPSTREAM_STALE_SECONDS', 7 * 24 * 60 * 60))
+UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get('UPSTREAM_TIMEOUT_SECONDS', 10))
+
+def create_upstream(cache_dir: Path) -> UpstreamCache:
+    return UpstreamCache(cache_dir, ttl=UPSTREAM_TTL_SECONDS, stale_ttl=UPSTREAM_STALE_SECONDS,
+                         timeout=UPSTREAM_TIMEOUT_SECONDS, instrument=partial(metrics.transport, "upstream"))
+
+upstream = create_upstream(DATA_DIR / "upstream_cache")
+
+# Hadith Settings
+# Built by `python backend/hadith.py --source <editions dir>`; see hadith.py.
+HADITH_DIR = Path(os.environ.get('HADITH_DIR', DATA_DIR / "hadith"))
+hadith_corpus = HadithCorpus(HADITH_DIR)
+
+# Quran Settings
+# Built by `python backend/quran.py --arabic <edition> --translation <edition>`; see quran.py.
+QURAN_DIR = Path(os.environ.get('QURAN_DIR', DATA_DIR / "quran"))
+# The text never changes between ingests and every payload carries a strong ETag.
+QURAN_CACHE_SECONDS = int(os.environ.get('QURAN_CACHE_SECONDS', 30 * 24 * 60 * 60))
+quran_store = QuranStore(QURAN_DIR)
+
+# Image Settings
+IMAGES_DIR = Path(os.environ.get('IMAGES_DIR', DATA_DIR / "images"))
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(2, os.cpu_count() or 1)))
+IMAGE_PROCESSES = os.environ.get('IMAGE_EXECUTOR', 'process').lower() == 'process'
+# How long a request for a variant that is still being built waits before getting the original.
+IMAGE_VARIANT_WAIT_SECONDS = float(os.environ.get('IMAGE_VARIANT_WAIT_SECONDS', 10))
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+image_store = ImageStore(IMAGES_DIR, max_bytes=IMAGE_MAX_BYTES, workers=IMAGE_WORKERS, use_processes=IMAGE_PROCESSES)
+
+# Timeline Settings
+# Entries kept per home timeline and per author outbox; older posts are still in /api/posts.
+TIMELINE_SIZE = int(os.environ.get('TIMELINE_SIZE', 500))
+# Authors with more followers than this stop fanning posts out; followers pull them at read time.
+TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT', 1000))
+
+# Response Settings
+# Serve list endpoints straight from the stored (already validated) documents
+# instead of rebuilding a Pydantic model per row.
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', 'true').lower() == 'true'
+
+# Live Event Settings
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 64))
+EVENTS_BACKPRESSURE = os.environ.get('EVENTS_BACKPRESSURE', 'drop_oldest').lower()
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+# Subscribers only hear about writes made by their own worker; with a shared
+# SQLite store each worker also tails the store for everyone else's.
+EVENTS_TAIL_SECONDS = float(os.environ.get('EVENTS_TAIL_SECONDS', 1 if STORAGE_BACKEND == 'sqlite' else 0))
+event_hub = EventHub(queue_size=EVENTS_QUEUE_SIZE, policy=EVENTS_BACKPRESSURE)
+published_ids = LRUCache(maxsize=10000)
+
+# Auth Cache Settings
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', 60))
+# Decoded tokens are good until they expire; principals are refreshed every TTL
+# and dropped as soon as their user document is written.
+token_cache = LRUCache(maxsize=AUTH_CACHE_SIZE)
+principal_cache = LRUCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # --- Lifespan Management ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # On startup, check if default admin exists
-    users = read_json("users")
-    if not any(user['email'] == "admin@example.com" for user in users):
-        if not users: # Only create if no users exist at all
-            admin_user = User(
-                email="admin@example.com",
-                full_name="Default Admin",
-                role="admin",
-                is_verified=True,
-                password_hash=hash_password("admin123")
-            )
-            users.append(admin_user.model_dump())
-            write_json("users", users)
+    principal_cache.clear()
+    # On startup, materialize the dashboard counters once if they were never built
+    if await find_one_in_json(stats.COLLECTION, {"id": stats.COUNTERS_ID}) is None:
+        counters = stats.rebuild(read_json("users"), read_json("posts"), read_json("comments"))
+        try:
+            await insert_into_json(stats.COLLECTION, {"id": stats.COUNTERS_ID, **counters})
+        except DuplicateKeyError:
+            pass  # another worker sharing the database built them first
+    # Create the default admin if no users exist at all
+    if await count_in_json("users") == 0:
+        admin_user = User(
+            email="admin@example.com",
+            full_name="Default Admin",
+            role="admin",
+            is_verified=True,
+            password_hash=await hash_password("admin123")
+        )
+        admin_doc = admin_user.model_dump()
+        try:
+            await insert_into_json("users", admin_doc)
+            await record_stats(stats.user_created(admin_doc))
             logger.info("Default admin user created.")
+        except DuplicateKeyError:
+            pass
+    member_index.rebuild([])
+    await sync_member_index()
+    tailer = asyncio.ensure_future(tail_writes()) if EVENTS_TAIL_SECONDS > 0 else None
+    if slow_sampler is not None:
+        slow_sampler.start()
     yield
-    # On shutdown (if needed)
+    if tailer is not None:
+        tailer.cancel()
+    if slow_sampler is not None:
+        slow_sampler.stop()
+    event_hub.close()
+    await upstream.close()
+    await bot.close()
+    password_hasher.shutdown()
+    image_store.shutdown()
+    # On shutdown, fold outstanding journal records into the snapshots
+    store.close()
 
 # Create the main app
 app = FastAPI(title="Islamic Community API", lifespan=lifespan)
@@ -141,6 +318,34 @@ class Comment(BaseModel):
     author_name: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class PrayerLocation(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    timezone: Optional[str] = None
+    tz_offset: Optional[float] = None
+
+class PrayerTimetableRequest(BaseModel):
+    locations: List[PrayerLocation] = Field(min_length=1, max_length=500)
+    year: int = Field(ge=1900, le=2200)
+    month: Optional[int] = Field(None, ge=1, le=12)
+    method: str = "karachi"
+    madhab: str = "shafi"
+
+project_post = projector(Post)
+project_comment = projector(Comment)
+
+class PostWithComments(Post):
+    comments: Optional[List[Comment]] = None
+
+class CommentsBatchRequest(BaseModel):
+    post_ids: List[str] = Field(min_length=1, max_length=100)
+    limit: int = Field(50, ge=1, le=1000)
+
+class BotChatRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=4000)
+    image_url: Optional[str] = None
+    regenerate: bool = False
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -151,56 +356,113 @@ def default_json_serializer(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
+def invalidate_cached(collection_name: str, query: Optional[Dict] = None):
+    """Drop in-process copies of documents a write may have changed."""
+    if collection_name == "users":
+        if query and "id" in query:
+            principal_cache.pop(query["id"])
+        else:
+            principal_cache.clear()
+
 def read_json(collection_name: str) -> List[Dict]:
-    file_path = DATA_DIR / f"{collection_name}.json"
-    if not file_path.exists():
-        return []
-    with open(file_path, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
+    with metrics.storage("all", collection_name, store.io):
+        return store.all(collection_name)
+
+def bump_versions(collection_name: str, keys: List[str]):
+    if not keys:
+        return
+    with metrics.storage("bump", versions.COLLECTION, store.io):
+        versions.bump(store, keys)
 
 def write_json(collection_name: str, data: List[Dict]):
-    file_path = DATA_DIR / f"{collection_name}.json"
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4, default=default_json_serializer)
+    # Threads that vanish with the old documents change as well as those in the new ones.
+    keys = versions.keys_for(collection_name, [*store.all(collection_name), *data]) \
+        if collection_name in versions.SCOPES else versions.keys_for(collection_name, [])
+    with metrics.storage("replace", collection_name, store.io):
+        store.replace(collection_name, data)
+    bump_versions(collection_name, keys)
+    invalidate_cached(collection_name)
 
 async def find_one_in_json(collection_name: str, query: Dict) -> Optional[Dict]:
-    data = read_json(collection_name)
-    for item in data:
-        if all(item.get(k) == v for k, v in query.items()):
-            return item
-    return None
+    with metrics.storage("find_one", collection_name, store.io):
+        return store.find_one(collection_name, query)
+
+async def find_in_json(collection_name: str, query: Dict = {}, limit: int = 50, sort: Optional[tuple] = None,
+                       start: Optional[tuple] = None) -> List[Dict]:
+    with metrics.storage("find", collection_name, store.io):
+        return store.find(collection_name, query, limit, sort, start)
 
-async def find_in_json(collection_name: str, query: Dict = {}, limit: int = 50) -> List[Dict]:
-    data = read_json(collection_name)
-    results = [item for item in data if all(item.get(k) == v for k, v in query.items())]
-    return results[:limit]
+async def find_grouped_in_json(collection_name: str, field: str, values: List[Any], limit: int = 50,
+                               sort: Optional[tuple] = None) -> Dict[Any, List[Dict]]:
+    with metrics.storage("find_grouped", collection_name, store.io):
+        return store.find_grouped(collection_name, field, values, limit, sort)
 
 async def insert_into_json(collection_name: str, document: Dict):
-    data = read_json(collection_name)
-    data.append(document)
-    write_json(collection_name, data)
-
-async def update_in_json(collection_name: str, query: Dict, update_data: Dict):
-    data = read_json(collection_name)
-    for item in data:
-        if all(item.get(k) == v for k, v in query.items()):
-            item.update(update_data.get("$set", {}))
-            item.update({k: item.get(k, 0) + v for k, v in update_data.get("$inc", {}).items()})
-    write_json(collection_name, data)
+    with metrics.storage("insert", collection_name, store.io):
+        store.insert(collection_name, document)
+    bump_versions(collection_name, versions.keys_for(collection_name, [document]))
+    invalidate_cached(collection_name, {"id": document["id"]} if "id" in document else None)
+
+async def update_in_json(collection_name: str, query: Dict, update_data: Dict) -> int:
+    scope = versions.SCOPES.get(collection_name)
+    if scope is None or scope in query:
+        keys = versions.keys_for(collection_name, [query])
+    else:
+        # The query does not name the scope, so look up which scopes it reaches.
+        keys = versions.keys_for(collection_name, store.find(collection_name, query, store.count(collection_name, query)))
+    with metrics.storage("update", collection_name, store.io):
+        matched = store.update(collection_name, query, update_data)
+    if matched:
+        bump_versions(collection_name, keys)
+    invalidate_cached(collection_name, query)
+    return matched
 
 async def count_in_json(collection_name: str, query: Dict = {}) -> int:
-    data = read_json(collection_name)
-    return len([item for item in data if all(item.get(k) == v for k, v in query.items())])
+    with metrics.storage("count", collection_name, store.io):
+        return store.count(collection_name, query)
+
+async def collection_etag(*keys: str) -> str:
+    """ETag for a response built from the data behind these version keys (see versions.py)."""
+    with metrics.storage("etag", versions.COLLECTION, store.io):
+        return versions.etag(store, keys)
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    # Cached copies may be kept, but only used after revalidating with If-None-Match.
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    # Version tags are computed before the lookup, so they cannot tell whether the
+    # resource exists (or the query is valid); "*" gets the full response instead.
+    if etag_matches(request.headers.get("if-none-match"), etag, wildcard=False):
+        return Response(status_code=304, headers=validator_headers(etag))
+    return None
 
 # --- Helper Functions ---
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def record_stats(increments: Dict[str, int]):
+    if increments:
+        await update_in_json(stats.COLLECTION, {"id": stats.COUNTERS_ID}, {"$inc": increments})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+def _hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server is busy, please try again shortly",
+                         headers={"Retry-After": "1"})
+
+async def hash_password(password: str) -> str:
+    started = time.perf_counter()
+    try:
+        hashed = await password_hasher.hash(password)
+    except HasherBusy:
+        raise _hasher_busy()
+    metrics.observe_password("hash", time.perf_counter() - started)
+    return hashed
+
+async def verify_password(password: str, hashed: str) -> bool:
+    started = time.perf_counter()
+    try:
+        valid = await password_hasher.verify(password, hashed)
+    except HasherBusy:
+        raise _hasher_busy()
+    metrics.observe_password("verify", time.perf_counter() - started)
+    return valid
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -208,19 +470,38 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+async def authenticate(token: str) -> User:
+    user_id = token_cache.get(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+        except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid token")
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = await find_one_in_json("users", {"id": user_id})
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+        token_cache.set(token, user_id, expires_at=payload.get("exp"))
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await find_one_in_json("users", {"id": user_id})
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = User(**user)
+        principal_cache.set(user_id, principal)
+    return principal
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate(credentials.credentials)
+
+async def get_stream_user(token: Optional[str] = None,
+                          credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Like get_current_user, but also takes ?token= since EventSource cannot send headers."""
+    if credentials is not None:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await authenticate(token)
 
 # --- Authentication Routes ---
 @api_router.post("/auth/register", response_model=Token)
@@ -233,11 +514,17 @@ async def register(user_data: UserCreate):
         email=user_data.email,
         full_name=user_data.full_name,
         role=user_data.role,
-        password_hash=hash_password(user_data.password)
+        password_hash=await hash_password(user_data.password)
     )
     
     user_doc = user.model_dump()
-    await insert_into_json("users", user_doc)
+    try:
+        await insert_into_json("users", user_doc)
+    except DuplicateKeyError:
+        # A concurrent sign-up with the same email got in while the password was hashing.
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await record_stats(stats.user_created(user_doc))
+    member_index.add(user_doc)
     
     access_token = create_access_token(data={"sub": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -245,8 +532,16 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=Token)
 async def login(login_data: UserLogin):
     user = await find_one_in_json("users", {"email": login_data.email})
-    if not user or not verify_password(login_data.password, user['password_hash']):
+    if not user or not await verify_password(login_data.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    if password_hasher.needs_rehash(user['password_hash']):
+        # Bring the stored hash up to the configured cost while we have the plaintext.
+        try:
+            new_hash = await password_hasher.hash(login_data.password)
+            await update_in_json("users", {"id": user['id']}, {"$set": {"password_hash": new_hash}})
+        except HasherBusy:
+            pass
     
     access_token = create_access_token(data={"sub": user['id']})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -256,11 +551,42 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 # --- User Routes ---
+MEMBER_SYNC_BATCH = 1000
+
+async def sync_member_index():
+    """Index users changed since the last sync, including writes made by other workers."""
+    while True:
+        start = (member_index.synced_through, {}) if member_index.synced_through else None
+        changed = await find_in_json("users", limit=MEMBER_SYNC_BATCH, sort=("updated_at", 1), start=start)
+        for user in changed:
+            member_index.add(user)
+        if len(changed) < MEMBER_SYNC_BATCH or not changed[-1].get('updated_at'):
+            if changed and changed[-1].get('updated_at'):
+                member_index.synced_through = changed[-1]['updated_at']
+            return
+        member_index.synced_through = changed[-1]['updated_at']
+
+@api_router.get("/users", response_model=List[User])
+async def list_users(search: Optional[str] = None, limit: int = Query(20, ge=1, le=100), current_user: User = Depends(get_current_user)):
+    """Ranked member search (prefix-matched for type-ahead), or the newest members without a query."""
+    if search and search.strip():
+        await sync_member_index()
+        users = [await find_one_in_json("users", {"id": user_id}) for user_id in member_index.search(search, limit)]
+        users = [user for user in users if user]
+    else:
+        users = await find_in_json("users", limit=limit, sort=("created_at", -1))
+    return [User(**{k: v for k, v in user.items() if k != 'password_hash'}) for user in users]
+
 @api_router.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str, current_user: User = Depends(get_current_user)):
+async def get_user(user_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    etag = await collection_etag(versions.scope_key("users", user_id))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     user = await find_one_in_json("users", {"id": user_id})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    response.headers.update(validator_headers(etag))
     return User(**{k: v for k, v in user.items() if k != 'password_hash'})
 
 @api_router.put("/users/me", response_model=User)
@@ -272,8 +598,84 @@ async def update_profile(user_data: UserUpdate, current_user: User = Depends(get
         await update_in_json("users", {"id": current_user.id}, {"$set": update_data})
 
     updated_user = await find_one_in_json("users", {"id": current_user.id})
+    member_index.add(updated_user)
+    await record_stats(stats.user_changed(current_user.model_dump(), updated_user))
     return User(**{k: v for k, v in updated_user.items() if k != 'password_hash'})
 
+# --- Follow Routes ---
+def follow_edge_id(follower_id: str, followee_id: str) -> str:
+    return f"{follower_id}:{followee_id}"
+
+async def follower_ids(user_id: str, limit: int) -> List[str]:
+    edges = await find_in_json("follows", {"followee_id": user_id, "active": True}, limit=limit)
+    return [edge["follower_id"] for edge in edges]
+
+async def followed_user(user_id: str, current_user: User) -> Dict:
+    if user_id == current_user.id:
+        raise HTTPException(status_code=400, detail="You cannot follow yourself")
+    followee = await find_one_in_json("users", {"id": user_id})
+    if not followee:
+        raise HTTPException(status_code=404, detail="User not found")
+    return followee
+
+async def set_following(current_user: User, followee: Dict, active: bool) -> Dict:
+    """Flip the follow edge and, only if it actually changed, the counts and home timeline."""
+    edge_id = follow_edge_id(current_user.id, followee["id"])
+    changed = await update_in_json("follows", {"id": edge_id, "active": not active},
+                                   {"$set": {"active": active, "updated_at": datetime.utcnow()}})
+    if active and not changed and await find_one_in_json("follows", {"id": edge_id}) is None:
+        try:
+            now = datetime.utcnow()
+            await insert_into_json("follows", {"id": edge_id, "follower_id": current_user.id,
+                                               "followee_id": followee["id"], "active": True,
+                                               "created_at": now, "updated_at": now})
+            changed = True
+        except DuplicateKeyError:
+            pass  # a concurrent request followed first
+    if changed:
+        step = 1 if active else -1
+        await update_in_json("users", {"id": current_user.id}, {"$inc": {"following_count": step}})
+        await update_in_json("users", {"id": followee["id"]}, {"$inc": {"followers_count": step}})
+        with metrics.storage("follow" if active else "unfollow", timelines.COLLECTION, store.io):
+            if active:
+                timelines.follow(store, current_user.id, followee["id"], bool(followee.get("timeline_pull")),
+                                 TIMELINE_SIZE)
+            else:
+                timelines.unfollow(store, current_user.id, followee["id"])
+    return await find_one_in_json("users", {"id": followee["id"]})
+
+@api_router.get("/users/{user_id}/follow")
+async def get_following(user_id: str, current_user: User = Depends(get_current_user)):
+    edge = await find_one_in_json("follows", {"id": follow_edge_id(current_user.id, user_id)})
+    return {"following": bool(edge and edge["active"])}
+
+@api_router.post("/users/{user_id}/follow", response_model=User)
+async def follow_user(user_id: str, current_user: User = Depends(get_current_user)):
+    followee = await set_following(current_user, await followed_user(user_id, current_user), True)
+    return User(**{k: v for k, v in followee.items() if k != 'password_hash'})
+
+@api_router.delete("/users/{user_id}/follow", response_model=User)
+async def unfollow_user(user_id: str, current_user: User = Depends(get_current_user)):
+    followee = await set_following(current_user, await followed_user(user_id, current_user), False)
+    return User(**{k: v for k, v in followee.items() if k != 'password_hash'})
+
+async def fan_out(post: Dict):
+    """Deliver a new post to its author's and followers' home timelines (see timelines.py)."""
+    author_id = post["author_id"]
+    author = await find_one_in_json("users", {"id": author_id})
+    pulled = bool(author and author.get("timeline_pull"))
+    followers = [] if pulled else await follower_ids(author_id, TIMELINE_FANOUT_LIMIT + 1)
+    if len(followers) > TIMELINE_FANOUT_LIMIT:
+        # Copying every post to this many followers costs more than merging one outbox per read.
+        await update_in_json("users", {"id": author_id}, {"$set": {"timeline_pull": True}})
+        total = await count_in_json("follows", {"followee_id": author_id, "active": True})
+        everyone = await follower_ids(author_id, total)
+        with metrics.storage("pull", timelines.COLLECTION, store.io):
+            timelines.start_pulling(store, author_id, everyone)
+        followers = []
+    with metrics.storage("fan_out", timelines.COLLECTION, store.io):
+        timelines.publish(store, post, [author_id, *followers], TIMELINE_SIZE)
+
 # --- Posts Routes ---
 @api_router.post("/posts", response_model=Post)
 async def create_post(post_data: Dict[str, Any], current_user: User = Depends(get_current_user)):
@@ -288,15 +690,124 @@ async def create_post(post_data: Dict[str, Any], current_user: User = Depends(ge
         tags=post_data.get('tags', [])
     )
     
-    await insert_into_json("posts", post.model_dump())
+    post_doc = post.model_dump()
+    await insert_into_json("posts", post_doc)
     await update_in_json("users", {"id": current_user.id}, {"$inc": {"posts_count": 1}})
+    await record_stats(stats.post_created(post_doc))
+    await fan_out(post_doc)
+    publish_post(post_doc)
     
     return post
 
-@api_router.get("/posts", response_model=List[Post])
-async def get_posts(limit: int = 50, current_user: User = Depends(get_current_user)):
-    posts = await find_in_json("posts", limit=limit)
-    return [Post(**post) for post in sorted(posts, key=lambda p: p['created_at'], reverse=True)]
+def encode_cursor(post: Dict) -> str:
+    raw = json.dumps([post['created_at'], post['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Anything else would reach the index comparisons and fail there.
+    if not isinstance(created_at, str) or not isinstance(post_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, {"id": post_id}
+
+async def comment_previews(post_ids: List[str], limit: int) -> Dict[str, List[Dict]]:
+    """The newest `limit` comments of each post, oldest first, from one grouped lookup."""
+    groups = await find_grouped_in_json("comments", "post_id", post_ids, limit=limit, sort=("created_at", -1))
+    return {post_id: comments[::-1] for post_id, comments in groups.items()}
+
+@api_router.get("/posts", response_model=List[PostWithComments])
+async def get_posts(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    include_comments: int = Query(0, ge=0, le=20),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    author_id: Optional[str] = None,
+    post_type: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Newest-first feed with keyset pagination.
+
+    Pass the X-Next-Cursor header back as `before` for older posts, or
+    X-Prev-Cursor as `after` for posts newer than the current page.
+    `include_comments=N` embeds each post's newest N comments.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    # Versions are read before the data, so a write racing this request can only make the ETag stale, never the body.
+    etag = await collection_etag("posts", "comments") if include_comments else await collection_etag("posts")
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    query = {}
+    if author_id:
+        query["author_id"] = author_id
+    if post_type:
+        query["post_type"] = post_type
+    if tags:
+        query["tags"] = {"$all": [tag for value in tags for tag in value.split(',') if tag]}
+
+    if after:
+        # Walk forward from the cursor, then flip so the page still reads newest-first.
+        posts = await find_in_json("posts", query, limit=limit, sort=("created_at", 1), start=decode_cursor(after))
+        posts.reverse()
+    else:
+        start = decode_cursor(before) if before else None
+        posts = await find_in_json("posts", query, limit=limit, sort=("created_at", -1), start=start)
+
+    headers = validator_headers(etag)
+    if posts:
+        headers["X-Prev-Cursor"] = encode_cursor(posts[0])
+        if len(posts) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(posts[-1])
+    previews = await comment_previews([post['id'] for post in posts], include_comments) if include_comments else {}
+
+    if FAST_RESPONSES:
+        body = []
+        for post in posts:
+            item = project_post(post)
+            item["comments"] = [project_comment(c) for c in previews.get(post['id'], [])] if include_comments else None
+            body.append(item)
+        return FastJSONResponse(body, headers=headers)
+    response.headers.update(headers)
+    if include_comments:
+        return [PostWithComments(**post, comments=previews.get(post['id'], [])) for post in posts]
+    return [PostWithComments(**post) for post in posts]
+
+@api_router.get("/timeline", response_model=List[Post])
+async def get_home_timeline(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """The current user's posts and those of everyone they follow, newest first.
+
+    Reads the bounded timeline buffers rather than the posts collection, so a
+    page costs the same however many posts exist; pass X-Next-Cursor back as
+    `before` for older posts.
+    """
+    start = None
+    if before:
+        created_at, anchor = decode_cursor(before)
+        start = (created_at, anchor["id"])
+    with metrics.storage("home", timelines.COLLECTION, store.io):
+        entries = timelines.home(store, current_user.id, limit, TIMELINE_SIZE, start)
+    found = await find_grouped_in_json("posts", "id", [item[1] for item in entries], limit=1)
+    posts = [found[item[1]][0] for item in entries if found.get(item[1])]
+
+    headers = {}
+    if len(entries) == limit:
+        headers["X-Next-Cursor"] = encode_cursor({"created_at": entries[-1][0], "id": entries[-1][1]})
+    if FAST_RESPONSES:
+        return FastJSONResponse([project_post(post) for post in posts], headers=headers)
+    response.headers.update(headers)
+    return [Post(**post) for post in posts]
 
 @api_router.get("/posts/{post_id}", response_model=Post)
 async def get_post(post_id: str, current_user: User = Depends(get_current_user)):
@@ -319,61 +830,470 @@ async def create_comment(post_id: str, comment_data: Dict[str, Any], current_use
         author_name=current_user.full_name
     )
     
-    await insert_into_json("comments", comment.model_dump())
+    comment_doc = comment.model_dump()
+    await insert_into_json("comments", comment_doc)
     await update_in_json("posts", {"id": post_id}, {"$inc": {"comments_count": 1}})
+    await record_stats(stats.comment_created(comment_doc))
+    publish_comment(comment_doc, {**post, "comments_count": post.get('comments_count', 0) + 1})
     
     return comment
 
 @api_router.get("/posts/{post_id}/comments", response_model=List[Comment])
-async def get_comments(post_id: str, current_user: User = Depends(get_current_user)):
-    comments = await find_in_json("comments", {"post_id": post_id}, limit=1000)
-    return [Comment(**comment) for comment in sorted(comments, key=lambda c: c['created_at'])]
+async def get_comments(post_id: str, request: Request, response: Response,
+                       current_user: User = Depends(get_current_user)):
+    etag = await collection_etag(versions.scope_key("comments", post_id))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    comments = await find_in_json("comments", {"post_id": post_id}, limit=1000, sort=("created_at", 1))
+    if FAST_RESPONSES:
+        return FastJSONResponse([project_comment(comment) for comment in comments], headers=validator_headers(etag))
+    response.headers.update(validator_headers(etag))
+    return [Comment(**comment) for comment in comments]
+
+@api_router.post("/comments/batch", response_model=Dict[str, List[Comment]])
+async def get_comments_batch(request: CommentsBatchRequest, current_user: User = Depends(get_current_user)):
+    """Comments for many posts at once, keyed by post id, each list oldest first."""
+    groups = await comment_previews(request.post_ids, request.limit)
+    if FAST_RESPONSES:
+        return FastJSONResponse({post_id: [project_comment(c) for c in comments] for post_id, comments in groups.items()})
+    return groups
+
+# --- Live Event Routes ---
+def publish_post(post: Dict):
+    published_ids.set(post['id'], True)
+    event_hub.publish("post.created", {"post": project_post(post)}, post_type=post.get('post_type'), post_id=post['id'])
+
+def publish_comment(comment: Dict, post: Dict):
+    published_ids.set(comment['id'], True)
+    event_hub.publish("comment.created", {"comment": project_comment(comment), "comments_count": post.get('comments_count', 0)},
+                      post_type=post.get('post_type'), post_id=post['id'])
+
+EVENTS_TAIL_OVERLAP = timedelta(seconds=5)
+EVENTS_TAIL_BATCH = 500
+
+async def tail_writes():
+    """Publish posts and comments that other workers wrote to the shared store.
+
+    Each pass re-reads a few seconds before the newest document already seen,
+    so a write whose created_at predates its commit is still picked up.  The
+    window is paged through with a (created_at, id) keyset until it runs out,
+    so a burst larger than one batch cannot stall the tail; ids seen inside
+    the window (and published_ids for local writes) keep anything from being
+    announced twice.
+    """
+    watermarks = {"posts": datetime.utcnow(), "comments": datetime.utcnow()}
+    seen: Dict[str, Dict[str, str]] = {"posts": {}, "comments": {}}
+    while True:
+        await asyncio.sleep(EVENTS_TAIL_SECONDS)
+        for collection in ("posts", "comments"):
+            try:
+                window_start = (watermarks[collection] - EVENTS_TAIL_OVERLAP).isoformat()
+                seen[collection] = {doc_id: created_at for doc_id, created_at in seen[collection].items()
+                                    if created_at >= window_start}
+                start = (window_start, {})
+                while True:
+                    docs = await find_in_json(collection, limit=EVENTS_TAIL_BATCH, sort=("created_at", 1), start=start)
+                    for doc in docs:
+                        if doc['id'] in seen[collection]:
+                            continue
+                        seen[collection][doc['id']] = doc['created_at']
+                        if published_ids.get(doc['id']) is not None:
+                            continue
+                        if collection == "posts":
+                            publish_post(doc)
+                        else:
+                            post = await find_one_in_json("posts", {"id": doc['post_id']})
+                            if post:
+                                publish_comment(doc, post)
+                    if docs:
+                        newest = datetime.fromisoformat(docs[-1]['created_at'])
+                        watermarks[collection] = max(watermarks[collection], newest)
+                    if len(docs) < EVENTS_TAIL_BATCH:
+                        break
+                    start = (docs[-1]['created_at'], {"id": docs[-1]['id']})
+            except Exception:
+                logger.exception("Live event tail failed")
+
+@api_router.get("/events")
+async def stream_events(post_type: Optional[str] = None, post_id: Optional[str] = None,
+                        current_user: User = Depends(get_stream_user)):
+    """Server-Sent Events for new posts and comments, optionally for one post type or one post.
+
+    Events are `post.created` and `comment.created`; a `dropped` event tells a
+    client that fell behind how many it missed.  Idle streams get a comment
+    line every EVENTS_HEARTBEAT_SECONDS.
+    """
+    subscription = event_hub.subscribe(post_type=post_type, post_id=post_id)
+
+    async def frames():
+        yield b"retry: 5000\n\n"
+        while not subscription.closed:
+            event = await subscription.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+            if event is None:
+                if not subscription.closed:
+                    yield b": ping\n\n"
+                continue
+            dropped = subscription.take_dropped()
+            if dropped:
+                yield sse_event({"dropped": dropped}, event="dropped")
+            yield event.sse()
+
+    return EventStreamResponse(frames(), on_close=subscription.close)
+
+@api_router.websocket("/ws/events")
+async def websocket_events(websocket: WebSocket, token: str = "", post_type: Optional[str] = None,
+                           post_id: Optional[str] = None):
+    """The /events stream over a WebSocket; pings are `{"type": "ping"}` messages."""
+    try:
+        await authenticate(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = event_hub.subscribe(post_type=post_type, post_id=post_id)
+
+    async def watch_disconnect():
+        # Nothing is expected from the client; reading is how a hang-up is noticed.
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            subscription.close()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        while not subscription.closed:
+            event = await subscription.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+            if event is None:
+                if not subscription.closed:
+                    await websocket.send_text('{"type":"ping"}')
+                continue
+            dropped = subscription.take_dropped()
+            if dropped:
+                await websocket.send_text(json.dumps({"type": "dropped", "dropped": dropped}))
+            await websocket.send_text(event.payload)
+        if not watcher.done():
+            # Closed by the hub (slow consumer or shutdown) rather than by the client.
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        subscription.close()
+
+# --- Dashboard Routes ---
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(days: int = Query(30, ge=1, le=366), current_user: User = Depends(get_current_user)):
+    """Community totals, breakdowns and daily activity from the materialized counters."""
+    counters = await find_one_in_json(stats.COLLECTION, {"id": stats.COUNTERS_ID})
+    return stats.summarize(counters, days=days)
+
+# --- Bot Routes ---
+@api_router.post("/bot/chat")
+async def bot_chat(chat: BotChatRequest, request: Request, current_user: User = Depends(get_current_user)):
+    """Answers a question with the Islamic bot (see bot.py).
+
+    With `Accept: text/event-stream` the answer streams as `data: {"delta": ...}`
+    events and ends with a `done` event carrying the whole response (or an
+    `error` event); otherwise the complete answer is returned as JSON.
+    `regenerate` skips the answer cache.
+    """
+    if not bot.configured:
+        raise HTTPException(status_code=503, detail="The assistant is not configured")
+    # Only URLs the model provider can fetch are forwarded; browser blob: URLs are not.
+    image_url = chat.image_url if chat.image_url and chat.image_url.startswith(("http://", "https://", "data:image/")) else None
+    streaming = "text/event-stream" in request.headers.get("accept", "")
+
+    cached = None if chat.regenerate or image_url else bot.cached_reply(chat.message)
+    if cached is not None:
+        body = {"response": cached, "timestamp": datetime.utcnow().isoformat(), "cached": True}
+        if streaming:
+            return EventStreamResponse(iter([sse_event({"delta": cached}), sse_event(body, event="done")]))
+        return body
+
+    try:
+        bot.acquire(current_user.id)
+    except BotBusy:
+        raise HTTPException(status_code=429, detail="Please wait for your other questions to be answered",
+                            headers={"Retry-After": "1"})
+
+    if streaming:
+        async def events():
+            parts = []
+            try:
+                async for delta in bot.stream(chat.message, image_url):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            except BotError as e:
+                logger.warning("Bot completion failed: %s", e)
+                yield sse_event({"detail": "The assistant is unavailable right now"}, event="error")
+                return
+            yield sse_event({"response": "".join(parts), "timestamp": datetime.utcnow().isoformat(), "cached": False},
+                            event="done")
+
+        # Released however the stream ends, including the browser disconnecting mid-answer.
+        return EventStreamResponse(events(), on_close=lambda: bot.release(current_user.id))
+
+    try:
+        parts = [delta async for delta in bot.stream(chat.message, image_url)]
+    except BotError as e:
+        logger.warning("Bot completion failed: %s", e)
+        raise HTTPException(status_code=502, detail="The assistant is unavailable right now")
+    finally:
+        bot.release(current_user.id)
+    return {"response": "".join(parts), "timestamp": datetime.utcnow().isoformat(), "cached": False}
 
 # --- UmmahAPI Routes ---
 UMMAH_API_BASE_URL = "https://cdn.jsdelivr.net/gh/fawazahmed0/hadith-api@1"
 
 @api_router.get("/asma-ul-husna")
 async def get_asma_ul_husna():
-    """Fetches the 99 names of Allah from the external API."""
+    """Fetches the 99 names of Allah from the external API (cached, see upstream.py)."""
     try:
-        response = requests.get(f"{UMMAH_API_BASE_URL}/api/asma-ul-husna.json")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return await upstream.get_json(f"{UMMAH_API_BASE_URL}/api/asma-ul-husna.json")
+    except UpstreamError as e:
         raise HTTPException(status_code=503, detail=f"Could not fetch data from UmmahAPI: {e}")
 
+# --- Hadith Routes ---
+def _hadith_book(book: str):
+    try:
+        return hadith_corpus.book(book)
+    except CorpusNotIngested:
+        raise HTTPException(status_code=503, detail="The hadith corpus has not been ingested")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Hadith collection not found")
+
+@api_router.get("/hadith")
+async def list_hadith_books():
+    try:
+        return hadith_corpus.list_books()
+    except CorpusNotIngested:
+        raise HTTPException(status_code=503, detail="The hadith corpus has not been ingested")
+
+@api_router.get("/hadith/search")
+async def search_hadith(q: str = Query(..., min_length=1, max_length=200), book: Optional[str] = None,
+                        offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+    """Full-text search over every language of the corpus; diacritics and case are ignored."""
+    if book is not None:
+        _hadith_book(book)
+    try:
+        return hadith_corpus.search(q, book=book, offset=offset, limit=limit)
+    except CorpusNotIngested:
+        raise HTTPException(status_code=503, detail="The hadith corpus has not been ingested")
+
+@api_router.get("/hadith/{book}")
+async def get_hadith_book(book: str):
+    """Collection metadata including its sections and their hadith number ranges."""
+    meta = _hadith_book(book).meta
+    return {"book": book, **{k: v for k, v in meta.items() if k != "row_base"}}
+
+@api_router.get("/hadith/{book}/hadiths")
+async def get_hadith_page(book: str, start: float = Query(0, ge=0), limit: int = Query(20, ge=1, le=100),
+                          section: Optional[int] = None):
+    """A page of a collection from hadith number `start` on, optionally within one section.
+
+    Request `start=next_start` for the following page; it is null on the last one.
+    """
+    _hadith_book(book)
+    hadiths = hadith_corpus.page(book, start=start, limit=limit + 1, section=section)
+    next_start = hadiths[limit]["number"] if len(hadiths) > limit else None
+    return {"book": book, "hadiths": hadiths[:limit], "next_start": next_start}
+
+@api_router.get("/hadith/{book}/hadiths/{number}")
+async def get_hadith(book: str, number: float):
+    _hadith_book(book)
+    hadith = hadith_corpus.get(book, number)
+    if hadith is None:
+        raise HTTPException(status_code=404, detail="Hadith not found")
+    return hadith
+
+# --- Image Routes ---
+def _image_urls(digest: str) -> Dict[str, str]:
+    urls = {"original": f"/api/images/{digest}/original"}
+    urls.update({name: f"/api/images/{digest}/{name}" for name in image_store.variants})
+    return urls
+
+@api_router.post("/images", status_code=201)
+async def upload_image(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    """Upload an image as the raw request body (not multipart), so it streams straight to disk.
+
+    Identical bytes are stored once: re-uploading returns the existing image
+    with 200.  The resized variants are built in the background; point
+    `image_url` at `urls.feed` for posts.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > image_store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Images may be at most {image_store.max_bytes} bytes")
+    try:
+        digest, created = await image_store.save(request.stream())
+    except ImageTooLarge:
+        raise HTTPException(status_code=413, detail=f"Images may be at most {image_store.max_bytes} bytes")
+    except UnsupportedImage:
+        raise HTTPException(status_code=415, detail="Upload a JPEG, PNG, GIF or WebP image")
+    image_store.ensure_variants(digest)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return {"id": digest, "created": created, "urls": _image_urls(digest)}
+
+@api_router.get("/images/{digest}/{variant}")
+async def get_image(digest: str, variant: str, request: Request):
+    """An uploaded image or one of its variants.  Public, so it works in an <img> tag."""
+    if not is_digest(digest) or (variant != "original" and variant not in image_store.variants):
+        raise HTTPException(status_code=404, detail="Image not found")
+    media_type = image_store.media_type(digest)
+    if media_type is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    path, served, cache_control = image_store.original_path(digest), "original", IMAGE_CACHE_CONTROL
+    if variant != "original":
+        built = await image_store.variant(digest, variant, wait=IMAGE_VARIANT_WAIT_SECONDS)
+        if built is not None:
+            path, served, media_type = built, variant, VARIANT_MEDIA_TYPE
+        else:
+            # Stand in with the original, but only briefly: the variant will exist soon.
+            cache_control = "public, max-age=60"
+    etag = f'"{digest[:32]}-{served}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+# --- Quran Routes ---
+_QURAN_NOT_INGESTED = "The Quran text has not been ingested"
+
+@api_router.get("/quran/surahs")
+async def list_surahs(request: Request):
+    try:
+        asset = quran_store.surah_list()
+    except QuranNotIngested:
+        raise HTTPException(status_code=503, detail=_QURAN_NOT_INGESTED)
+    return precompressed_response(request, asset.variants(), asset.etag, QURAN_CACHE_SECONDS)
+
+@api_router.get("/quran/surahs/{number}")
+async def get_surah(request: Request, number: int, start: Optional[int] = Query(None, alias="from", ge=1),
+                    end: Optional[int] = Query(None, alias="to", ge=1)):
+    """A surah with the Arabic text and translation of each ayah, optionally only ayahs `from`..`to`."""
+    try:
+        asset = quran_store.surah(number)
+        if start is None and end is None:
+            return precompressed_response(request, asset.variants(), asset.etag, QURAN_CACHE_SECONDS)
+        body, etag = quran_store.ayah_range(number, start or 1, end)
+    except QuranNotIngested:
+        raise HTTPException(status_code=503, detail=_QURAN_NOT_INGESTED)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Surah not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={QURAN_CACHE_SECONDS}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @api_router.get("/prayer-times")
-async def get_prayer_times(lat: float, lng: float, madhab: str = 'shafi', method: str = 'karachi'):
-    """Fetches prayer times from the external API."""
+async def get_prayer_times(lat: float = Query(..., ge=-90, le=90), lng: float = Query(..., ge=-180, le=180),
+                           madhab: str = 'shafi', method: str = 'karachi', day: Optional[date] = Query(None, alias="date"),
+                           timezone: Optional[str] = None, tz_offset: Optional[float] = None):
+    """Computes the day's prayer times locally (see prayer_times.py).
+
+    The local date and UTC offset come from `timezone` (IANA name), else
+    `tz_offset` in hours, else the solar offset of the longitude.
+    """
     try:
-        # Note: The provided API does not seem to exist. This is a placeholder implementation.
-        # In a real scenario, we would use a valid prayer times API.
-        # For now, returning a sample response.
-        return {
-            "lat": lat,
-            "lng": lng,
-            "madhab": madhab,
-            "method": method,
-            "times": {
-                "Fajr": "05:00",
-                "Dhuhr": "12:30",
-                "Asr": "15:45",
-                "Maghrib": "18:30",
-                "Isha": "20:00"
+        day = day or prayer_times.local_today(timezone, tz_offset, lng)
+        offsets = prayer_times.utc_offsets(timezone, tz_offset, lng, [day])
+        times = prayer_times.compute_times(lat, lng, prayer_times.date_range(day, day), offsets, method, madhab)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "lat": lat,
+        "lng": lng,
+        "madhab": madhab,
+        "method": method,
+        "date": day.isoformat(),
+        "utc_offset": float(offsets[0]),
+        "times": {name: prayer_times.format_hours(value)[0][0] for name, value in times.items()}
+    }
+
+@api_router.post("/prayer-times/batch")
+async def get_prayer_timetable(request: PrayerTimetableRequest):
+    """Computes a month (or, without `month`, a whole year) of prayer times for many locations in one call."""
+    if request.month is None:
+        start, end = date(request.year, 1, 1), date(request.year, 12, 31)
+    else:
+        start = date(request.year, request.month, 1)
+        end = (date(request.year + request.month // 12, request.month % 12 + 1, 1) - timedelta(days=1))
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    lats = [loc.lat for loc in request.locations]
+    lngs = [loc.lng for loc in request.locations]
+    try:
+        # Locations sharing a zone share one offset row; only IANA zones vary by day.
+        offsets = {}
+        offset_rows = []
+        for loc in request.locations:
+            key = (loc.timezone, loc.tz_offset if loc.timezone is None else None,
+                   round(loc.lng / 15.0) if loc.timezone is None and loc.tz_offset is None else None)
+            if key not in offsets:
+                offsets[key] = prayer_times.utc_offsets(loc.timezone, loc.tz_offset, loc.lng, days)
+            offset_rows.append(offsets[key])
+        times = prayer_times.compute_times(lats, lngs, prayer_times.date_range(start, end), offset_rows,
+                                           request.method, request.madhab)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    formatted = {name: prayer_times.format_hours(value) for name, value in times.items()}
+    bearings = prayer_times.qibla_bearing(lats, lngs)
+    return {
+        "method": request.method,
+        "madhab": request.madhab,
+        "dates": [day.isoformat() for day in days],
+        "locations": [
+            {
+                "lat": loc.lat,
+                "lng": loc.lng,
+                "timezone": loc.timezone,
+                "utc_offsets": offset_rows[i].tolist(),
+                "qibla": round(float(bearings[i]), 2),
+                "times": {name: rows[i] for name, rows in formatted.items()},
             }
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            for i, loc in enumerate(request.locations)
+        ],
+    }
 
 @api_router.get("/qibla")
-async def get_qibla_direction(lat: float, lng: float):
-    """Fetches qibla direction from the external API."""
-    try:
-        # Note: The provided API does not seem to exist. This is a placeholder implementation.
-        # For now, returning a sample response.
-        return {"lat": lat, "lng": lng, "direction": 212.45}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_qibla_direction(lat: float = Query(..., ge=-90, le=90), lng: float = Query(..., ge=-180, le=180)):
+    """Great-circle bearing (degrees from true north) and distance to the Kaaba."""
+    return {
+        "lat": lat,
+        "lng": lng,
+        "direction": round(float(prayer_times.qibla_bearing(lat, lng)), 2),
+        "distance_km": round(float(prayer_times.kaaba_distance_km(lat, lng)), 1)
+    }
+
+# --- Metrics Routes ---
+# Served beside /api rather than under it, where Prometheus looks by default.
+def _check_metrics_token(request: Request):
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(_check_metrics_token)])
+async def get_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/metrics/profile", include_in_schema=False, dependencies=[Depends(_check_metrics_token)])
+async def get_slow_request_profile():
+    """Folded stacks sampled during slow requests (flamegraph.pl / speedscope input)."""
+    if slow_sampler is None:
+        raise HTTPException(status_code=404, detail="Slow request profiling is disabled (METRICS_PROFILE_SLOW)")
+    return PlainTextResponse(slow_sampler.folded())
+
+metrics.registry.counter("storage_compacted_bytes_total", "Bytes written by snapshot compaction.",
+                         function=lambda: store.io.compacted_bytes)
+metrics.registry.gauge("events_subscribers", "Open live event subscriptions.", function=lambda: len(event_hub))
+metrics.registry.gauge("password_hash_in_flight", "Password hashes queued or running.",
+                       function=lambda: password_hasher.in_flight)
+metrics.registry.gauge("bot_completions_in_flight", "Bot completions streaming.",
+                       function=lambda: sum(bot.active.values()))
 
 # --- Include router ---
 app.include_router(api_router)
@@ -385,8 +1305,15 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],
 )
 
+# --- Metrics ---
+# Added last so it is outermost and times the whole stack, CORS included.
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=metrics, slow_seconds=METRICS_SLOW_REQUEST_SECONDS,
+                       logger=logging.getLogger(__name__), sampler=slow_sampler)
+
 # --- Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
\ No newline at end of file
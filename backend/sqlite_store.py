@@ -0,0 +1,241 @@
+"""SQLite storage backend for running several workers on one box.
+
+Each collection is a table of JSON documents (``seq``, ``doc``).  Query
+dicts and ``$set``/``$inc``/``$push`` updates are translated to SQL over the
+JSON1 functions, so an update is one atomic statement no matter how many
+workers write concurrently.  Declared indexes become expression indexes on
+``json_extract(doc, '$."field"')``, which the planner uses because queries
+are generated with exactly the same expression text.
+
+The database runs in WAL mode so readers never block the single writer.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+if __package__:
+    from .storage import DuplicateKeyError, IndexSpec, IOStats, StorageBackend, push_spec, to_jsonable
+else:
+    from storage import DuplicateKeyError, IndexSpec, IOStats, StorageBackend, push_spec, to_jsonable
+
+logger = logging.getLogger(__name__)
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _path(field: str) -> str:
+    """SQL string literal holding the JSON path of a top-level field."""
+    path = '$."' + field.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _field(field: str) -> str:
+    # The path is embedded rather than bound so the text matches the index expression.
+    return f"json_extract(doc, {_path(field)})"
+
+
+def _where(query: Dict) -> Tuple[str, List[Any]]:
+    clauses, params = [], []
+    for key, value in query.items():
+        expr = _field(key)
+        if isinstance(value, dict) and "$all" in value:
+            clauses.append(f"NOT EXISTS (SELECT 1 FROM json_each(?) AS wanted "
+                           f"WHERE wanted.value NOT IN (SELECT value FROM json_each(doc, {_path(key)})))")
+            params.append(json.dumps(value["$all"]))
+        elif value is None:
+            clauses.append(f"{expr} IS NULL")
+        elif isinstance(value, (dict, list)):
+            clauses.append(f"{expr} = json(?)")
+            params.append(json.dumps(value))
+        else:
+            clauses.append(f"{expr} = ?")
+            params.append(value)
+    return (" AND ".join(clauses) or "1"), params
+
+
+class SQLiteStore(StorageBackend):
+    def __init__(self, db_path: Path, indexes: Optional[Dict[str, List[IndexSpec]]] = None, busy_timeout: float = 5.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.indexes = {name: list(specs) for name, specs in (indexes or {}).items()}
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._ready: set = set()
+        # SQLite filters rows itself, so "scanned" here counts the documents decoded.
+        self.io = IOStats()
+
+    # --- Schema ---
+    def _table(self, name: str) -> str:
+        if name not in self._ready:
+            with self._lock:
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_ident(name)} "
+                                   f"(seq INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)")
+                for spec in self.indexes.get(name, ()):
+                    self._create_index(name, spec)
+                self._ready.add(name)
+        return _ident(name)
+
+    def _create_index(self, name: str, spec: IndexSpec):
+        index_name = _ident(f"{name}__{spec.field}")
+        target = f"{_ident(name)} ({_field(spec.field)})"
+        if spec.unique:
+            try:
+                self._conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {target}")
+                return
+            except sqlite3.IntegrityError:
+                # Same policy as JsonStore: existing duplicates are reported, not fatal.
+                logger.warning("Duplicate %s.%s values in stored data; index created without uniqueness",
+                               name, spec.field)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+
+    def create_index(self, name: str, spec: IndexSpec):
+        self.indexes.setdefault(name, []).append(spec)
+        with self._lock:
+            self._table(name)
+            self._create_index(name, spec)
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()) -> sqlite3.Cursor:
+        with self._lock:
+            try:
+                return self._conn.execute(sql, list(params))
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(str(e)) from e
+
+    # --- Reads ---
+    def _select(self, name: str, query: Dict, limit: Optional[int] = None, sort: Optional[Tuple[str, int]] = None,
+                start: Optional[Tuple[Any, Dict]] = None) -> List[Dict]:
+        table = self._table(name)
+        where, params = _where(to_jsonable(query))
+        order = "seq"
+        if sort is not None:
+            field, direction = sort
+            expr = _field(field)
+            desc = direction < 0
+            order = f"{expr} {'DESC' if desc else 'ASC'}, seq {'DESC' if desc else 'ASC'}"
+            if start is not None:
+                value, anchor = to_jsonable(start[0]), to_jsonable(start[1])
+                anchor_where, anchor_params = _where({**anchor, field: value})
+                row = self._execute(f"SELECT seq FROM {table} WHERE {anchor_where} LIMIT 1", anchor_params).fetchone()
+                op = "<" if desc else ">"
+                if row is not None:
+                    where += f" AND ({expr} {op} ? OR ({expr} = ? AND seq {op} ?))"
+                    params += [value, value, row[0]]
+                else:
+                    where += f" AND {expr} {op} ?"
+                    params.append(value)
+        sql = f"SELECT doc FROM {table} WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._decode(doc) for (doc,) in self._execute(sql, params).fetchall()]
+
+    def _decode(self, doc: str) -> Dict:
+        self.io.docs_scanned += 1
+        self.io.bytes_read += len(doc)
+        return json.loads(doc)
+
+    def find_one(self, name: str, query: Dict) -> Optional[Dict]:
+        docs = self._select(name, query, limit=1)
+        return docs[0] if docs else None
+
+    def find(self, name: str, query: Dict, limit: int, sort: Optional[Tuple[str, int]] = None,
+             start: Optional[Tuple[Any, Dict]] = None) -> List[Dict]:
+        return self._select(name, query, limit, sort, start)
+
+    def find_grouped(self, name: str, field: str, values: Iterable[Any], limit: int,
+                     sort: Optional[Tuple[str, int]] = None) -> Dict[Any, List[Dict]]:
+        values = list(dict.fromkeys(to_jsonable(list(values))))
+        groups: Dict[Any, List[Dict]] = {value: [] for value in values}
+        if not values:
+            return groups
+        table = self._table(name)
+        expr = _field(field)
+        if sort is None:
+            order = "seq"
+        else:
+            direction = "DESC" if sort[1] < 0 else "ASC"
+            order = f"{_field(sort[0])} {direction}, seq {direction}"
+        placeholders = ", ".join("?" for _ in values)
+        sql = (f"SELECT grp, doc FROM (SELECT {expr} AS grp, doc, "
+               f"ROW_NUMBER() OVER (PARTITION BY {expr} ORDER BY {order}) AS rn "
+               f"FROM {table} WHERE {expr} IN ({placeholders})) WHERE rn <= ? ORDER BY grp, rn")
+        for group, doc in self._execute(sql, [*values, limit]).fetchall():
+            groups[group].append(self._decode(doc))
+        return groups
+
+    def count(self, name: str, query: Dict) -> int:
+        table = self._table(name)
+        where, params = _where(to_jsonable(query))
+        return self._execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+
+    def all(self, name: str) -> List[Dict]:
+        return self._select(name, {})
+
+    def collections(self) -> List[str]:
+        rows = self._execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        return sorted(name for (name,) in rows.fetchall())
+
+    # --- Writes ---
+    def insert(self, name: str, document: Dict) -> Dict:
+        doc = to_jsonable(document)
+        encoded = json.dumps(doc)
+        self._execute(f"INSERT INTO {self._table(name)} (doc) VALUES (?)", [encoded])
+        self.io.bytes_written += len(encoded)
+        return doc
+
+    def update(self, name: str, query: Dict, update: Dict) -> int:
+        update = to_jsonable(update)
+        assignments, params = [], []
+        for field, value in update.get("$set", {}).items():
+            assignments.append(f"{_path(field)}, json(?)")
+            params.append(json.dumps(value))
+        for field, amount in update.get("$inc", {}).items():
+            assignments.append(f"{_path(field)}, coalesce({_field(field)}, 0) + ?")
+            params.append(amount)
+        for field, spec in update.get("$push", {}).items():
+            values, keep = push_spec(spec)
+            appended = (f"json_insert(coalesce({_field(field)}, '[]'), "
+                        + ", ".join("'$[#]', json(?)" for _ in values) + ")")
+            pushed = [json.dumps(value) for value in values]
+            if keep is None:
+                assignments.append(f"{_path(field)}, {appended}")
+                params.extend(pushed)
+            else:
+                assignments.append(f"{_path(field)}, (SELECT json_group_array(value) FROM json_each({appended}) "
+                                   f"WHERE key >= json_array_length({appended}) + ?)")
+                params.extend([*pushed, *pushed, keep])
+        if not assignments:
+            return 0
+        table = self._table(name)
+        where, where_params = _where(to_jsonable(query))
+        sql = f"UPDATE {table} SET doc = json_set(doc, {', '.join(assignments)}) WHERE {where}"
+        return self._execute(sql, [*params, *where_params]).rowcount
+
+    def replace(self, name: str, documents: List[Dict]):
+        table = self._table(name)
+        rows = [(json.dumps(to_jsonable(doc)),) for doc in documents]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(f"DELETE FROM {table}")
+                self._conn.executemany(f"INSERT INTO {table} (doc) VALUES (?)", rows)
+            except sqlite3.IntegrityError as e:
+                self._conn.execute("ROLLBACK")
+                raise DuplicateKeyError(str(e)) from e
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        self.io.bytes_written += sum(len(doc) for (doc,) in rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
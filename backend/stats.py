@@ -0,0 +1,102 @@
+"""Materialized dashboard counters.
+
+All counters live as flat keys on a single document in the ``stats``
+collection, so the write paths bump them with a plain ``$inc`` (journaled like
+any other write) and the dashboard reads one document.  Keys look like
+``total_posts``, ``posts_by_type:General Feed`` or ``daily:2024-05-01:posts``.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+COLLECTION = "stats"
+COUNTERS_ID = "counters"
+
+
+def _day(created_at: Any) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.date().isoformat()
+    return str(created_at)[:10]
+
+
+def user_created(user: Dict) -> Dict[str, int]:
+    increments = {
+        "total_users": 1,
+        f"users_by_role:{user.get('role') or 'member'}": 1,
+        f"daily:{_day(user.get('created_at'))}:users": 1,
+    }
+    if user.get("country"):
+        increments[f"users_by_country:{user['country']}"] = 1
+    return increments
+
+
+def user_changed(old: Dict, new: Dict) -> Dict[str, int]:
+    """Moves a member between country buckets when their profile country changes."""
+    increments: Dict[str, int] = {}
+    if old.get("country") != new.get("country"):
+        if old.get("country"):
+            increments[f"users_by_country:{old['country']}"] = -1
+        if new.get("country"):
+            increments[f"users_by_country:{new['country']}"] = 1
+    return increments
+
+
+def post_created(post: Dict) -> Dict[str, int]:
+    return {
+        "total_posts": 1,
+        f"posts_by_type:{post.get('post_type') or 'General Feed'}": 1,
+        f"daily:{_day(post.get('created_at'))}:posts": 1,
+    }
+
+
+def comment_created(comment: Dict) -> Dict[str, int]:
+    return {
+        "total_comments": 1,
+        f"daily:{_day(comment.get('created_at'))}:comments": 1,
+    }
+
+
+def rebuild(users: Iterable[Dict], posts: Iterable[Dict], comments: Iterable[Dict]) -> Dict[str, int]:
+    """Recount everything from the collections; used once when no counters exist yet."""
+    totals: Counter = Counter({"total_users": 0, "total_posts": 0, "total_comments": 0})
+    for user in users:
+        totals.update(user_created(user))
+    for post in posts:
+        totals.update(post_created(post))
+    for comment in comments:
+        totals.update(comment_created(comment))
+    return dict(totals)
+
+
+def summarize(counters: Optional[Dict], days: int = 30, today: Optional[date] = None) -> Dict[str, Any]:
+    """Shape the flat counter document into the dashboard response."""
+    counters = counters or {}
+    breakdowns: Dict[str, Dict[str, int]] = {"users_by_role": {}, "users_by_country": {}, "posts_by_type": {}}
+    for key, value in counters.items():
+        prefix, sep, name = key.partition(":")
+        if sep and prefix in breakdowns and value:
+            breakdowns[prefix][name] = value
+
+    today = today or datetime.utcnow().date()
+    activity = []
+    for offset in range(days - 1, -1, -1):
+        day = (today - timedelta(days=offset)).isoformat()
+        activity.append({
+            "date": day,
+            "users": counters.get(f"daily:{day}:users", 0),
+            "posts": counters.get(f"daily:{day}:posts", 0),
+            "comments": counters.get(f"daily:{day}:comments", 0),
+        })
+
+    roles = breakdowns["users_by_role"]
+    return {
+        "total_members": counters.get("total_users", 0),
+        "total_posts": counters.get("total_posts", 0),
+        "total_comments": counters.get("total_comments", 0),
+        "mentors": roles.get("mentor", 0),
+        "mentees": roles.get("mentee", 0),
+        "members_by_role": roles,
+        "members_by_country": breakdowns["users_by_country"],
+        "posts_by_type": breakdowns["posts_by_type"],
+        "daily_activity": activity,
+    }
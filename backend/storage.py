@@ -0,0 +1,713 @@
+"""In-memory collection engine for the JSON data directory.
+
+Each collection is loaded once and kept resident.  Mutations are applied in
+memory and appended to a per-collection journal (``<name>.journal``, one JSON
+record per line).  Once the journal grows past a fraction of the snapshot
+(``<name>.json``) the collection is compacted: the journal is set aside as
+``<name>.journal.compacting``, new records start a fresh one, and a
+background thread writes the documents as they stood at that moment into a
+new snapshot, swapped in atomically.  Writers never wait for it, so the cost
+of a write does not grow with the collection.  Updates replace a document
+rather than changing it in place, which keeps the view being written
+consistent.  On startup the snapshot is loaded and both journals replayed on
+top of it.
+
+Collections can declare hash indexes (equality lookups, optionally unique) and
+sorted indexes (ordered iteration).  Queries pick an index automatically when
+one of their keys is indexed and fall back to a scan otherwise; inserts and
+updates keep every index in step with the documents.
+
+Snapshots written by this module are ``{"seq": N, "docs": [...]}``; the plain
+list format written by the old ``write_json`` helper is still accepted, so an
+existing data directory is picked up unchanged.
+"""
+import bisect
+import heapq
+import json
+import os
+import logging
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Compact once the journal reaches this fraction of the snapshot, but never below the minimum.
+DEFAULT_COMPACT_RATIO = 1.0
+DEFAULT_COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def to_jsonable(value: Any) -> Any:
+    """Return ``value`` in the shape it would have after a JSON round-trip."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
+
+
+def _match_value(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, dict) and "$all" in expected:
+        return isinstance(actual, list) and all(item in actual for item in expected["$all"])
+    return actual == expected
+
+
+def matches(doc: Dict, query: Dict) -> bool:
+    """Equality on every key; ``{"field": {"$all": [...]}}`` tests list membership."""
+    return all(_match_value(doc.get(k), v) for k, v in query.items())
+
+
+def push_spec(spec: Any) -> Tuple[List[Any], Optional[int]]:
+    """The values a ``$push`` appends, and its ``$slice`` (``-N`` keeps the last N) or None."""
+    if isinstance(spec, dict) and "$each" in spec:
+        return list(spec["$each"]), spec.get("$slice")
+    return [spec], None
+
+
+def apply_update(doc: Dict, update: Dict):
+    """Apply a ``{"$set": ..., "$inc": ..., "$push": ...}`` update to ``doc`` in place."""
+    doc.update(update.get("$set", {}))
+    doc.update({k: doc.get(k, 0) + v for k, v in update.get("$inc", {}).items()})
+    for field, spec in update.get("$push", {}).items():
+        values, keep = push_spec(spec)
+        values = (doc.get(field) or []) + values
+        doc[field] = values[keep:] if keep is not None else values
+
+
+class IOStats:
+    """Running totals of the work a backend has done, read by the metrics layer.
+
+    Storage operations update the first three on the calling thread.  Snapshot
+    writes, which may run on compaction threads, go through add_compacted
+    instead, so they never leak into an operation's deltas.
+    """
+    __slots__ = ("docs_scanned", "bytes_read", "bytes_written", "compacted_bytes", "_compacted_lock")
+
+    def __init__(self):
+        self.docs_scanned = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.compacted_bytes = 0
+        self._compacted_lock = threading.Lock()
+
+    def add_compacted(self, size: int):
+        # Collections share one IOStats, and each may be compacting on its own thread.
+        with self._compacted_lock:
+            self.compacted_bytes += size
+
+
+class DuplicateKeyError(ValueError):
+    """Raised when a write would violate a unique index."""
+
+
+class IndexSpec(NamedTuple):
+    """Declares an index: ``kind`` is ``"hash"`` (equality) or ``"sorted"`` (ordering)."""
+    field: str
+    kind: str = "hash"
+    unique: bool = False
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _sort_key(value: Any) -> Tuple[bool, Any]:
+    # Documents missing the field sort before every present value.
+    return (value is not None, value)
+
+
+class HashIndex:
+    """Maps a field value to the positions of the documents holding it.
+
+    Position lists are kept in ascending order so indexed lookups return
+    documents in the same order a full scan would.
+    """
+
+    def __init__(self, collection: str, field: str, unique: bool = False):
+        self.collection = collection
+        self.field = field
+        self.unique = unique
+        self.entries: Dict[Any, List[int]] = {}
+
+    def build(self, docs: List[Dict]):
+        self.entries = {}
+        for pos, doc in enumerate(docs):
+            value = doc.get(self.field)
+            if self.unique and value in self.entries:
+                logger.warning("Duplicate %s.%s value %r in stored data", self.collection, self.field, value)
+            self.add(pos, value)
+
+    def lookup(self, value: Any) -> List[int]:
+        return self.entries.get(value, [])
+
+    def check(self, value: Any):
+        if self.unique and value is not None and _hashable(value) and value in self.entries:
+            raise DuplicateKeyError(f"{self.collection}.{self.field} already contains {value!r}")
+
+    def add(self, pos: int, value: Any):
+        if not _hashable(value):
+            return
+        positions = self.entries.setdefault(value, [])
+        if positions and positions[-1] > pos:
+            bisect.insort(positions, pos)
+        else:
+            positions.append(pos)
+
+    def remove(self, pos: int, value: Any):
+        if not _hashable(value):
+            return
+        positions = self.entries.get(value)
+        if positions is None:
+            return
+        positions.remove(pos)
+        if not positions:
+            del self.entries[value]
+
+
+class SortedIndex:
+    """Keeps document positions ordered by one field."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.keys: List[Tuple[bool, Any, int]] = []
+
+    def build(self, docs: List[Dict]):
+        self.keys = sorted((*_sort_key(doc.get(self.field)), pos) for pos, doc in enumerate(docs))
+
+    def add(self, pos: int, value: Any):
+        key = (*_sort_key(value), pos)
+        if not self.keys or self.keys[-1] <= key:
+            self.keys.append(key)  # the common case: timestamps arrive in order
+        else:
+            bisect.insort(self.keys, key)
+
+    def remove(self, pos: int, value: Any):
+        key = (*_sort_key(value), pos)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def positions(self, reverse: bool = False, start: Optional[Tuple] = None) -> Iterator[int]:
+        """Positions in key order, beginning strictly past ``start`` when given."""
+        if reverse:
+            i = len(self.keys) - 1 if start is None else bisect.bisect_left(self.keys, start) - 1
+            while i >= 0:
+                yield self.keys[i][2]
+                i -= 1
+        else:
+            i = 0 if start is None else bisect.bisect_right(self.keys, start)
+            while i < len(self.keys):
+                yield self.keys[i][2]
+                i += 1
+
+
+class Collection:
+    """A single resident collection backed by a snapshot and a journal."""
+
+    def __init__(self, name: str, data_dir: Path, compact_ratio: float = DEFAULT_COMPACT_RATIO,
+                 compact_min_bytes: int = DEFAULT_COMPACT_MIN_BYTES, fsync: bool = False,
+                 indexes: Iterable[IndexSpec] = (), io: Optional[IOStats] = None):
+        self.name = name
+        self.snapshot_path = data_dir / f"{name}.json"
+        self.journal_path = data_dir / f"{name}.journal"
+        self.rotated_path = data_dir / f"{name}.journal.compacting"
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+        self.docs: List[Dict] = []
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.snapshot_bytes = 0
+        self.journal_bytes = 0
+        self.lock = threading.RLock()
+        # Held by whoever is writing a snapshot; taken before ``lock``, never after it.
+        self._snapshot_lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self.hash_indexes: Dict[str, HashIndex] = {}
+        self.sorted_indexes: Dict[str, SortedIndex] = {}
+        self._journal = None
+        self.io = io if io is not None else IOStats()
+        for spec in indexes:
+            self._declare(spec)
+        self._load()
+
+    # --- Loading ---
+    def _load(self):
+        snapshot_seq = 0
+        if self.snapshot_path.exists():
+            self.snapshot_bytes = self.snapshot_path.stat().st_size
+            self.io.bytes_read += self.snapshot_bytes
+            with open(self.snapshot_path, "r") as f:
+                try:
+                    snapshot = json.load(f)
+                except json.JSONDecodeError:
+                    logger.warning("Snapshot for %s is unreadable, starting empty", self.name)
+                    snapshot = []
+            if isinstance(snapshot, dict):
+                snapshot_seq = snapshot.get("seq", 0)
+                self.docs = snapshot.get("docs", [])
+            else:
+                self.docs = snapshot
+        self.seq = self.snapshot_seq = snapshot_seq
+        self._rebuild_indexes()
+
+        # A journal set aside by a compaction that never finished holds the older records.
+        for path in (self.rotated_path, self.journal_path):
+            if path.exists():
+                self.journal_bytes += self._replay(path)
+        if self.rotated_path.exists():
+            self.compact()
+
+    def _replay(self, path: Path) -> int:
+        """Apply the records of one journal file newer than the snapshot; returns its valid length."""
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn tail from an interrupted append; everything after it is dropped.
+                    logger.warning("Discarding torn journal tail for %s", self.name)
+                    break
+                valid_bytes += len(line)
+                if record["seq"] <= self.snapshot_seq:
+                    continue  # already folded into the snapshot
+                self._apply(record)
+                self.seq = record["seq"]
+        self.io.bytes_read += valid_bytes
+        if valid_bytes != path.stat().st_size:
+            with open(path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return valid_bytes
+
+    def _apply(self, record: Dict):
+        op = record["op"]
+        if op == "insert":
+            self._insert_doc(record["doc"])
+        elif op == "update":
+            self._update_docs(record["query"], record["update"])
+        else:
+            raise ValueError(f"Unknown journal op {op!r} in {self.name}")
+
+    # --- Indexes ---
+    def _declare(self, spec: IndexSpec):
+        if spec.kind == "hash":
+            self.hash_indexes[spec.field] = HashIndex(self.name, spec.field, spec.unique)
+        elif spec.kind == "sorted":
+            self.sorted_indexes[spec.field] = SortedIndex(spec.field)
+        else:
+            raise ValueError(f"Unknown index kind {spec.kind!r}")
+
+    def _all_indexes(self) -> List[Any]:
+        return [*self.hash_indexes.values(), *self.sorted_indexes.values()]
+
+    def _rebuild_indexes(self):
+        for index in self._all_indexes():
+            index.build(self.docs)
+
+    def create_index(self, spec: IndexSpec):
+        with self.lock:
+            self._declare(spec)
+            indexes = self.hash_indexes if spec.kind == "hash" else self.sorted_indexes
+            indexes[spec.field].build(self.docs)
+
+    # --- Journal ---
+    def _append(self, record: Dict):
+        self.seq += 1
+        record["seq"] = self.seq
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        line = json.dumps(record) + "\n"
+        self._journal.write(line)
+        self.io.bytes_written += len(line)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self.journal_bytes += len(line)
+        if self._compaction is None and \
+                self.journal_bytes >= max(self.compact_min_bytes, self.compact_ratio * self.snapshot_bytes):
+            self._start_compaction()
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _write_snapshot(self, docs: List[Dict], seq: int) -> bool:
+        """Write ``docs`` as the snapshot at ``seq`` unless a newer one exists; the caller holds _snapshot_lock."""
+        if seq <= self.snapshot_seq and self.snapshot_path.exists():
+            return False
+        tmp_path = self.snapshot_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            # One document at a time, so a background writer lets other threads run in between.
+            f.write('{"seq": %d, "docs": [' % seq)
+            for i, doc in enumerate(docs):
+                f.write(", " + json.dumps(doc) if i else json.dumps(doc))
+            f.write("]}")
+            size = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.io.add_compacted(size)
+        self.snapshot_seq, self.snapshot_bytes = seq, size
+        return True
+
+    def _start_compaction(self):
+        """Set the journal aside and snapshot the current documents on a background thread."""
+        self._close_journal()
+        if self.rotated_path.exists():
+            # Left by a compaction that failed; its records are still needed, so keep them first.
+            with open(self.rotated_path, "ab") as rotated, open(self.journal_path, "rb") as journal:
+                shutil.copyfileobj(journal, rotated)
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_path)
+        self.journal_bytes = 0
+        # A shallow copy is enough: updates swap in new document dicts instead of changing these.
+        docs, seq = list(self.docs), self.seq
+        self._compaction = threading.Thread(target=self._compact_in_background, args=(docs, seq),
+                                            name=f"compact-{self.name}", daemon=True)
+        self._compaction.start()
+
+    def _compact_in_background(self, docs: List[Dict], seq: int):
+        try:
+            with self._snapshot_lock:
+                self._write_snapshot(docs, seq)
+                # Every record in the set-aside journal is now in the snapshot (or a newer one).
+                self.rotated_path.unlink(missing_ok=True)
+        except Exception:
+            # The set-aside journal stays and is replayed and folded in on the next start.
+            logger.exception("Background compaction of %s failed", self.name)
+        finally:
+            with self.lock:
+                self._compaction = None
+
+    def wait_for_compaction(self):
+        thread = self._compaction
+        if thread is not None:
+            thread.join()
+
+    def _compact_now(self):
+        """Snapshot the current documents and truncate both journals; needs _snapshot_lock and lock."""
+        self._write_snapshot(list(self.docs), self.seq)
+        # Records up to self.seq are now in the snapshot, so a crash before
+        # the truncates below only leaves records that replay will skip.
+        self._close_journal()
+        open(self.journal_path, "w").close()
+        self.rotated_path.unlink(missing_ok=True)
+        self.journal_bytes = 0
+
+    def compact(self):
+        """Fold both journals into a fresh snapshot right away."""
+        with self._snapshot_lock, self.lock:
+            self._compact_now()
+
+    def close(self):
+        self.wait_for_compaction()
+        with self._snapshot_lock, self.lock:
+            if self.journal_bytes or self.rotated_path.exists():
+                self._compact_now()
+            self._close_journal()
+
+    # --- Operations ---
+    def _candidates(self, query: Dict) -> Optional[Iterable[int]]:
+        """Positions an index narrows ``query`` to, or None when a scan is needed."""
+        best = None
+        for field, value in query.items():
+            index = self.hash_indexes.get(field)
+            if index is None or not _hashable(value):
+                continue
+            positions = index.lookup(value)
+            if best is None or len(positions) < len(best):
+                best = positions
+            if index.unique:
+                break
+        return best
+
+    def _start_key(self, field: str, start: Tuple[Any, Dict], reverse: bool) -> Tuple[bool, Any, float]:
+        value, anchor = start
+        candidates = self._candidates(to_jsonable(anchor))
+        for pos in candidates or ():
+            if self.docs[pos].get(field) == value and matches(self.docs[pos], anchor):
+                return (*_sort_key(value), pos)
+        # The anchor document is gone; resume past every document sharing its value.
+        return (*_sort_key(value), -1 if reverse else float("inf"))
+
+    def _examined(self, positions: Iterable[int]) -> Iterator[int]:
+        io = self.io
+        for pos in positions:
+            io.docs_scanned += 1
+            yield pos
+
+    def scan(self, query: Dict, sort: Optional[Tuple[str, int]] = None,
+             start: Optional[Tuple[Any, Dict]] = None) -> Iterator[Dict]:
+        """Yield documents matching ``query``, using an index whenever one applies.
+
+        ``sort`` is ``(field, 1)`` or ``(field, -1)``; without it documents come
+        back in insertion order.  ``start`` is a ``(value, anchor_query)`` keyset
+        cursor: iteration resumes strictly after the document ``anchor_query``
+        identifies, whose ``sort`` field holds ``value``.  Ties on the sort
+        field are broken by insertion order.
+        """
+        candidates = self._candidates(query)
+        if sort is None:
+            positions = range(len(self.docs)) if candidates is None else candidates
+            return (self.docs[pos] for pos in self._examined(positions) if matches(self.docs[pos], query))
+
+        field, direction = sort
+        reverse = direction < 0
+        start_key = self._start_key(field, start, reverse) if start is not None else None
+        if candidates is None and field in self.sorted_indexes:
+            positions = self.sorted_indexes[field].positions(reverse, start_key)
+            return (self.docs[pos] for pos in self._examined(positions) if matches(self.docs[pos], query))
+
+        positions = range(len(self.docs)) if candidates is None else candidates
+        self.io.docs_scanned += len(positions)
+        keyed = [((*_sort_key(self.docs[pos].get(field)), pos), self.docs[pos])
+                 for pos in positions if matches(self.docs[pos], query)]
+        if start_key is not None:
+            keyed = [(key, doc) for key, doc in keyed if (key < start_key if reverse else key > start_key)]
+        keyed.sort(key=lambda item: item[0], reverse=reverse)
+        return (doc for _, doc in keyed)
+
+    def group(self, field: str, values: Iterable[Any], limit: int,
+              sort: Optional[Tuple[str, int]] = None) -> Dict[Any, List[Dict]]:
+        """Bucket documents by ``field`` for each of ``values`` in one pass.
+
+        Uses the field's hash index when there is one and a single scan
+        otherwise.  Each bucket keeps at most ``limit`` documents: the first
+        ``limit`` in ``sort`` order, or in insertion order without ``sort``.
+        """
+        groups: Dict[Any, List[Tuple[int, Dict]]] = {value: [] for value in values if _hashable(value)}
+        index = self.hash_indexes.get(field)
+        if index is not None:
+            for value, bucket in groups.items():
+                bucket.extend((pos, self.docs[pos]) for pos in index.lookup(value))
+                self.io.docs_scanned += len(bucket)
+        else:
+            self.io.docs_scanned += len(self.docs)
+            for pos, doc in enumerate(self.docs):
+                value = doc.get(field)
+                if _hashable(value) and value in groups:
+                    groups[value].append((pos, doc))
+
+        if sort is None:
+            return {value: [doc for _, doc in bucket[:limit]] for value, bucket in groups.items()}
+        sort_field, direction = sort
+        pick = heapq.nlargest if direction < 0 else heapq.nsmallest
+        return {
+            value: [doc for _, doc in pick(limit, bucket, key=lambda item: (*_sort_key(item[1].get(sort_field)), item[0]))]
+            for value, bucket in groups.items()
+        }
+
+    def _insert_doc(self, doc: Dict):
+        for index in self.hash_indexes.values():
+            index.check(doc.get(index.field))
+        pos = len(self.docs)
+        self.docs.append(doc)
+        for index in self._all_indexes():
+            index.add(pos, doc.get(index.field))
+
+    def _update_docs(self, query: Dict, update: Dict) -> int:
+        positions = self._candidates(query)
+        if positions is None:
+            positions = range(len(self.docs))
+        self.io.docs_scanned += len(positions)
+        matched = [pos for pos in positions if matches(self.docs[pos], query)]
+        touched = [index for index in self._all_indexes()
+                   if any(index.field in update.get(op, {}) for op in ("$set", "$inc", "$push"))]
+        for pos in matched:
+            # Copied rather than changed in place: a background compaction may be serializing the old one.
+            doc = dict(self.docs[pos])
+            self.docs[pos] = doc
+            old = {index.field: doc.get(index.field) for index in touched}
+            apply_update(doc, update)
+            for index in touched:
+                if doc.get(index.field) != old[index.field]:
+                    index.remove(pos, old[index.field])
+                    index.add(pos, doc.get(index.field))
+        return len(matched)
+
+    def _check_update(self, query: Dict, update: Dict):
+        for field, value in update.get("$set", {}).items():
+            index = self.hash_indexes.get(field)
+            if index is None or not index.unique:
+                continue
+            holder = index.lookup(value)
+            if holder and not matches(self.docs[holder[0]], query):
+                raise DuplicateKeyError(f"{self.name}.{field} already contains {value!r}")
+
+    def insert(self, document: Dict) -> Dict:
+        doc = to_jsonable(document)
+        with self.lock:
+            self._insert_doc(doc)
+            self._append({"op": "insert", "doc": doc})
+        return doc
+
+    def update(self, query: Dict, update: Dict) -> int:
+        query = to_jsonable(query)
+        update = to_jsonable(update)
+        with self.lock:
+            self._check_update(query, update)
+            matched = self._update_docs(query, update)
+            if matched:
+                self._append({"op": "update", "query": query, "update": update})
+        return matched
+
+    def replace(self, documents: List[Dict]):
+        docs = to_jsonable(list(documents))
+        with self._snapshot_lock, self.lock:
+            # A full replacement is written straight to the snapshot; journaling
+            # it would only duplicate the whole collection into the log.
+            self.docs = docs
+            self._rebuild_indexes()
+            self.seq += 1
+            self._compact_now()
+
+
+class StorageBackend:
+    """Interface the JSON helper functions in server.py are written against.
+
+    Documents are plain JSON-compatible dicts (datetimes are stored as ISO
+    strings); queries are equality dicts, optionally with ``{"$all": [...]}``
+    for list fields; updates are ``{"$set": {...}, "$inc": {...}, "$push": {...}}``,
+    where a push is a single value or ``{"$each": [...], "$slice": -N}`` to
+    append several and keep only the last N.  Reads return copies the caller
+    may modify freely.  ``io`` accumulates the documents examined and bytes
+    moved, for instrumentation.
+    """
+
+    io: IOStats
+
+    def create_index(self, name: str, spec: IndexSpec):
+        raise NotImplementedError
+
+    def find_one(self, name: str, query: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def find(self, name: str, query: Dict, limit: int, sort: Optional[Tuple[str, int]] = None,
+             start: Optional[Tuple[Any, Dict]] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def find_grouped(self, name: str, field: str, values: Iterable[Any], limit: int,
+                     sort: Optional[Tuple[str, int]] = None) -> Dict[Any, List[Dict]]:
+        raise NotImplementedError
+
+    def count(self, name: str, query: Dict) -> int:
+        raise NotImplementedError
+
+    def all(self, name: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def collections(self) -> List[str]:
+        raise NotImplementedError
+
+    def insert(self, name: str, document: Dict) -> Dict:
+        raise NotImplementedError
+
+    def update(self, name: str, query: Dict, update: Dict) -> int:
+        raise NotImplementedError
+
+    def replace(self, name: str, documents: List[Dict]):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class JsonStore(StorageBackend):
+    """Registry of resident collections under one data directory.
+
+    ``indexes`` maps a collection name to the IndexSpecs it is loaded with.
+    Suitable for a single process only; use the SQLite backend to run several
+    workers against the same data.
+    """
+
+    def __init__(self, data_dir: Path, compact_ratio: float = DEFAULT_COMPACT_RATIO,
+                 compact_min_bytes: int = DEFAULT_COMPACT_MIN_BYTES, fsync: bool = False,
+                 indexes: Optional[Dict[str, List[IndexSpec]]] = None):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+        self.indexes = {name: list(specs) for name, specs in (indexes or {}).items()}
+        self._collections: Dict[str, Collection] = {}
+        self._lock = threading.Lock()
+        self.io = IOStats()
+
+    def collection(self, name: str) -> Collection:
+        coll = self._collections.get(name)
+        if coll is None:
+            with self._lock:
+                coll = self._collections.get(name)
+                if coll is None:
+                    coll = Collection(name, self.data_dir, self.compact_ratio, self.compact_min_bytes, self.fsync,
+                                      self.indexes.get(name, ()), io=self.io)
+                    self._collections[name] = coll
+        return coll
+
+    def create_index(self, name: str, spec: IndexSpec):
+        self.indexes.setdefault(name, []).append(spec)
+        if name in self._collections:
+            self._collections[name].create_index(spec)
+
+    def find_one(self, name: str, query: Dict) -> Optional[Dict]:
+        doc = next(self.collection(name).scan(to_jsonable(query)), None)
+        return dict(doc) if doc is not None else None
+
+    def find(self, name: str, query: Dict, limit: int, sort: Optional[Tuple[str, int]] = None,
+             start: Optional[Tuple[Any, Dict]] = None) -> List[Dict]:
+        results = []
+        for doc in self.collection(name).scan(to_jsonable(query), sort, start):
+            if len(results) >= limit:
+                break
+            results.append(dict(doc))
+        return results
+
+    def find_grouped(self, name: str, field: str, values: Iterable[Any], limit: int,
+                     sort: Optional[Tuple[str, int]] = None) -> Dict[Any, List[Dict]]:
+        groups = self.collection(name).group(field, to_jsonable(list(values)), limit, sort)
+        return {value: [dict(doc) for doc in docs] for value, docs in groups.items()}
+
+    def count(self, name: str, query: Dict) -> int:
+        query = to_jsonable(query)
+        coll = self.collection(name)
+        if not query:
+            return len(coll.docs)
+        return sum(1 for _ in coll.scan(query))
+
+    def all(self, name: str) -> List[Dict]:
+        return [dict(doc) for doc in self.collection(name).docs]
+
+    def collections(self) -> List[str]:
+        names = {path.stem for path in self.data_dir.glob("*.json")}
+        names.update(path.stem for path in self.data_dir.glob("*.journal"))
+        names.update(path.name[:-len(".journal.compacting")] for path in self.data_dir.glob("*.journal.compacting"))
+        names.update(self._collections)
+        return sorted(names)
+
+    def insert(self, name: str, document: Dict) -> Dict:
+        return self.collection(name).insert(document)
+
+    def update(self, name: str, query: Dict, update: Dict) -> int:
+        return self.collection(name).update(query, update)
+
+    def replace(self, name: str, documents: List[Dict]):
+        self.collection(name).replace(documents)
+
+    def compact(self):
+        for coll in list(self._collections.values()):
+            coll.compact()
+
+    def close(self):
+        for coll in list(self._collections.values()):
+            coll.close()
@@ -0,0 +1,154 @@
+"""Home timelines: fan-out on write, with a pull fallback for heavily followed accounts.
+
+Every post is appended to its author's outbox (``posts:<author_id>``) and to
+the home buffer (``home:<user_id>``) of the author and of each follower.  Both
+are documents in the ``timelines`` collection holding the newest entries,
+appended with a capped ``$push`` so a fan-out write never reads the buffer.
+
+Fanning out to every follower gets expensive for an account with a very large
+audience, so past a follower limit an author is switched to pull mode for
+good.  From then on their posts only go to their own outbox, and each
+follower's home document lists them under ``pulled``, so a read merges those
+outboxes in.  A home page therefore costs one home document, one outbox per
+followed pulled account and the page of posts itself, however many posts
+exist in total.
+
+Entries are ``[created_at, post_id, author_id]``, ordered newest first by
+``(created_at, post_id)``; a page cursor is the last entry's pair.  Changes
+other than appends (backfilling a new follow, dropping an unfollowed author)
+rewrite the home document under its ``rev`` counter and retry if a concurrent
+write got in first.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+if __package__:
+    from .storage import DuplicateKeyError, StorageBackend, to_jsonable
+else:
+    from storage import DuplicateKeyError, StorageBackend, to_jsonable
+
+COLLECTION = "timelines"
+
+
+def home_key(user_id: str) -> str:
+    return f"home:{user_id}"
+
+
+def outbox_key(user_id: str) -> str:
+    return f"posts:{user_id}"
+
+
+def entry(post: Dict) -> List[str]:
+    return [to_jsonable(post["created_at"]), post["id"], post["author_id"]]
+
+
+def _newest_first(entries: Iterable[List[str]]) -> List[List[str]]:
+    return sorted(entries, key=lambda item: (item[0], item[1]), reverse=True)
+
+
+def _merge(entries: List[List[str]], more: List[List[str]], size: int) -> List[List[str]]:
+    """The newest ``size`` of both lists, without duplicates, stored oldest first like a buffer."""
+    unique = {item[1]: item for item in [*entries, *more]}
+    return _newest_first(unique.values())[:size][::-1]
+
+
+def _document(key: str, entries: List[List[str]]) -> Dict:
+    return {"id": key, "rev": 1, "entries": entries, "pulled": []}
+
+
+def _appended(entries: List[List[str]], size: int) -> Dict:
+    return {"$push": {"entries": {"$each": entries, "$slice": -size}}, "$inc": {"rev": 1}}
+
+
+def push(store: StorageBackend, key: str, entries: List[List[str]], size: int):
+    """Append ``entries`` to one buffer, keeping its newest ``size``."""
+    update = _appended(entries, size)
+    if store.update(COLLECTION, {"id": key}, update):
+        return
+    try:
+        store.insert(COLLECTION, _document(key, entries[-size:]))
+    except DuplicateKeyError:
+        store.update(COLLECTION, {"id": key}, update)  # another worker created it first
+
+
+def modify(store: StorageBackend, key: str, change: Callable[[Dict], Dict]):
+    """Rewrite one timeline document with the fields ``change`` returns for its current state."""
+    while True:
+        doc = store.find_one(COLLECTION, {"id": key})
+        if doc is None:
+            doc = _document(key, [])
+            try:
+                store.insert(COLLECTION, {**doc, **change(doc)})
+                return
+            except DuplicateKeyError:
+                continue
+        if store.update(COLLECTION, {"id": key, "rev": doc["rev"]}, {"$set": change(doc), "$inc": {"rev": 1}}):
+            return
+
+
+def outbox(store: StorageBackend, author_id: str, size: int) -> List[List[str]]:
+    """The author's newest entries, oldest first."""
+    doc = store.find_one(COLLECTION, {"id": outbox_key(author_id)})
+    if doc is not None:
+        return doc["entries"]
+    # Posts written before timelines existed: seed the outbox from the posts collection once.
+    posts = store.find("posts", {"author_id": author_id}, size, sort=("created_at", -1))
+    entries = [entry(post) for post in reversed(posts)]
+    try:
+        store.insert(COLLECTION, _document(outbox_key(author_id), entries))
+    except DuplicateKeyError:
+        return store.find_one(COLLECTION, {"id": outbox_key(author_id)})["entries"]
+    return entries
+
+
+def publish(store: StorageBackend, post: Dict, audience: Iterable[str], size: int):
+    """Append a new post to its author's outbox and to the home buffer of everyone in ``audience``."""
+    item = [entry(post)]
+    if not store.update(COLLECTION, {"id": outbox_key(post["author_id"])}, _appended(item, size)):
+        # No outbox yet: seeding it from the posts collection picks this post up too, unless
+        # another worker created the outbox in the meantime.
+        if post["id"] not in {existing[1] for existing in outbox(store, post["author_id"], size)}:
+            push(store, outbox_key(post["author_id"]), item, size)
+    for user_id in audience:
+        push(store, home_key(user_id), item, size)
+
+
+def follow(store: StorageBackend, follower_id: str, author_id: str, pulled: bool, size: int):
+    """Start showing ``author_id``'s posts on ``follower_id``'s home timeline, recent ones included."""
+    if pulled:
+        change = lambda doc: {"pulled": sorted({*doc["pulled"], author_id})}
+    else:
+        recent = outbox(store, author_id, size)
+        change = lambda doc: {"entries": _merge(doc["entries"], recent, size)}
+    modify(store, home_key(follower_id), change)
+
+
+def unfollow(store: StorageBackend, follower_id: str, author_id: str):
+    modify(store, home_key(follower_id), lambda doc: {
+        "entries": [item for item in doc["entries"] if item[2] != author_id],
+        "pulled": [user_id for user_id in doc["pulled"] if user_id != author_id],
+    })
+
+
+def start_pulling(store: StorageBackend, author_id: str, follower_ids: Iterable[str]):
+    """Switch an author to pull mode: their followers read the outbox instead of receiving copies."""
+    for follower_id in follower_ids:
+        modify(store, home_key(follower_id), lambda doc: {"pulled": sorted({*doc["pulled"], author_id})})
+
+
+def home(store: StorageBackend, user_id: str, limit: int, size: int,
+         before: Optional[Tuple[str, str]] = None) -> List[List[str]]:
+    """Up to ``limit`` entries of the home timeline, newest first, strictly older than ``before``."""
+    doc = store.find_one(COLLECTION, {"id": home_key(user_id)}) or _document(home_key(user_id), [])
+    entries = list(doc["entries"])
+    for author_id in doc["pulled"]:
+        entries.extend(outbox(store, author_id, size))
+    page: List[List[str]] = []
+    seen = set()
+    for item in _newest_first(entries):
+        if (before is not None and (item[0], item[1]) >= before) or item[1] in seen:
+            continue
+        seen.add(item[1])
+        page.append(item)
+        if len(page) == limit:
+            break
+    return page
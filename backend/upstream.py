@@ -0,0 +1,145 @@
+"""Shared async fetch layer for static upstream JSON (CDN datasets and the like).
+
+Responses are cached in memory and on disk.  A fresh entry is served directly;
+a stale one is served immediately while a single background refresh runs; an
+expired or missing one waits for the fetch.  Concurrent misses for the same
+URL share one upstream request, and if the upstream is down any cached copy,
+however old, is served instead of an error.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """The upstream could not be reached or returned an unusable response."""
+
+
+class CacheEntry:
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data: Any, fetched_at: float):
+        self.data = data
+        self.fetched_at = fetched_at
+
+
+Instrument = Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]
+
+
+class UpstreamCache:
+    def __init__(self, cache_dir: Path, ttl: float = 3600, stale_ttl: float = 86400, timeout: float = 10.0,
+                 max_connections: int = 20, instrument: Optional[Instrument] = None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.instrument = instrument
+        self._memory: Dict[str, CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    # --- HTTP client ---
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            # ``instrument`` wraps the connection pool, e.g. to time every call (see metrics.py).
+            transport = httpx.AsyncHTTPTransport(limits=limits)
+            if self.instrument is not None:
+                transport = self.instrument(transport)
+            self._client = httpx.AsyncClient(timeout=self.timeout, transport=transport, follow_redirects=True)
+        return self._client
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- Disk cache ---
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def _load_disk(self, url: str) -> Optional[CacheEntry]:
+        path = self._path(url)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = CacheEntry(record["data"], record["fetched_at"])
+        self._memory[url] = entry
+        return entry
+
+    def _save_disk(self, url: str, entry: CacheEntry):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"url": url, "fetched_at": entry.fetched_at, "data": entry.data}, f)
+        os.replace(tmp_path, path)
+
+    # --- Fetching ---
+    async def _download(self, url: str) -> CacheEntry:
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise UpstreamError(str(e) or e.__class__.__name__) from e
+        entry = CacheEntry(data, time.time())
+        self._memory[url] = entry
+        try:
+            await asyncio.to_thread(self._save_disk, url, entry)
+        except OSError as e:
+            logger.warning("Could not persist upstream cache for %s: %s", url, e)
+        return entry
+
+    def _fetch(self, url: str) -> asyncio.Task:
+        """Start a download for ``url`` or join the one already running."""
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return task
+
+    def _refresh_in_background(self, url: str):
+        def log_failure(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("Background refresh of %s failed: %s", url, task.exception())
+
+        self._fetch(url).add_done_callback(log_failure)
+
+    async def get_json(self, url: str, ttl: Optional[float] = None) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._memory.get(url) or self._load_disk(url)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if age < ttl:
+                return entry.data
+            if age < ttl + self.stale_ttl:
+                self._refresh_in_background(url)
+                return entry.data
+        try:
+            # shield: one caller going away must not cancel the fetch the others are waiting on
+            return (await asyncio.shield(self._fetch(url))).data
+        except UpstreamError as e:
+            if entry is not None:
+                logger.warning("Serving expired copy of %s: %s", url, e)
+                return entry.data
+            raise
@@ -0,0 +1,76 @@
+"""Write versions backing conditional GETs.
+
+A write through the storage helpers bumps the counters that some read
+endpoint depends on: the whole collection for ``posts`` and ``comments``, and,
+for collections with a scope field, each scope it touched: a post's comment
+thread (``comments:<post_id>``) or one user's profile (``users:<id>``).
+Writes to anything else bump nothing.  Read endpoints build their ETag from
+the versions they depend on, so answering ``If-None-Match`` takes a few
+indexed lookups and never reads the documents themselves.
+
+Counters are documents in the ``versions`` collection, bumped with ``$inc``
+like the dashboard counters in stats.py, so every worker sharing a database
+sees the same values.  A random epoch, created with the collection, is part
+of every ETag: a fresh or restored data directory restarts the counters and
+must not revalidate ETags handed out for different data.
+"""
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence
+
+if __package__:
+    from .storage import DuplicateKeyError, StorageBackend
+else:
+    from storage import DuplicateKeyError, StorageBackend
+
+COLLECTION = "versions"
+EPOCH_ID = "epoch"
+# Collections whose collection-wide counter some ETag reads
+VERSIONED = {"posts", "comments"}
+# collection -> field whose value names a separately versioned scope
+SCOPES = {"comments": "post_id", "users": "id"}
+
+
+def scope_key(collection: str, value: str) -> str:
+    return f"{collection}:{value}"
+
+
+def keys_for(collection: str, docs: Iterable[Dict]) -> List[str]:
+    """Version keys a write to ``docs`` (or to documents matching them) invalidates."""
+    keys = [collection] if collection in VERSIONED else []
+    field = SCOPES.get(collection)
+    if field is not None:
+        keys.extend(sorted({scope_key(collection, doc[field]) for doc in docs if doc.get(field) is not None}))
+    return keys
+
+
+def bump(store: StorageBackend, keys: Iterable[str]):
+    for key in keys:
+        if store.update(COLLECTION, {"id": key}, {"$inc": {"version": 1}}):
+            continue
+        try:
+            store.insert(COLLECTION, {"id": key, "version": 1})
+        except DuplicateKeyError:
+            store.update(COLLECTION, {"id": key}, {"$inc": {"version": 1}})  # another worker created it first
+
+
+def epoch(store: StorageBackend) -> str:
+    doc = store.find_one(COLLECTION, {"id": EPOCH_ID})
+    if doc is None:
+        try:
+            doc = store.insert(COLLECTION, {"id": EPOCH_ID, "value": uuid.uuid4().hex[:12]})
+        except DuplicateKeyError:
+            doc = store.find_one(COLLECTION, {"id": EPOCH_ID})
+    return doc["value"]
+
+
+def current(store: StorageBackend, keys: Sequence[str]) -> List[int]:
+    values = []
+    for key in keys:
+        doc: Optional[Dict] = store.find_one(COLLECTION, {"id": key})
+        values.append(doc["version"] if doc is not None else 0)
+    return values
+
+
+def etag(store: StorageBackend, keys: Sequence[str]) -> str:
+    """Weak ETag for a response built from the data behind ``keys``."""
+    return 'W/"' + "-".join([epoch(store), *(str(value) for value in current(store, keys))]) + '"'
@@ -0,0 +1,290 @@
+"""Load and scaling benchmark for the API against the real storage path.
+
+    python benchmarks/bench_load.py [--sizes 1000,10000,100000,1000000] [--backend json|sqlite|both]
+                                    [--concurrency 32] [--requests 500] [--out results.json]
+                                    [--compare previous.json]
+
+For every backend and dataset size a synthetic dataset is generated into a
+throwaway data directory: ``size`` posts, ``size`` comments spread over them
+and ``size // 10`` users (at least 10), all sharing one password.  The app is
+then started with that store (lifespan included) and driven in process by a
+concurrent httpx.AsyncClient, one endpoint at a time:
+
+    register, login, create_post, get_posts, create_comment, get_comments
+
+Each phase sends ``--requests`` requests with at most ``--concurrency`` in
+flight and reports throughput and latency percentiles.  Everything, plus the
+commit, interpreter and settings, is written as JSON; ``--compare`` prints the
+change in throughput and p50/p99 latency against an earlier results file, so
+runs from two commits can be lined up.
+
+Password hashing runs at ``--bcrypt-rounds`` (4 by default) so that
+register and login measure the request path rather than bcrypt itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend import server  # noqa: E402
+from backend.passwords import PasswordHasher, hash_password  # noqa: E402
+from backend.responses import orjson  # noqa: E402
+from backend.storage import to_jsonable  # noqa: E402
+
+PASSWORD = "benchmark"
+ENDPOINTS = ("register", "login", "create_post", "get_posts", "create_comment", "get_comments")
+WORDS = ("salah", "quran", "community", "charity", "ramadan", "learning", "family", "mosque", "dua", "sunnah",
+         "patience", "gratitude", "knowledge", "youth", "volunteer", "event")
+POST_TYPES = ("General Feed", "Announcements", "Events")
+
+
+# --- Synthetic data ---
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate(size: int, seed: int, password_hash: str) -> Dict[str, List[Dict]]:
+    """Users, posts and comments for one dataset size; the same seed gives the same documents."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=365) / max(size, 1)
+
+    user_template = to_jsonable(server.User(email="user@example.com", full_name="User").model_dump())
+    users = []
+    for i in range(max(10, size // 10)):
+        created = (start + step * i).isoformat()
+        users.append({**user_template, "id": _uuid(rng), "email": f"user{i}@example.com",
+                      "full_name": f"User {i}", "country": rng.choice(("UK", "US", "MY", "EG", "PK")),
+                      "password_hash": password_hash, "created_at": created, "updated_at": created})
+
+    post_template = to_jsonable(server.Post(content="", author_id="", author_name="", author_role="member").model_dump())
+    posts = []
+    for i in range(size):
+        author = users[rng.randrange(len(users))]
+        created = (start + step * i).isoformat()
+        posts.append({**post_template, "id": _uuid(rng), "content": _text(rng, rng.randint(8, 40)),
+                      "author_id": author["id"], "author_name": author["full_name"],
+                      "post_type": rng.choice(POST_TYPES), "tags": rng.sample(WORDS, 2),
+                      "created_at": created, "updated_at": created})
+
+    comment_template = to_jsonable(server.Comment(content="", post_id="", author_id="", author_name="").model_dump())
+    comments = []
+    for i in range(size):
+        post = posts[rng.randrange(len(posts))]
+        author = users[rng.randrange(len(users))]
+        post["comments_count"] += 1
+        comments.append({**comment_template, "id": _uuid(rng), "content": _text(rng, rng.randint(3, 15)),
+                         "post_id": post["id"], "author_id": author["id"], "author_name": author["full_name"],
+                         "created_at": (start + step * i).isoformat()})
+    return {"users": users, "posts": posts, "comments": comments}
+
+
+# --- Load generation ---
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+async def run_phase(requests: int, concurrency: int, send: Callable[[int], Awaitable[httpx.Response]]) -> Dict:
+    """Issue ``requests`` calls of ``send(i)``, at most ``concurrency`` at a time."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            began = time.perf_counter()
+            try:
+                response = await send(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - began)
+            errors += not ok
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - began
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {name: round(value * 1000, 3) for name, value in (
+            ("mean", statistics.fmean(ordered) if ordered else 0.0), ("p50", _percentile(ordered, 50)),
+            ("p90", _percentile(ordered, 90)), ("p99", _percentile(ordered, 99)),
+            ("max", ordered[-1] if ordered else 0.0))},
+    }
+
+
+async def drive(dataset: Dict[str, List[Dict]], requests: int, concurrency: int, seed: int) -> Dict[str, Dict]:
+    rng = random.Random(seed)
+    users, posts = dataset["users"], dataset["posts"]
+    transport = httpx.ASGITransport(app=server.app)
+    results: Dict[str, Dict] = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench/api", timeout=None) as client:
+        results["register"] = await run_phase(requests, concurrency, lambda i: client.post("/auth/register", json={
+            "email": f"new{i}@example.com", "password": PASSWORD, "full_name": f"New {i}"}))
+
+        tokens: List[str] = []
+
+        async def login(i: int) -> httpx.Response:
+            response = await client.post("/auth/login", json={
+                "email": users[rng.randrange(len(users))]["email"], "password": PASSWORD})
+            if response.status_code == 200:
+                tokens.append(response.json()["access_token"])
+            return response
+
+        results["login"] = await run_phase(requests, concurrency, login)
+        if not tokens:
+            raise RuntimeError("No login succeeded; the synthetic dataset is unusable")
+        headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+
+        results["create_post"] = await run_phase(requests, concurrency, lambda i: client.post(
+            "/posts", headers=headers[i % len(headers)],
+            json={"content": _text(rng, 20), "post_type": rng.choice(POST_TYPES), "tags": ["benchmark"]}))
+        results["get_posts"] = await run_phase(requests, concurrency, lambda i: client.get(
+            "/posts", headers=headers[i % len(headers)], params={"limit": 20}))
+        results["create_comment"] = await run_phase(requests, concurrency, lambda i: client.post(
+            f"/posts/{posts[rng.randrange(len(posts))]['id']}/comments", headers=headers[i % len(headers)],
+            json={"content": _text(rng, 8)}))
+        results["get_comments"] = await run_phase(requests, concurrency, lambda i: client.get(
+            f"/posts/{posts[rng.randrange(len(posts))]['id']}/comments", headers=headers[i % len(headers)]))
+    return results
+
+
+async def bench_size(backend: str, size: int, args: argparse.Namespace, password_hash: str) -> Dict:
+    began = time.perf_counter()
+    dataset = generate(size, args.seed, password_hash)
+    generated = time.perf_counter() - began
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch('backend.server.STORAGE_BACKEND', backend), patch('backend.server.SQLITE_PATH', None):
+        began = time.perf_counter()
+        store = server.create_store(Path(tmp))
+        for name in ("users", "posts", "comments"):
+            store.replace(name, dataset[name])
+        store.close()
+        loaded = time.perf_counter() - began
+
+        with patch('backend.server.store', server.create_store(Path(tmp))), \
+             patch('backend.server.password_hasher', PasswordHasher(rounds=args.bcrypt_rounds)):
+            began = time.perf_counter()
+            async with server.app.router.lifespan_context(server.app):
+                started = time.perf_counter() - began
+                endpoints = await drive(dataset, args.requests, args.concurrency, args.seed)
+    return {"backend": backend, "size": size, "generate_seconds": round(generated, 3),
+            "load_seconds": round(loaded, 3), "startup_seconds": round(started, 3), "endpoints": endpoints}
+
+
+# --- Reporting ---
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(run: Dict):
+    print(f"\n{run['backend']} backend, {run['size']:,} documents "
+          f"(load {run['load_seconds']:.2f}s, startup {run['startup_seconds']:.2f}s)")
+    print(f"  {'endpoint':<15}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name in ENDPOINTS:
+        result = run["endpoints"][name]
+        latency = result["latency_ms"]
+        print(f"  {name:<15}{result['throughput_rps']:>10.1f}{latency['p50']:>10.2f}{latency['p90']:>10.2f}"
+              f"{latency['p99']:>10.2f}{latency['max']:>10.2f}{result['errors']:>8}")
+
+
+def compare(previous: Dict, current: Dict):
+    """Print throughput and latency changes for every (backend, size, endpoint) present in both runs."""
+    before = {(run["backend"], run["size"]): run for run in previous["runs"]}
+    print(f"\nchange versus {previous['meta'].get('commit') or 'previous run'} "
+          f"(negative latency / positive throughput is better)")
+    print(f"  {'backend':<8}{'size':>10}  {'endpoint':<15}{'req/s':>9}{'p50':>9}{'p99':>9}")
+    for run in current["runs"]:
+        old = before.get((run["backend"], run["size"]))
+        if old is None:
+            continue
+        for name in ENDPOINTS:
+            new_result, old_result = run["endpoints"][name], old["endpoints"].get(name)
+            if old_result is None:
+                continue
+
+            def change(new: float, base: float) -> str:
+                return f"{(new - base) / base * 100:+.0f}%" if base else "n/a"
+
+            print(f"  {run['backend']:<8}{run['size']:>10,}  {name:<15}"
+                  f"{change(new_result['throughput_rps'], old_result['throughput_rps']):>9}"
+                  f"{change(new_result['latency_ms']['p50'], old_result['latency_ms']['p50']):>9}"
+                  f"{change(new_result['latency_ms']['p99'], old_result['latency_ms']['p99']):>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="comma-separated dataset sizes (posts and comments each)")
+    parser.add_argument("--backend", choices=("json", "sqlite", "both"), default="json")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and size")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="results file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    backends = ["json", "sqlite"] if args.backend == "both" else [args.backend]
+    commit = _commit()
+    password_hash = hash_password(PASSWORD, rounds=args.bcrypt_rounds)
+    results = {
+        "meta": {"commit": commit, "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "encoder": "orjson" if orjson is not None else "json", "fast_responses": server.FAST_RESPONSES,
+                 "concurrency": args.concurrency, "requests": args.requests, "bcrypt_rounds": args.bcrypt_rounds,
+                 "seed": args.seed},
+        "runs": [],
+    }
+    for backend in backends:
+        for size in sizes:
+            run = asyncio.run(bench_size(backend, size, args, password_hash))
+            results["runs"].append(run)
+            print_run(run)
+
+    out = args.out or ROOT / "benchmarks" / "results" / f"load-{commit or 'unknown'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=1))
+    print(f"\nresults written to {out}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), results)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import { useEffect, useRef } from "react"
+import axios from "axios"
+
+// Subscribes to the backend's live event stream (/api/events) while mounted.
+// `handlers` maps event types ("post.created", "comment.created", "dropped")
+// to callbacks; `filters` may narrow the stream by post_type or post_id.
+// EventSource reconnects on its own; a "dropped" event means some updates
+// were missed and the caller should refetch.
+export function useLiveEvents(handlers, filters = {}) {
+  const handlersRef = useRef(handlers)
+  handlersRef.current = handlers
+  const { post_type, post_id } = filters
+
+  useEffect(() => {
+    const token = localStorage.getItem("token")
+    if (!token || typeof EventSource === "undefined") {
+      return undefined
+    }
+    const params = new URLSearchParams({ token })
+    if (post_type) params.set("post_type", post_type)
+    if (post_id) params.set("post_id", post_id)
+    const source = new EventSource(`${axios.defaults.baseURL}/events?${params}`)
+
+    const listen = (type) => (event) => {
+      const handler = handlersRef.current[type]
+      if (handler) handler(JSON.parse(event.data))
+    }
+    const types = ["post.created", "comment.created", "dropped"]
+    const listeners = types.map((type) => [type, listen(type)])
+    listeners.forEach(([type, listener]) => source.addEventListener(type, listener))
+
+    return () => {
+      listeners.forEach(([type, listener]) => source.removeEventListener(type, listener))
+      source.close()
+    }
+  }, [post_type, post_id])
+}
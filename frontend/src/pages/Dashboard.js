@@ -7,6 +7,7 @@ import { Button } from '../components/ui/button';
 import { Avatar, AvatarFallback, AvatarImage } from '../components/ui/avatar';
 import { Badge } from '../components/ui/badge';
 import { useToast } from '../hooks/use-toast';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { 
   Users, 
   GraduationCap, 
@@ -33,6 +34,18 @@ const Dashboard = () => {
     fetchDashboardData();
   }, []);
 
+  useLiveEvents({
+    'post.created': ({ post }) => {
+      setRecentPosts(prev => [post, ...prev.filter(p => p.id !== post.id)].slice(0, 5));
+      setStats(prev => prev && { ...prev, total_posts: prev.total_posts + 1 });
+    },
+    'comment.created': ({ comment, comments_count }) => {
+      setRecentPosts(prev => prev.map(p => p.id === comment.post_id ? { ...p, comments_count } : p));
+      setStats(prev => prev && { ...prev, total_comments: prev.total_comments + 1 });
+    },
+    dropped: () => fetchDashboardData()
+  });
+
   const fetchDashboardData = async () => {
     try {
       const [statsResponse, postsResponse] = await Promise.all([
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useContext } from 'react';
+import React, { useState, useEffect, useContext, useRef } from 'react';
 import axios from 'axios';
 import { AuthContext } from '../App';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
@@ -9,6 +9,7 @@ import { Avatar, AvatarFallback, AvatarImage } from '../components/ui/avatar';
 import { Badge } from '../components/ui/badge';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { useToast } from '../hooks/use-toast';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { 
   Plus,
   Heart,
@@ -25,6 +26,7 @@ import {
 const Feed = () => {
   const { user } = useContext(AuthContext);
   const [posts, setPosts] = useState([]);
+  const [feed, setFeed] = useState('everyone');
   const [loading, setLoading] = useState(true);
   const [showCreatePost, setShowCreatePost] = useState(false);
   const [newPost, setNewPost] = useState({
@@ -34,18 +36,42 @@ const Feed = () => {
     tags: []
   });
   const [newTag, setNewTag] = useState('');
+  const [uploadingImage, setUploadingImage] = useState(false);
   const [comments, setComments] = useState({});
+  // Comments of the loaded posts, fetched in one batch so opening a thread needs no request.
+  const prefetchedComments = useRef({});
   const [newComment, setNewComment] = useState({});
   const { toast } = useToast();
 
   useEffect(() => {
     fetchPosts();
-  }, []);
+  }, [feed]);
+
+  // New posts and comments arrive over the live stream instead of by re-fetching.
+  useLiveEvents({
+    'post.created': ({ post }) => {
+      // The stream carries everyone's posts; the home timeline only shows followed authors.
+      if (feed === 'following' && post.author_id !== user?.id) return;
+      setPosts(prev => prev.some(p => p.id === post.id) ? prev : [post, ...prev]);
+    },
+    'comment.created': ({ comment, comments_count }) => {
+      const prefetched = prefetchedComments.current[comment.post_id];
+      if (prefetched && !prefetched.some(c => c.id === comment.id)) {
+        prefetchedComments.current[comment.post_id] = [...prefetched, comment];
+      }
+      setPosts(prev => prev.map(p => p.id === comment.post_id ? { ...p, comments_count } : p));
+      setComments(prev => prev[comment.post_id] && !prev[comment.post_id].some(c => c.id === comment.id)
+        ? { ...prev, [comment.post_id]: [...prev[comment.post_id], comment] }
+        : prev);
+    },
+    dropped: () => fetchPosts()
+  });
 
   const fetchPosts = async () => {
     try {
-      const response = await axios.get('/posts');
+      const response = await axios.get(feed === 'following' ? '/timeline' : '/posts');
       setPosts(response.data);
+      prefetchComments(response.data);
     } catch (error) {
       toast({
         title: "Error loading posts",
@@ -71,7 +97,7 @@ const Feed = () => {
 
     try {
       const response = await axios.post('/posts', newPost);
-      setPosts([response.data, ...posts]);
+      setPosts(prev => prev.some(p => p.id === response.data.id) ? prev : [response.data, ...prev]);
       setNewPost({
         content: '',
         post_type: 'General Feed',
@@ -92,6 +118,30 @@ const Feed = () => {
     }
   };
 
+  const handleImageUpload = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+
+    setUploadingImage(true);
+    try {
+      // Sent as the raw body so the server can stream it to disk.
+      const response = await axios.post('/images', file, {
+        headers: { 'Content-Type': file.type || 'application/octet-stream' }
+      });
+      const origin = axios.defaults.baseURL.replace(/\/api$/, '');
+      setNewPost(prev => ({...prev, image_url: `${origin}${response.data.urls.feed}`}));
+    } catch (error) {
+      toast({
+        title: "Error uploading image",
+        description: error.response?.data?.detail || "Failed to upload your image",
+        variant: "destructive",
+      });
+    } finally {
+      setUploadingImage(false);
+    }
+  };
+
   const handleAddTag = () => {
     if (newTag.trim() && !newPost.tags.includes(newTag.trim())) {
       setNewPost({
@@ -109,11 +159,29 @@ const Feed = () => {
     });
   };
 
+  const prefetchComments = async (loadedPosts) => {
+    const postIds = loadedPosts.slice(0, 100).map(post => post.id);
+    if (postIds.length === 0) return;
+    try {
+      const response = await axios.post('/comments/batch', { post_ids: postIds, limit: 50 });
+      prefetchedComments.current = { ...prefetchedComments.current, ...response.data };
+    } catch (error) {
+      // Threads fall back to loading one at a time when opened.
+    }
+  };
+
   const fetchComments = async (postId) => {
     if (comments[postId]) {
       return; // Already loaded
     }
-    
+    const prefetched = prefetchedComments.current[postId];
+    const post = posts.find(p => p.id === postId);
+    // The batch caps each thread, so longer ones are still loaded in full.
+    if (prefetched && post && prefetched.length >= post.comments_count) {
+      setComments(prev => ({ ...prev, [postId]: prefetched }));
+      return;
+    }
+
     try {
       const response = await axios.get(`/posts/${postId}/comments`);
       setComments(prev => ({
@@ -140,7 +208,9 @@ const Feed = () => {
       
       setComments(prev => ({
         ...prev,
-        [postId]: [...(prev[postId] || []), response.data]
+        [postId]: (prev[postId] || []).some(c => c.id === response.data.id)
+          ? prev[postId]
+          : [...(prev[postId] || []), response.data]
       }));
       
       setNewComment(prev => ({
@@ -224,6 +294,27 @@ const Feed = () => {
                 </Button>
               </div>
 
+              {/* Feed Source */}
+              <div className="flex space-x-2 mb-6">
+                <Button
+                  variant={feed === 'everyone' ? 'default' : 'outline'}
+                  size="sm"
+                  onClick={() => setFeed('everyone')}
+                  data-testid="feed-everyone-button"
+                >
+                  Everyone
+                </Button>
+                <Button
+                  variant={feed === 'following' ? 'default' : 'outline'}
+                  size="sm"
+                  onClick={() => setFeed('following')}
+                  data-testid="feed-following-button"
+                >
+                  <Users className="h-4 w-4 mr-2" />
+                  Following
+                </Button>
+              </div>
+
               {/* Create Post Form */}
               {showCreatePost && (
                 <Card className="mb-6">
@@ -256,12 +347,27 @@ const Feed = () => {
                           </SelectContent>
                         </Select>
                         
-                        <Input
-                          placeholder="Image URL (optional)"
-                          value={newPost.image_url}
-                          onChange={(e) => setNewPost({...newPost, image_url: e.target.value})}
-                          data-testid="post-image-input"
-                        />
+                        <div className="flex space-x-2">
+                          <Input
+                            placeholder="Image URL (optional)"
+                            value={newPost.image_url}
+                            onChange={(e) => setNewPost({...newPost, image_url: e.target.value})}
+                            className="flex-1"
+                            data-testid="post-image-input"
+                          />
+                          <Button type="button" variant="outline" disabled={uploadingImage} asChild>
+                            <label className="cursor-pointer" data-testid="post-image-upload">
+                              <ImageIcon className="h-4 w-4" />
+                              <input
+                                type="file"
+                                accept="image/jpeg,image/png,image/gif,image/webp"
+                                className="hidden"
+                                onChange={handleImageUpload}
+                                disabled={uploadingImage}
+                              />
+                            </label>
+                          </Button>
+                        </div>
                       </div>
 
                       {/* Tags */}
@@ -352,6 +458,7 @@ const Feed = () => {
                           <img 
                             src={post.image_url} 
                             alt="Post image" 
+                            loading="lazy"
                             className="mt-3 rounded-lg max-w-full h-auto"
                             onError={(e) => e.target.style.display = 'none'}
                           />
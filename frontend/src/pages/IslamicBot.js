@@ -27,6 +27,7 @@ const IslamicBot = () => {
   const [loading, setLoading] = useState(false);
   const [imageFile, setImageFile] = useState(null);
   const messagesEndRef = useRef(null);
+  const abortRef = useRef(null);
   const { toast } = useToast();
 
   const scrollToBottom = () => {
@@ -37,6 +38,9 @@ const IslamicBot = () => {
     scrollToBottom();
   }, [messages]);
 
+  // Leaving the page cancels an answer in progress (the server stops generating it too).
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   useEffect(() => {
     // Load initial greeting
     setMessages([
@@ -49,6 +53,55 @@ const IslamicBot = () => {
     ]);
   }, []);
 
+  // Reads the bot's Server-Sent Events stream, handing each delta to onDelta as it arrives.
+  const streamChat = async (payload, onDelta) => {
+    abortRef.current?.abort();
+    const controller = new AbortController();
+    abortRef.current = controller;
+
+    const response = await fetch(`${axios.defaults.baseURL}/bot/chat`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        Authorization: axios.defaults.headers.common['Authorization'] || ''
+      },
+      body: JSON.stringify(payload),
+      signal: controller.signal
+    });
+    if (!response.ok) {
+      throw new Error(`Bot chat failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach(line => {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        if (!data) continue;
+        const parsed = JSON.parse(data);
+        if (event === 'error') throw new Error(parsed.detail);
+        if (event === 'done') result = parsed;
+        else onDelta(parsed.delta);
+      }
+    }
+    if (!result) throw new Error('Bot response ended early');
+    return result;
+  };
+
   const handleSendMessage = async () => {
     if (!newMessage.trim() && !imageFile) return;
 
@@ -63,32 +116,33 @@ const IslamicBot = () => {
     setMessages(prev => [...prev, userMessage]);
     setLoading(true);
 
+    const botId = (Date.now() + 1).toString();
+    const appendDelta = (delta) => setMessages(prev => prev.some(m => m.id === botId)
+      ? prev.map(m => m.id === botId ? { ...m, content: m.content + delta } : m)
+      : [...prev, { id: botId, type: 'bot', content: delta, timestamp: new Date().toISOString() }]);
+
     try {
-      const response = await axios.post('/bot/chat', {
+      const result = await streamChat({
         message: newMessage,
         image_url: imageFile ? URL.createObjectURL(imageFile) : null
-      });
+      }, appendDelta);
 
-      const botMessage = {
-        id: (Date.now() + 1).toString(),
-        type: 'bot',
-        content: response.data.response,
-        timestamp: response.data.timestamp
-      };
-
-      setMessages(prev => [...prev, botMessage]);
+      setMessages(prev => prev.map(m => m.id === botId
+        ? { ...m, content: result.response, timestamp: result.timestamp }
+        : m));
     } catch (error) {
+      if (error.name === 'AbortError') return;
       console.error('Bot chat error:', error);
       
       const errorMessage = {
-        id: (Date.now() + 1).toString(),
+        id: botId,
         type: 'bot',
         content: 'I apologize, but I\'m experiencing technical difficulties right now. Please try again later, or feel free to explore our Quran, Hadith, and learning sections for authentic Islamic knowledge.',
         timestamp: new Date().toISOString(),
         isError: true
       };
 
-      setMessages(prev => [...prev, errorMessage]);
+      setMessages(prev => [...prev.filter(m => m.id !== botId), errorMessage]);
       
       toast({
         title: "Connection Error",
@@ -108,28 +162,29 @@ const IslamicBot = () => {
     const userMessage = messages[messageIndex - 1];
     if (userMessage.type !== 'user') return;
 
+    const botId = messages[messageIndex].id;
     setLoading(true);
 
     try {
-      const response = await axios.post('/bot/chat', {
-        message: userMessage.content + ' (Please provide an alternative response)'
+      let content = '';
+      const result = await streamChat({
+        message: userMessage.content,
+        regenerate: true
+      }, (delta) => {
+        content += delta;
+        setMessages(prev => prev.map(m => m.id === botId ? { ...m, content } : m));
       });
 
-      const newBotMessage = {
-        ...messages[messageIndex],
-        content: response.data.response,
-        timestamp: response.data.timestamp
-      };
-
-      const updatedMessages = [...messages];
-      updatedMessages[messageIndex] = newBotMessage;
-      setMessages(updatedMessages);
+      setMessages(prev => prev.map(m => m.id === botId
+        ? { ...m, content: result.response, timestamp: result.timestamp, isError: false }
+        : m));
 
       toast({
         title: "Response regenerated",
         description: "I've provided an alternative answer for you.",
       });
     } catch (error) {
+      if (error.name === 'AbortError') return;
       toast({
         title: "Error",
         description: "Failed to regenerate response. Please try again.",
@@ -37,6 +37,7 @@ const Profile = () => {
   const [userPosts, setUserPosts] = useState([]);
   const [newSkill, setNewSkill] = useState('');
   const [newInterest, setNewInterest] = useState('');
+  const [following, setFollowing] = useState(false);
   const { toast } = useToast();
 
   const isOwnProfile = !userId || userId === user?.id;
@@ -51,15 +52,20 @@ const Profile = () => {
       if (isOwnProfile) {
         profileData = user;
       } else {
-        const response = await axios.get(`/users/${userId}`);
+        const [response, followResponse] = await Promise.all([
+          axios.get(`/users/${userId}`),
+          axios.get(`/users/${userId}/follow`)
+        ]);
         profileData = response.data;
+        setFollowing(followResponse.data.following);
       }
       setProfile(profileData);
       
       // Fetch user's posts
-      const postsResponse = await axios.get('/posts?limit=50');
-      const filteredPosts = postsResponse.data.filter(post => post.author_id === profileData.id);
-      setUserPosts(filteredPosts);
+      const postsResponse = await axios.get('/posts', {
+        params: { author_id: profileData.id, limit: 50 }
+      });
+      setUserPosts(postsResponse.data);
     } catch (error) {
       toast({
         title: "Error loading profile",
@@ -71,6 +77,22 @@ const Profile = () => {
     }
   };
 
+  const handleToggleFollow = async () => {
+    try {
+      const response = following
+        ? await axios.delete(`/users/${profile.id}/follow`)
+        : await axios.post(`/users/${profile.id}/follow`);
+      setProfile(response.data);
+      setFollowing(!following);
+    } catch (error) {
+      toast({
+        title: following ? "Error unfollowing" : "Error following",
+        description: "Please try again",
+        variant: "destructive",
+      });
+    }
+  };
+
   const handleSaveProfile = async () => {
     try {
       const response = await axios.put('/users/me', profile);
@@ -364,10 +386,17 @@ const Profile = () => {
                       </>
                     ) : (
                       <div className="space-y-2">
-                        <Button className="w-full bg-emerald-600 hover:bg-emerald-700">
-                          <Plus className="h-4 w-4 mr-2" />
-                          Follow
-                        </Button>
+                        {following ? (
+                          <Button className="w-full" variant="outline" onClick={handleToggleFollow}>
+                            <X className="h-4 w-4 mr-2" />
+                            Unfollow
+                          </Button>
+                        ) : (
+                          <Button className="w-full bg-emerald-600 hover:bg-emerald-700" onClick={handleToggleFollow}>
+                            <Plus className="h-4 w-4 mr-2" />
+                            Follow
+                          </Button>
+                        )}
                         <Button className="w-full" variant="outline">
                           <MessageCircle className="h-4 w-4 mr-2" />
                           Message
@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -22,11 +23,11 @@ const Quran = () => {
   const fetchSurahs = async () => {
     try {
       setLoading(true);
-      const response = await fetch('https://api.alquran.cloud/v1/surah');
-      const data = await response.json();
+      // Served from the locally ingested text; cached by the browser between visits.
+      const response = await axios.get('/quran/surahs');
       
-      if (data.code === 200) {
-        setSurahs(data.data);
+      if (Array.isArray(response.data)) {
+        setSurahs(response.data);
       } else {
         // Fallback data
         setSurahs([
@@ -63,21 +64,14 @@ const Quran = () => {
     setVersesLoading(true);
     
     try {
-      // Fetch Arabic text
-      const arabicResponse = await fetch(`https://api.alquran.cloud/v1/surah/${surah.number}`);
-      const arabicData = await arabicResponse.json();
+      // Arabic text and translation arrive merged in one response
+      const response = await axios.get(`/quran/surahs/${surah.number}`);
       
-      // Fetch English translation
-      const englishResponse = await fetch(`https://api.alquran.cloud/v1/surah/${surah.number}/en.asad`);
-      const englishData = await englishResponse.json();
-      
-      if (arabicData.code === 200 && englishData.code === 200) {
-        const combinedVerses = arabicData.data.ayahs.map((ayah, index) => ({
-          number: ayah.numberInSurah,
-          arabic: ayah.text,
-          translation: englishData.data.ayahs[index]?.text || 'Translation not available'
-        }));
-        setVerses(combinedVerses);
+      if (Array.isArray(response.data?.ayahs)) {
+        setVerses(response.data.ayahs.map((ayah) => ({
+          ...ayah,
+          translation: ayah.translation || 'Translation not available'
+        })));
       } else {
         // Fallback verses
         const fallbackVerses = [
@@ -0,0 +1,96 @@
+"""Minimal local HTTP server for exercising outbound calls in tests."""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence
+
+Handler = Callable[[BaseHTTPRequestHandler], None]
+
+
+def json_route(payload, status: int = 200, delay: float = 0.0) -> Handler:
+    def handle(request: BaseHTTPRequestHandler):
+        if delay:
+            time.sleep(delay)
+        body = json.dumps(payload).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+    return handle
+
+
+def sse_route(chunks: Sequence[str], delay: float = 0.0) -> Handler:
+    """Streams ``chunks`` as OpenAI-style chat completion deltas, ``delay`` seconds apart."""
+    def handle(request: BaseHTTPRequestHandler):
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Connection", "close")
+        request.end_headers()
+        request.close_connection = True
+        try:
+            for chunk in chunks:
+                event = {"choices": [{"delta": {"content": chunk}}]}
+                request.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                request.wfile.flush()
+                if delay:
+                    time.sleep(delay)
+            request.wfile.write(b"data: [DONE]\n\n")
+        except OSError:
+            request.server.aborted += 1  # the client hung up mid-stream
+    return handle
+
+
+class StubServer:
+    """Serves ``routes`` (path -> handler) on an ephemeral localhost port.
+
+    Counts hits per path and keeps the decoded JSON body of each POST in ``bodies``.
+    """
+
+    def __init__(self, routes: Dict[str, Handler]):
+        self.routes = routes
+        self.hits: Counter = Counter()
+        self.bodies: Dict[str, List] = {}
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self):
+                path = self.path.split("?", 1)[0]
+                stub.hits[path] += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    stub.bodies.setdefault(path, []).append(json.loads(self.rfile.read(length)))
+                handler = stub.routes.get(path)
+                if handler is None:
+                    self.send_error(404)
+                    return
+                handler(self)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self.server.daemon_threads = True
+        self.server.aborted = 0
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def aborted(self) -> int:
+        """Streams cut short because the client disconnected."""
+        return self.server.aborted
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.bot import BotBusy, BotError, ChatBot, normalize_prompt
+from tests.stubs import StubServer, json_route, sse_route
+
+
+async def _ask(bot: ChatBot, message: str):
+    try:
+        return [delta async for delta in bot.stream(message)]
+    finally:
+        await bot.close()
+
+
+def test_normalize_prompt_ignores_case_punctuation_and_spacing():
+    assert normalize_prompt("  What are the FIVE pillars of Islam?? ") == "what are the five pillars of islam"
+    assert normalize_prompt("what are the five\tpillars, of islam") == "what are the five pillars of islam"
+
+
+def test_stream_relays_deltas_and_caches_the_answer():
+    """Tokens arrive in order and the finished answer is served from cache for equivalent prompts."""
+    with StubServer({"/chat": sse_route(["The five ", "pillars ", "are..."])}) as stub:
+        bot = ChatBot(f"{stub.url}/chat", "key", "test-model")
+        assert asyncio.run(_ask(bot, "What are the five pillars?")) == ["The five ", "pillars ", "are..."]
+        assert bot.cached_reply("what are the five pillars") == "The five pillars are..."
+        request = stub.bodies["/chat"][0]
+        assert request["stream"] is True and request["model"] == "test-model"
+        assert request["messages"][-1] == {"role": "user", "content": "What are the five pillars?"}
+
+
+def test_upstream_errors_are_not_cached():
+    with StubServer({"/chat": json_route({"error": {"message": "rate limited"}}, status=429)}) as stub:
+        bot = ChatBot(f"{stub.url}/chat", "key", "test-model")
+        with pytest.raises(BotError):
+            asyncio.run(_ask(bot, "Hello"))
+        assert bot.cached_reply("Hello") is None
+
+
+def test_per_user_limit():
+    bot = ChatBot("http://unused", "key", "test-model", per_user=2)
+    bot.acquire("u1")
+    bot.acquire("u1")
+    with pytest.raises(BotBusy):
+        bot.acquire("u1")
+    bot.acquire("u2")
+    for user_id in ("u1", "u1", "u2"):
+        bot.release(user_id)
+    assert bot.active == {}
+
+
+def test_cancelling_the_consumer_closes_the_upstream_stream():
+    """A consumer going away mid-answer aborts the upstream request and caches nothing."""
+    with StubServer({"/chat": sse_route(["word "] * 50, delay=0.05)}) as stub:
+        bot = ChatBot(f"{stub.url}/chat", "key", "test-model")
+
+        async def scenario():
+            received = []
+
+            async def consume():
+                async for delta in bot.stream("Tell me a long story"):
+                    received.append(delta)
+
+            task = asyncio.ensure_future(consume())
+            while not received:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await bot.close()
+            await asyncio.sleep(0.3)
+
+        asyncio.run(scenario())
+        assert bot.cancelled == 1
+        assert bot.cached_reply("Tell me a long story") is None
+        assert stub.aborted == 1
@@ -0,0 +1,25 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.cache import LRUCache
+
+
+def test_lru_eviction_and_expiry():
+    """The least recently used entry goes first, and expired entries read as misses."""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("old", "token", expires_at=time.time() - 1)
+    assert cache.get("old") is None
+
+    short = LRUCache(ttl=0.01)
+    short.set("k", "v", expires_at=time.time() + 3600)
+    time.sleep(0.02)
+    assert short.get("k") is None
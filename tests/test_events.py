@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.events import DISCONNECT, EventHub
+
+
+def test_filtered_subscribers_only_receive_matching_events():
+    async def scenario():
+        hub = EventHub()
+        everything = hub.subscribe()
+        mentorship = hub.subscribe(post_type="Mentorship")
+        thread = hub.subscribe(post_id="p2")
+        hub.publish("post.created", {"post": {"id": "p1"}}, post_type="Mentorship", post_id="p1")
+        hub.publish("comment.created", {"comment": {"id": "c1"}}, post_type="General Feed", post_id="p2")
+
+        assert [e.type for e in everything.queue] == ["post.created", "comment.created"]
+        assert [e.post_id for e in mentorship.queue] == ["p1"]
+        assert [e.post_id for e in thread.queue] == ["p2"]
+        event = await thread.get(timeout=1)
+        assert json.loads(event.payload) == {"id": 2, "type": "comment.created", "comment": {"id": "c1"}}
+        assert event.sse().startswith(b"id: 2\nevent: comment.created\ndata: {")
+
+    asyncio.run(scenario())
+
+
+def test_get_wakes_on_publish_and_times_out_for_heartbeats():
+    async def scenario():
+        hub = EventHub()
+        subscription = hub.subscribe()
+        assert await subscription.get(timeout=0.01) is None
+        waiter = asyncio.ensure_future(subscription.get(timeout=5))
+        await asyncio.sleep(0)
+        hub.publish("post.created", {})
+        assert (await waiter).type == "post.created"
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_policy_bounds_the_queue_and_counts_losses():
+    async def scenario():
+        hub = EventHub(queue_size=3)
+        subscription = hub.subscribe()
+        for i in range(5):
+            hub.publish("post.created", {"n": i})
+        assert [json.loads(e.payload)["n"] for e in subscription.queue] == [2, 3, 4]
+        assert subscription.take_dropped() == 2 and subscription.take_dropped() == 0
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_policy_closes_slow_subscribers():
+    async def scenario():
+        hub = EventHub(queue_size=2, policy=DISCONNECT)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        hub.publish("post.created", {})
+        await fast.get(timeout=1)
+        hub.publish("post.created", {})
+        hub.publish("post.created", {})
+        assert slow.closed and not fast.closed
+        assert await slow.get(timeout=1) is None
+        assert len(hub) == 1
+
+    asyncio.run(scenario())
+
+
+def test_many_idle_subscribers_and_cleanup():
+    async def scenario():
+        hub = EventHub()
+        subscriptions = [hub.subscribe(post_id=f"p{i % 100}") for i in range(20000)]
+        hub.publish("comment.created", {}, post_id="p7")
+        assert sum(len(s.queue) for s in subscriptions) == 200
+        for subscription in subscriptions:
+            subscription.close()
+        assert len(hub) == 0 and hub._subscribers == {}
+
+    asyncio.run(scenario())
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EventHub(policy="block")
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.hadith import CorpusNotIngested, HadithCorpus, ingest, normalize_terms
+
+ARABIC = [
+    "إِنَّمَا الأَعْمَالُ بِالنِّيَّاتِ",
+    "الدِّينُ النَّصِيحَةُ",
+    "لاَ يُؤْمِنُ أَحَدُكُمْ حَتَّى يُحِبَّ لأَخِيهِ مَا يُحِبُّ لِنَفْسِهِ",
+]
+ENGLISH = [
+    "Actions are judged by intentions.",
+    "The religion is sincere advice.",
+    "None of you truly believes until he loves for his brother what he loves for himself.",
+]
+
+
+def _edition(name, texts, sections):
+    return {
+        "metadata": {"name": name, "sections": {"1": "Revelation", "2": "Belief"},
+                     "section_details": {"1": {"hadithnumber_first": 1, "hadithnumber_last": 1},
+                                         "2": {"hadithnumber_first": 2, "hadithnumber_last": 3}}},
+        "hadiths": [{"hadithnumber": i + 1, "arabicnumber": i + 1, "text": text, "grades": [],
+                     "reference": {"book": sections[i], "hadith": i + 1}} for i, text in enumerate(texts)],
+    }
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    source = tmp_path / "editions"
+    source.mkdir()
+    (source / "ara-bukhari.json").write_text(json.dumps(_edition("Sahih al Bukhari", ARABIC, [1, 2, 2])), "utf-8")
+    (source / "eng-bukhari.json").write_text(json.dumps(_edition("Sahih al Bukhari", ENGLISH, [1, 2, 2])), "utf-8")
+    (source / "eng-muslim.min.json").write_text(json.dumps(_edition("Sahih Muslim", ENGLISH[1:], [1, 1])), "utf-8")
+    (source / "notes.json").write_text("{}", "utf-8")
+    assert ingest(source, tmp_path / "store") == {"bukhari": 3, "muslim": 2}
+    return HadithCorpus(tmp_path / "store")
+
+
+def test_normalization_folds_diacritics_and_letter_variants():
+    assert normalize_terms("الأَعْمَالُ") == normalize_terms("الاعمال") == ["الاعمال"]
+    assert normalize_terms("نَوَى ـ الصلاة") == ["نوي", "الصلاه"]
+    assert normalize_terms("Ṣaḥīḥ BUKHARI") == ["sahih", "bukhari"]
+
+
+def test_languages_are_merged_and_paged_by_number(corpus):
+    assert [b["book"] for b in corpus.list_books()] == ["bukhari", "muslim"]
+    first = corpus.get("bukhari", 1)
+    assert first["text"] == {"ara": ARABIC[0], "eng": ENGLISH[0]} and first["book"] == "bukhari"
+    assert [h["number"] for h in corpus.page("bukhari", start=2, limit=5)] == [2, 3]
+    assert [h["number"] for h in corpus.page("bukhari", section=2, limit=1)] == [2]
+    assert corpus.get("bukhari", 99) is None
+    assert corpus.book("bukhari").meta["sections"]["2"] == {"name": "Belief", "first": 2, "last": 3}
+
+
+def test_search_is_diacritic_insensitive_and_spans_books(corpus):
+    hits = corpus.search("الاعمال بالنيات")
+    assert hits["total"] == 1 and hits["results"][0]["number"] == 1
+    # Unvoweled query, voweled text; the last term matches as a prefix.
+    assert corpus.search("يؤمن احدكم حتي")["results"][0]["number"] == 3
+    assert corpus.search("SINCERE adv")["total"] == 2
+    assert [(h["book"], h["number"]) for h in corpus.search("sincere", book="muslim")["results"]] == [("muslim", 1)]
+    page = corpus.search("loves", offset=1, limit=1)
+    assert page["total"] == 2 and [h["book"] for h in page["results"]] == ["muslim"]
+    assert corpus.search("zakat")["total"] == 0
+
+
+def test_missing_corpus(tmp_path):
+    with pytest.raises(CorpusNotIngested):
+        HadithCorpus(tmp_path / "nothing").list_books()
@@ -0,0 +1,78 @@
+import asyncio
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.images import ImageStore, ImageTooLarge, UnsupportedImage, sniff_media_type
+
+
+def _png(width=1600, height=900) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (30, 120, 80)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_uploads_are_streamed_deduplicated_and_validated(tmp_path):
+    store = ImageStore(tmp_path, max_bytes=200_000, use_processes=False)
+    data = _png()
+    digest, created = asyncio.run(store.save(_chunks(data)))
+    assert created and store.original_path(digest).read_bytes() == data
+    assert store.media_type(digest) == "image/png"
+    assert asyncio.run(store.save(_chunks(data, 4096))) == (digest, False)
+
+    with pytest.raises(UnsupportedImage):
+        asyncio.run(store.save(_chunks(b"<html>not an image</html>")))
+    with pytest.raises(ImageTooLarge):
+        asyncio.run(store.save(_chunks(b"\x89PNG\r\n\x1a\n" + b"\0" * 300_000)))
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert sniff_media_type(b"RIFF\0\0\0\0WEBPVP8 ") == "image/webp"
+
+
+def test_variants_are_built_once_in_the_background(tmp_path):
+    store = ImageStore(tmp_path, use_processes=False)
+
+    async def scenario():
+        digest, _ = await store.save(_chunks(_png()))
+        first = store.ensure_variants(digest)
+        assert store.ensure_variants(digest) is first
+        feed = await store.variant(digest, "feed", wait=10)
+        assert store.ensure_variants(digest) is None
+        return digest, feed
+
+    digest, feed = asyncio.run(scenario())
+    store.shutdown()
+    with Image.open(feed) as image:
+        assert image.format == "WEBP" and image.size == (1080, 608)
+    with Image.open(store.variant_path(digest, "thumb")) as image:
+        assert max(image.size) == 320
+
+
+def test_failed_variant_builds_are_not_retried(tmp_path):
+    store = ImageStore(tmp_path, use_processes=False)
+    calls = []
+
+    async def scenario():
+        digest, _ = await store.save(_chunks(b"\x89PNG\r\n\x1a\n" + b"not really a png" * 100))
+        real_generate = store._generate
+
+        async def counting_generate(*args):
+            calls.append(args)
+            await real_generate(*args)
+
+        store._generate = counting_generate
+        assert await store.variant(digest, "feed", wait=10) is None
+        assert store.ensure_variants(digest) is None
+        assert await store.variant(digest, "thumb", wait=10) is None
+
+    asyncio.run(scenario())
+    store.shutdown()
+    assert len(calls) == 1
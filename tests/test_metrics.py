@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.metrics import Metrics, Registry, StackSampler, current_timings
+from backend.storage import IOStats
+
+
+def test_histograms_render_cumulative_buckets_in_prometheus_format():
+    registry = Registry()
+    latency = registry.histogram("req_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, ('/a"b',))
+    registry.counter("hits_total", "Hits.").inc()
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP req_seconds Latency.", "# TYPE req_seconds histogram"]
+    assert 'req_seconds_bucket{route="/a\\"b",le="0.1"} 2' in lines
+    assert 'req_seconds_bucket{route="/a\\"b",le="1"} 3' in lines
+    assert 'req_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in lines
+    assert 'req_seconds_count{route="/a\\"b"} 4' in lines and 'req_seconds_sum{route="/a\\"b"} 3.65' in lines
+    assert lines[-1] == "hits_total 1"
+
+
+def test_storage_timer_records_io_deltas():
+    metrics = Metrics()
+    io = IOStats()
+    with metrics.storage("find", "posts", io):
+        io.docs_scanned += 40
+        io.bytes_read += 1024
+    assert metrics.storage_scanned.values == {("find", "posts"): 40}
+    assert metrics.storage_read.values == {("find", "posts"): 1024}
+    assert metrics.storage_seconds.values[("find", "posts")][2] == 1
+    with Metrics(enabled=False).storage("find", "posts", io):
+        pass
+
+
+def test_outbound_calls_are_timed_until_the_body_is_read():
+    metrics = Metrics()
+    inner = httpx.MockTransport(lambda request: httpx.Response(200, content=b"x" * 300))
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=metrics.transport("upstream", inner)) as client:
+            return (await client.get("http://example.test/")).content
+
+    assert asyncio.run(fetch()) == b"x" * 300
+    assert metrics.outbound_seconds.values[("upstream", "2xx")][2] == 1
+    assert metrics.outbound_bytes.values == {("upstream",): 300}
+    assert current_timings() is None
+
+
+def test_sampler_collects_loop_stacks_only_while_a_request_is_slow():
+    sampler = StackSampler(threshold=0.05)
+    sampler.loop_thread = threading.get_ident()
+    sampler.begin(1, time.perf_counter(), "GET /api/posts")
+    sampler.sample()
+    assert sampler.samples == 0
+    sampler.begin(1, time.perf_counter() - 1, "GET /api/posts")
+    sampler.sample()
+    sampler.end(1)
+    sampler.sample()
+    assert sampler.samples == 1
+    stack, count = sampler.folded().splitlines()[0].rsplit(" ", 1)
+    assert stack.startswith("GET /api/posts;") and "test_metrics.py:test_sampler" in stack and count == "1"
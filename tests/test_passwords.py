@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.passwords import HasherBusy, PasswordHasher, hash_cost
+
+
+def test_hash_and_verify_run_off_the_event_loop():
+    """Hashing happens on the executor thread and honours the configured cost."""
+    hasher = PasswordHasher(rounds=4, workers=1)
+    loop_thread = threading.get_ident()
+
+    async def scenario():
+        hashed = await hasher.hash("secret")
+        worker = await hasher._run(threading.get_ident)
+        return hashed, worker, await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        hashed, worker, ok, bad = asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+    assert worker != loop_thread
+    assert hash_cost(hashed) == 4 and ok and not bad
+    assert hasher.needs_rehash(hashed) is False
+    assert PasswordHasher(rounds=10).needs_rehash(hashed) is True
+
+
+def test_overflowing_the_queue_raises_busy():
+    """Calls beyond workers + max_pending are rejected immediately."""
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+    gate = threading.Event()
+
+    async def scenario():
+        blocked = [asyncio.ensure_future(hasher._run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HasherBusy):
+            await hasher.hash("secret")
+        gate.set()
+        await asyncio.gather(*blocked)
+        assert hash_cost(await hasher.hash("secret")) == 4
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
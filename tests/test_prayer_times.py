@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import prayer_times
+
+
+def _day(lat, lng, tz, day, method="mwl", madhab="shafi"):
+    times = prayer_times.compute_times(lat, lng, prayer_times.date_range(day, day), tz, method, madhab)
+    return {name: prayer_times.format_hours(value)[0][0] for name, value in times.items()}
+
+
+def test_makkah_equinox_times_are_plausible():
+    """Makkah around the March equinox: noon near 12:28 local and prayers in order."""
+    times = _day(21.4225, 39.8262, 3, date(2024, 3, 20), method="makkah")
+    assert times["Dhuhr"] == "12:28"
+    assert times["Sunrise"] == "06:25"
+    assert times["Maghrib"] == "18:32"
+    # Umm al-Qura puts Isha a fixed 90 minutes after Maghrib.
+    assert times["Isha"] == "20:02"
+    assert list(times.values()) == sorted(times.values())
+
+
+def test_method_and_madhab_change_the_result():
+    """Shallower Fajr angles are later and the Hanafi Asr is later than the majority Asr."""
+    day = date(2024, 5, 1)
+    mwl = _day(33.6844, 73.0479, 5, day, method="mwl")
+    isna = _day(33.6844, 73.0479, 5, day, method="isna")
+    hanafi = _day(33.6844, 73.0479, 5, day, method="mwl", madhab="hanafi")
+    assert isna["Fajr"] > mwl["Fajr"]
+    assert hanafi["Asr"] > mwl["Asr"]
+    assert hanafi["Dhuhr"] == mwl["Dhuhr"]
+
+
+def test_batch_shapes_and_polar_day():
+    """Many locations against a year of dates in one call; undefined times come back as None."""
+    dates = prayer_times.date_range(date(2024, 1, 1), date(2024, 12, 31))
+    times = prayer_times.compute_times([51.5, -33.9, 69.6], [-0.13, 18.4, 18.9], dates, [0, 2, 1])
+    assert times["Dhuhr"].shape == (3, 366)
+    # Tromsø in late June: the sun never sets.
+    tromso_midsummer = prayer_times.format_hours(times["Maghrib"][2, 172])
+    assert tromso_midsummer is None
+    assert not np.isnan(times["Fajr"][0]).any()
+
+
+def test_qibla_bearing_and_distance():
+    """Known great-circle bearings from London and New York."""
+    bearings = prayer_times.qibla_bearing([51.5074, 40.7128], [-0.1278, -74.0060])
+    assert np.allclose(bearings, [118.99, 58.48], atol=0.05)
+    assert 4700 < prayer_times.kaaba_distance_km(51.5074, -0.1278) < 4900
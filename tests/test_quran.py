@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import sys
+
+import brotli
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.quran import QuranNotIngested, QuranStore, ingest
+from backend.responses import negotiate_encoding
+
+SURAHS = [
+    (1, "الفاتحة", "Al-Faatiha", ["بِسْمِ اللَّهِ", "الْحَمْدُ لِلَّهِ", "الرَّحْمَٰنِ الرَّحِيمِ"]),
+    (2, "البقرة", "Al-Baqara", ["الم", "ذَٰلِكَ الْكِتَابُ"]),
+]
+
+
+def _edition(identifier, translate=False):
+    surahs = []
+    for number, name, english, ayahs in SURAHS:
+        surahs.append({
+            "number": number, "name": name, "englishName": english, "englishNameTranslation": english,
+            "revelationType": "Meccan",
+            "ayahs": [{"number": number * 100 + i, "numberInSurah": i, "juz": 1, "page": number,
+                       "text": f"{english} {i}" if translate else text} for i, text in enumerate(ayahs, 1)],
+        })
+    return {"code": 200, "data": {"surahs": surahs, "edition": {"identifier": identifier}}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "ar.json").write_text(json.dumps(_edition("quran-uthmani")), "utf-8")
+    (tmp_path / "en.json").write_text(json.dumps(_edition("en.asad", translate=True)), "utf-8")
+    assert ingest(tmp_path / "ar.json", tmp_path / "en.json", tmp_path / "quran") == 2
+    return QuranStore(tmp_path / "quran")
+
+
+def test_ingest_merges_editions_and_writes_compressed_variants(store):
+    asset = store.surah(1)
+    variants = asset.variants()
+    assert list(variants) == ["br", "gzip", None]
+    plain = variants[None].read_bytes()
+    assert gzip.decompress(variants["gzip"].read_bytes()) == plain
+    assert brotli.decompress(variants["br"].read_bytes()) == plain
+    surah = json.loads(plain)
+    assert surah["englishName"] == "Al-Faatiha" and surah["editions"]["translation"] == "en.asad"
+    assert surah["ayahs"][1] == {"number": 2, "global_number": 102, "arabic": "الْحَمْدُ لِلَّهِ",
+                                 "translation": "Al-Faatiha 2", "juz": 1, "page": 1}
+    assert [s["numberOfAyahs"] for s in json.loads(store.surah_list().path.read_bytes())] == [3, 2]
+    with pytest.raises(KeyError):
+        store.surah(3)
+
+
+def test_ayah_ranges_are_cut_from_the_stored_payload(store):
+    body, etag = store.ayah_range(1, 2, 3)
+    surah = json.loads(body)
+    assert [a["number"] for a in surah["ayahs"]] == [2, 3] and surah["numberOfAyahs"] == 3
+    assert etag == store.surah(1).etag[:-1] + '-2-3"'
+    assert [a["number"] for a in json.loads(store.ayah_range(2, 2)[0])["ayahs"]] == [2]
+    with pytest.raises(ValueError):
+        store.ayah_range(1, 3, 4)
+    with pytest.raises(QuranNotIngested):
+        QuranStore(store.root / "missing").surah(1)
+
+
+def test_encoding_negotiation_honours_quality_values():
+    assert negotiate_encoding("gzip, deflate, br", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("br;q=0, gzip;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("*", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.search import MemberSearchIndex
+
+
+def _user(user_id, full_name, **fields):
+    return {"id": user_id, "full_name": full_name, **fields}
+
+
+def test_prefix_search_ranks_name_matches_first():
+    """A partially typed term matches by prefix, and name hits outrank bio hits."""
+    index = MemberSearchIndex()
+    index.add(_user("1", "Aisha Rahman", bio="Teacher"))
+    index.add(_user("2", "Omar Farooq", bio="Works with Aisha on outreach"))
+    index.add(_user("3", "Yusuf Ali", skills=["Arabic", "Tajweed"]))
+
+    assert index.search("ais") == ["1", "2"]
+    assert index.search("arab") == ["3"]
+    assert index.search("aisha teach") == ["1"]
+    assert index.search("a") == []
+
+
+def test_reindexing_replaces_old_terms():
+    """Re-adding a user drops terms from the previous version of the profile."""
+    index = MemberSearchIndex()
+    index.add(_user("1", "Bilal", country="Egypt"))
+    index.add(_user("1", "Bilal", country="Türkiye"))
+
+    assert index.search("egypt") == []
+    assert index.search("turkiye") == ["1"]
+    assert "egypt" not in index.vocabulary
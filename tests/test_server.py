@@ -1,54 +1,36 @@
+import asyncio
+import base64
+import io
+import json
+import time
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from PIL import Image
+from starlette.websockets import WebSocketDisconnect
+from unittest.mock import patch
 import sys
 import os
-from datetime import datetime
-import json
-import requests
 
 # Add parent directory to path to import the server app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import server
 from backend.server import app, User, Post, Comment
+from backend.events import EventHub
+from backend.hadith import HadithCorpus, ingest
+from backend.quran import QuranStore, ingest as ingest_quran
+from backend.images import ImageStore
+from backend.passwords import PasswordHasher, hash_cost
+from tests.stubs import StubServer, json_route, sse_route
 
-# In-memory "filesystem" for testing
-json_storage = {}
-
-def mock_read_json(collection_name: str):
-    """Mocked version of read_json that uses an in-memory dictionary."""
-    return json_storage.get(collection_name, [])
-
-def mock_write_json(collection_name: str, data: list):
-    """Mocked version of write_json that uses an in-memory dictionary."""
-    # The real writer uses a custom serializer, so we'll simulate that
-    # by converting datetime objects to strings.
-    def serialize_datetimes(obj):
-        if isinstance(obj, list):
-            return [serialize_datetimes(i) for i in obj]
-        if isinstance(obj, dict):
-            return {k: serialize_datetimes(v) for k, v in obj.items()}
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return obj
-
-    json_storage[collection_name] = serialize_datetimes(data)
-
-@pytest.fixture(autouse=True)
-def setup_teardown():
-    """Clear the in-memory filesystem before each test."""
-    global json_storage
-    json_storage = {
-        "users": [],
-        "posts": [],
-        "comments": [],
-    }
-    yield
-
-@pytest.fixture
-def client():
-    """Pytest fixture to create a test client with mocked JSON I/O."""
-    with patch('backend.server.read_json', side_effect=mock_read_json), \
-         patch('backend.server.write_json', side_effect=mock_write_json):
+@pytest.fixture(params=["json", "sqlite"])
+def client(request, tmp_path):
+    """Pytest fixture to create a test client backed by a throwaway data directory, once per storage backend."""
+    with patch('backend.server.STORAGE_BACKEND', request.param):
+        store = server.create_store(tmp_path)
+    with patch('backend.server.store', store), \
+         patch('backend.server.upstream', server.create_upstream(tmp_path / "upstream_cache")), \
+         patch('backend.server.password_hasher', PasswordHasher(rounds=4)):
         with TestClient(app) as test_client:
             yield test_client
 
@@ -90,7 +72,7 @@ def test_update_profile_prevents_role_escalation(client: TestClient):
     assert user_data["role"] != "admin", "User role was successfully escalated to 'admin', which is a critical bug."
 
 def test_get_prayer_times_placeholder(client: TestClient):
-    """Verify the placeholder prayer times endpoint works."""
+    """Verify the prayer times endpoint works."""
     response = client.get("/api/prayer-times?lat=34.05&lng=-118.25")
     assert response.status_code == 200
     data = response.json()
@@ -99,41 +81,38 @@ def test_get_prayer_times_placeholder(client: TestClient):
     assert "times" in data
 
 def test_get_qibla_direction_placeholder(client: TestClient):
-    """Verify the placeholder qibla direction endpoint works."""
+    """Verify the qibla direction endpoint works."""
     response = client.get("/api/qibla?lat=34.05&lng=-118.25")
     assert response.status_code == 200
     data = response.json()
     assert data["lat"] == 34.05
     assert "direction" in data
 
-@patch('requests.get')
-def test_get_asma_ul_husna_success(mock_get, client: TestClient):
+def test_get_asma_ul_husna_success(client: TestClient):
     """Verify the Asma ul Husna endpoint works on success."""
-    # Mock a successful response from the external API
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = [{"name": "Ar-Rahman", "transliteration": "The Beneficent"}]
-    mock_get.return_value = mock_response
-
-    response = client.get("/api/asma-ul-husna")
-    assert response.status_code == 200
-    assert response.json()[0]["name"] == "Ar-Rahman"
+    names = [{"name": "Ar-Rahman", "transliteration": "The Beneficent"}]
+    with StubServer({"/api/asma-ul-husna.json": json_route(names)}) as upstream, \
+         patch('backend.server.UMMAH_API_BASE_URL', upstream.url):
+        response = client.get("/api/asma-ul-husna")
+        assert response.status_code == 200
+        assert response.json()[0]["name"] == "Ar-Rahman"
+        # A second call inside the TTL is served from cache.
+        assert client.get("/api/asma-ul-husna").json() == names
+        assert upstream.hits["/api/asma-ul-husna.json"] == 1
 
-@patch('requests.get')
-def test_get_asma_ul_husna_failure(mock_get, client: TestClient):
+def test_get_asma_ul_husna_failure(client: TestClient):
     """Verify the Asma ul Husna endpoint handles external API failure."""
-    # Mock a failed response from the external API
-    mock_get.side_effect = requests.exceptions.RequestException("API is down")
-
-    response = client.get("/api/asma-ul-husna")
-    assert response.status_code == 503
-    assert "Could not fetch data from UmmahAPI" in response.json()["detail"]
+    with StubServer({"/api/asma-ul-husna.json": json_route({"error": "down"}, status=500)}) as upstream, \
+         patch('backend.server.UMMAH_API_BASE_URL', upstream.url):
+        response = client.get("/api/asma-ul-husna")
+        assert response.status_code == 503
+        assert "Could not fetch data from UmmahAPI" in response.json()["detail"]
 
 def test_default_admin_is_created(client: TestClient):
     """Verify that the default admin user is created on startup if no users exist."""
     # The client fixture automatically triggers the lifespan event.
-    # We just need to check if the user was added to our mock storage.
-    admin_user = next((user for user in json_storage["users"] if user["email"] == "admin@example.com"), None)
+    # We just need to check if the user was added to the store.
+    admin_user = next((user for user in server.read_json("users") if user["email"] == "admin@example.com"), None)
     assert admin_user is not None, "Default admin user was not created."
     assert admin_user["role"] == "admin", "Default user is not an admin."
 
@@ -145,4 +124,515 @@ def test_default_admin_login(client: TestClient):
         json={"email": "admin@example.com", "password": "admin123"},
     )
     assert response.status_code == 200, "Default admin login failed."
-    assert "access_token" in response.json(), "Login did not return an access token."
\ No newline at end of file
+    assert "access_token" in response.json(), "Login did not return an access token."
+
+
+def _register(client: TestClient, email: str = "poster@example.com") -> dict:
+    response = client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "password123", "full_name": "Poster"},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_get_posts_pages_newest_first_with_cursors(client: TestClient):
+    """The feed is ordered newest-first and the cursors walk it without gaps or repeats."""
+    headers = _register(client)
+    for i in range(5):
+        client.post("/api/posts", headers=headers, json={"content": f"post {i}", "tags": ["even"] if i % 2 == 0 else []})
+
+    first = client.get("/api/posts?limit=2", headers=headers)
+    assert [p["content"] for p in first.json()] == ["post 4", "post 3"]
+    second = client.get(f"/api/posts?limit=2&before={first.headers['x-next-cursor']}", headers=headers)
+    assert [p["content"] for p in second.json()] == ["post 2", "post 1"]
+    newer = client.get(f"/api/posts?limit=2&after={second.headers['x-prev-cursor']}", headers=headers)
+    assert [p["content"] for p in newer.json()] == ["post 4", "post 3"]
+
+    tagged = client.get("/api/posts?tags=even", headers=headers)
+    assert [p["content"] for p in tagged.json()] == ["post 4", "post 2", "post 0"]
+    assert client.get("/api/posts?before=not-a-cursor", headers=headers).status_code == 400
+
+def test_malformed_cursors_are_rejected(client: TestClient):
+    """Cursors that decode to the wrong shape or types get a 400, not a 500."""
+    headers = _register(client)
+    client.post("/api/posts", headers=headers, json={"content": "post"})
+    for value in ([1, "x"], [{}, "x"], ["2024-01-01T00:00:00", 5], ["2024-01-01T00:00:00"], {"a": 1}, None):
+        cursor = base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+        for path in ("/api/posts?before=", "/api/posts?after=", "/api/timeline?before="):
+            response = client.get(path + cursor, headers=headers)
+            assert response.status_code == 400, (path, value)
+            assert response.json()["detail"] == "Invalid cursor"
+
+def test_get_posts_filters_by_author(client: TestClient):
+    """author_id narrows the feed server-side."""
+    alice = _register(client, "alice@example.com")
+    bob = _register(client, "bob@example.com")
+    client.post("/api/posts", headers=alice, json={"content": "from alice"})
+    client.post("/api/posts", headers=bob, json={"content": "from bob"})
+    bob_id = client.get("/api/auth/me", headers=bob).json()["id"]
+
+    response = client.get(f"/api/posts?author_id={bob_id}", headers=alice)
+    assert [p["content"] for p in response.json()] == ["from bob"]
+
+def test_user_search_tracks_profile_updates(client: TestClient):
+    """GET /api/users?search= finds members by name prefix and follows profile edits."""
+    headers = _register(client, "searcher@example.com")
+    client.put("/api/users/me", headers=headers, json={"full_name": "Zainab Hussain", "skills": ["Calligraphy"]})
+
+    response = client.get("/api/users?search=zain&limit=5", headers=headers)
+    assert response.status_code == 200
+    assert [u["full_name"] for u in response.json()] == ["Zainab Hussain"]
+    assert response.json()[0]["password_hash"] is None
+    assert [u["full_name"] for u in client.get("/api/users?search=callig", headers=headers).json()] == ["Zainab Hussain"]
+    assert client.get("/api/users?search=poster", headers=headers).json() == []
+
+def test_prayer_timetable_batch(client: TestClient):
+    """The batch endpoint returns a month of times per location and rejects unknown methods."""
+    body = {
+        "year": 2024,
+        "month": 2,
+        "method": "isna",
+        "madhab": "hanafi",
+        "locations": [{"lat": 40.7128, "lng": -74.0060, "timezone": "America/New_York"}, {"lat": 21.4225, "lng": 39.8262, "tz_offset": 3}],
+    }
+    response = client.post("/api/prayer-times/batch", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["dates"]) == 29
+    assert len(data["locations"][0]["times"]["Fajr"]) == 29
+    assert data["locations"][0]["utc_offsets"][0] == -5.0
+    assert client.post("/api/prayer-times/batch", json={**body, "method": "unknown"}).status_code == 400
+
+def test_concurrent_registrations_with_one_email_create_one_user(client: TestClient):
+    """Sign-ups racing on the same email past the existence check get a 400, not a 500."""
+    def register():
+        return client.post("/api/auth/register",
+                           json={"email": "twin@example.com", "password": "password123", "full_name": "Twin"})
+
+    async def slow_hash(password):
+        await asyncio.sleep(0.2)  # every request passes the existence check before any inserts
+        return "hashed"
+
+    with patch('backend.server.hash_password', slow_hash), ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(lambda _: register(), range(4)))
+    assert sorted(r.status_code for r in responses) == [200, 400, 400, 400]
+    assert all(r.json()["detail"] == "Email already registered" for r in responses if r.status_code == 400)
+    assert server.store.count("users", {"email": "twin@example.com"}) == 1
+
+def test_login_rehashes_when_cost_changes(client: TestClient):
+    """A successful login upgrades a hash made with a different bcrypt cost."""
+    _register(client, "rehash@example.com")
+    assert hash_cost(server.store.find_one("users", {"email": "rehash@example.com"})["password_hash"]) == 4
+
+    with patch('backend.server.password_hasher', PasswordHasher(rounds=5)):
+        response = client.post("/api/auth/login", json={"email": "rehash@example.com", "password": "password123"})
+    assert response.status_code == 200
+    stored = server.store.find_one("users", {"email": "rehash@example.com"})["password_hash"]
+    assert hash_cost(stored) == 5
+    assert client.post("/api/auth/login", json={"email": "rehash@example.com", "password": "password123"}).status_code == 200
+
+def test_login_returns_503_when_hash_queue_is_full(client: TestClient):
+    """With no free hashing capacity, login fails fast instead of queueing."""
+    with patch('backend.server.password_hasher', PasswordHasher(rounds=4, workers=0, max_pending=0)):
+        response = client.post("/api/auth/login", json={"email": "admin@example.com", "password": "admin123"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+def test_authenticated_requests_reuse_the_cached_principal(client: TestClient):
+    """Repeat requests skip the users lookup until a users write invalidates the entry."""
+    headers = _register(client, "cached@example.com")
+    client.get("/api/auth/me", headers=headers)
+
+    with patch.object(server.store, 'find_one', wraps=server.store.find_one) as find_one:
+        for _ in range(3):
+            assert client.get("/api/auth/me", headers=headers).status_code == 200
+        assert find_one.call_count == 0
+
+        client.post("/api/posts", headers=headers, json={"content": "bumps posts_count"})
+        me = client.get("/api/auth/me", headers=headers).json()
+    assert me["posts_count"] == 1
+
+def test_dashboard_stats_follow_writes(client: TestClient):
+    """Counters move with register, create_post, create_comment and profile country edits."""
+    headers = _register(client, "counted@example.com")
+    client.put("/api/users/me", headers=headers, json={"country": "Malaysia"})
+    post = client.post("/api/posts", headers=headers, json={"content": "hello", "post_type": "Mentorship"}).json()
+    client.post(f"/api/posts/{post['id']}/comments", headers=headers, json={"content": "first"})
+    client.put("/api/users/me", headers=headers, json={"country": "Indonesia"})
+
+    data = client.get("/api/dashboard/stats?days=7", headers=headers).json()
+    assert data["total_members"] == 2  # the default admin plus the new member
+    assert data["total_posts"] == 1 and data["total_comments"] == 1
+    assert data["posts_by_type"] == {"Mentorship": 1}
+    assert data["members_by_country"] == {"Indonesia": 1}
+    assert data["members_by_role"] == {"admin": 1, "member": 1}
+    assert len(data["daily_activity"]) == 7
+    assert data["daily_activity"][-1]["posts"] == 1
+
+def test_dashboard_stats_backfill_existing_data(tmp_path):
+    """A data directory without counters gets them rebuilt from the collections at startup."""
+    seeded = server.create_store(tmp_path)
+    seeded.insert("users", {"id": "u1", "email": "old@example.com", "role": "mentor", "country": "Egypt", "created_at": "2024-01-01T00:00:00"})
+    seeded.insert("posts", {"id": "p1", "post_type": "General Feed", "created_at": "2024-01-02T00:00:00"})
+    seeded.close()
+
+    with patch('backend.server.store', server.create_store(tmp_path)), \
+         patch('backend.server.password_hasher', PasswordHasher(rounds=4)):
+        with TestClient(app):
+            counters = server.store.find_one("stats", {"id": "counters"})
+    assert counters["total_users"] == 1 and counters["total_posts"] == 1
+    assert counters["users_by_role:mentor"] == 1 and counters["daily:2024-01-02:posts"] == 1
+
+def test_feed_embeds_comment_previews_and_batch_comments(client: TestClient):
+    """include_comments embeds the newest N comments per post; the batch route groups by post id."""
+    headers = _register(client, "batch@example.com")
+    first = client.post("/api/posts", headers=headers, json={"content": "first"}).json()
+    second = client.post("/api/posts", headers=headers, json={"content": "second"}).json()
+    for i in range(3):
+        client.post(f"/api/posts/{first['id']}/comments", headers=headers, json={"content": f"c{i}"})
+
+    feed = client.get("/api/posts?include_comments=2", headers=headers).json()
+    by_id = {post["id"]: post for post in feed}
+    assert [c["content"] for c in by_id[first["id"]]["comments"]] == ["c1", "c2"]
+    assert by_id[second["id"]]["comments"] == []
+    assert client.get("/api/posts", headers=headers).json()[0]["comments"] is None
+
+    batch = client.post("/api/comments/batch", headers=headers, json={"post_ids": [first["id"], second["id"], "missing"]}).json()
+    assert [c["content"] for c in batch[first["id"]]] == ["c0", "c1", "c2"]
+    assert batch[second["id"]] == [] and batch["missing"] == []
+
+def test_fast_responses_match_the_model_path(client: TestClient):
+    """The pre-encoded fast path returns exactly what the Pydantic path returns."""
+    headers = _register(client, "fast@example.com")
+    post = client.post("/api/posts", headers=headers, json={"content": "fast", "tags": ["x"]}).json()
+    client.post(f"/api/posts/{post['id']}/comments", headers=headers, json={"content": "reply"})
+
+    urls = ["/api/posts?include_comments=3", "/api/posts?limit=1", f"/api/posts/{post['id']}/comments"]
+    with patch('backend.server.FAST_RESPONSES', True):
+        fast = [client.get(url, headers=headers) for url in urls]
+    with patch('backend.server.FAST_RESPONSES', False):
+        slow = [client.get(url, headers=headers) for url in urls]
+    for f, s in zip(fast, slow):
+        assert f.json() == s.json()
+    assert fast[1].headers["x-next-cursor"] == slow[1].headers["x-next-cursor"]
+
+def test_bot_chat_streams_events_and_caches_answers(client: TestClient):
+    """The bot streams SSE deltas, then serves equivalent questions from cache without calling upstream."""
+    headers = _register(client, "asker@example.com")
+    with StubServer({"/chat": sse_route(["Patience ", "is ", "sabr."])}) as stub, \
+         patch('backend.server.bot', server.create_bot(f"{stub.url}/chat", "key")):
+        with client.stream("POST", "/api/bot/chat", headers={**headers, "Accept": "text/event-stream"},
+                           json={"message": "What does the Quran say about patience?"}) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = response.read().decode("utf-8")
+        assert body.count('data: {"delta":') == 3
+        assert 'event: done\ndata: {"response":"Patience is sabr."' in body
+        assert server.bot.active == {}
+
+        cached = client.post("/api/bot/chat", headers=headers, json={"message": "what does the quran say about PATIENCE"})
+        assert cached.json()["response"] == "Patience is sabr." and cached.json()["cached"] is True
+        assert stub.hits["/chat"] == 1
+
+        fresh = client.post("/api/bot/chat", headers=headers, json={"message": "What does the Quran say about patience?",
+                                                                     "regenerate": True})
+        assert fresh.json()["cached"] is False and stub.hits["/chat"] == 2
+
+def test_bot_chat_errors(client: TestClient):
+    """Unconfigured bot is 503, a failing upstream is 502, and a user over their limit gets 429."""
+    headers = _register(client, "asker@example.com")
+    with patch('backend.server.bot', server.create_bot("http://127.0.0.1:9", None)):
+        assert client.post("/api/bot/chat", headers=headers, json={"message": "hi"}).status_code == 503
+    with StubServer({"/chat": json_route({"error": "down"}, status=500)}) as stub, \
+         patch('backend.server.bot', server.create_bot(f"{stub.url}/chat", "key")):
+        assert client.post("/api/bot/chat", headers=headers, json={"message": "hi"}).status_code == 502
+        user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+        for _ in range(server.bot.per_user):
+            server.bot.acquire(user_id)
+        response = client.post("/api/bot/chat", headers=headers, json={"message": "hi again"})
+        assert response.status_code == 429 and response.headers["retry-after"] == "1"
+
+def test_websocket_subscribers_receive_filtered_post_and_comment_events(client: TestClient):
+    """create_post and create_comment push events to subscribers whose filter matches."""
+    headers = _register(client, "live@example.com")
+    token = headers["Authorization"].split()[1]
+    with patch('backend.server.event_hub', EventHub()):
+        with client.websocket_connect(f"/api/ws/events?token={token}&post_type=Mentorship") as ws:
+            client.post("/api/posts", headers=headers, json={"content": "ignored", "post_type": "General Feed"})
+            post = client.post("/api/posts", headers=headers, json={"content": "live", "post_type": "Mentorship"}).json()
+            client.post(f"/api/posts/{post['id']}/comments", headers=headers, json={"content": "first!"})
+
+            created = ws.receive_json()
+            assert created["type"] == "post.created" and created["post"]["id"] == post["id"]
+            commented = ws.receive_json()
+            assert commented["type"] == "comment.created" and commented["comment"]["content"] == "first!"
+            assert commented["comments_count"] == 1
+        assert len(server.event_hub) == 0  # released once the server notices the hang-up
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/ws/events?token=bogus") as ws:
+            ws.receive_json()
+
+def test_sse_stream_delivers_events_and_unsubscribes_on_disconnect(client: TestClient):
+    token = _register(client, "sse@example.com")["Authorization"].split()[1]
+    hub = EventHub()
+    received = []
+
+    async def scenario():
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                received.append(dict(message["headers"]))
+            elif message["type"] == "http.response.body":
+                received.append(message.get("body", b""))
+                if message.get("body", b"").startswith(b"retry:"):
+                    server.publish_post({"id": "p1", "content": "hello", "post_type": "General Feed"})
+                elif b"post.created" in message.get("body", b""):
+                    disconnected.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": "/api/events", "raw_path": b"/api/events", "root_path": "",
+                 "query_string": f"token={token}".encode(), "headers": [(b"host", b"testserver")],
+                 "client": ("127.0.0.1", 1), "server": ("testserver", 80)}
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    with patch('backend.server.event_hub', hub):
+        asyncio.run(scenario())
+    assert received[0][b"content-type"].startswith(b"text/event-stream")
+    frame = next(chunk for chunk in received[1:] if b"post.created" in chunk).decode()
+    assert frame.startswith("id: 1\nevent: post.created\ndata: ") and '"content":"hello"' in frame
+    assert len(hub) == 0
+    assert client.get("/api/events").status_code == 401
+
+def test_writes_from_other_workers_are_tailed_into_the_hub(tmp_path):
+    """With a shared store, posts inserted elsewhere still reach this worker's subscribers, once."""
+    with patch('backend.server.STORAGE_BACKEND', 'sqlite'):
+        store, other_worker = server.create_store(tmp_path), server.create_store(tmp_path)
+    with patch('backend.server.store', store), \
+         patch('backend.server.password_hasher', PasswordHasher(rounds=4)), \
+         patch('backend.server.event_hub', EventHub()), \
+         patch('backend.server.EVENTS_TAIL_SECONDS', 0.05):
+        with TestClient(app) as client:
+            headers = _register(client, "tail@example.com")
+            with client.websocket_connect(f"/api/ws/events?token={headers['Authorization'].split()[1]}") as ws:
+                other_worker.insert("posts", server.Post(content="from elsewhere", author_id="u2", author_name="Other",
+                                                         author_role="member").model_dump())
+                other_worker.close()
+                event = ws.receive_json()
+                assert event["type"] == "post.created" and event["post"]["content"] == "from elsewhere"
+
+                client.post("/api/posts", headers=headers, json={"content": "local"})
+                assert ws.receive_json()["post"]["content"] == "local"
+                time.sleep(0.2)  # a few tail passes, none of which may announce either post again
+                assert server.event_hub.published == 2
+
+def test_tail_pages_through_bursts_larger_than_one_batch(tmp_path):
+    """More writes inside the overlap window than one batch holds are all published, and tailing keeps going."""
+    with patch('backend.server.STORAGE_BACKEND', 'sqlite'):
+        store, other_worker = server.create_store(tmp_path), server.create_store(tmp_path)
+    with patch('backend.server.store', store), \
+         patch('backend.server.password_hasher', PasswordHasher(rounds=4)), \
+         patch('backend.server.event_hub', EventHub()), \
+         patch('backend.server.EVENTS_TAIL_SECONDS', 0.05):
+        with TestClient(app):
+            def wait_for(count):
+                deadline = time.monotonic() + 10
+                while server.event_hub.published < count and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                return server.event_hub.published
+
+            def post(content):
+                other_worker.insert("posts", server.Post(content=content, author_id="u2", author_name="Other",
+                                                         author_role="member").model_dump())
+
+            for i in range(server.EVENTS_TAIL_BATCH + 100):
+                post(f"burst {i}")
+            assert wait_for(server.EVENTS_TAIL_BATCH + 100) == server.EVENTS_TAIL_BATCH + 100
+            post("after the burst")
+            assert wait_for(server.EVENTS_TAIL_BATCH + 101) == server.EVENTS_TAIL_BATCH + 101
+            time.sleep(0.2)  # further passes over the same window announce nothing twice
+            assert server.event_hub.published == server.EVENTS_TAIL_BATCH + 101
+    other_worker.close()
+
+def test_hadith_search_answers_503_until_the_corpus_is_ingested(client: TestClient, tmp_path):
+    with patch('backend.server.hadith_corpus', HadithCorpus(tmp_path / "hadith")):
+        assert client.get("/api/hadith/search?q=prayer").status_code == 503
+        assert client.get("/api/hadith/search?q=prayer&book=nawawi").status_code == 503
+
+def test_hadith_routes_page_and_search_the_ingested_corpus(client: TestClient, tmp_path):
+    assert client.get("/api/hadith").status_code == 503
+
+    source = tmp_path / "editions"
+    source.mkdir()
+    hadiths = [{"hadithnumber": n, "text": f"Hadith {n} about prayer" if n % 2 else f"Hadith {n} about fasting",
+                "reference": {"book": 1 if n <= 5 else 2}} for n in range(1, 11)]
+    (source / "eng-nawawi.json").write_text(json.dumps({"metadata": {"name": "Forty Hadith", "sections": {"1": "One", "2": "Two"}},
+                                                        "hadiths": hadiths}))
+    ingest(source, tmp_path / "hadith")
+    with patch('backend.server.hadith_corpus', HadithCorpus(tmp_path / "hadith")):
+        assert client.get("/api/hadith").json() == [{"book": "nawawi", "name": "Forty Hadith", "languages": ["eng"], "count": 10}]
+        assert client.get("/api/hadith/nawawi").json()["sections"]["2"]["name"] == "Two"
+
+        page = client.get("/api/hadith/nawawi/hadiths?limit=4").json()
+        assert [h["number"] for h in page["hadiths"]] == [1, 2, 3, 4] and page["next_start"] == 5
+        last = client.get(f"/api/hadith/nawawi/hadiths?start={page['next_start']}&section=1").json()
+        assert [h["number"] for h in last["hadiths"]] == [5] and last["next_start"] is None
+        assert client.get("/api/hadith/nawawi/hadiths/7").json()["text"] == {"eng": "Hadith 7 about prayer"}
+
+        found = client.get("/api/hadith/search?q=PRAYER&limit=2").json()
+        assert found["total"] == 5 and [h["number"] for h in found["results"]] == [1, 3]
+        assert client.get("/api/hadith/missing").status_code == 404
+        assert client.get("/api/hadith/nawawi/hadiths/11").status_code == 404
+        assert client.get("/api/hadith/search?q=prayer&book=missing").status_code == 404
+
+def test_quran_routes_serve_precompressed_payloads_with_etags(client: TestClient, tmp_path):
+    with patch('backend.server.quran_store', QuranStore(tmp_path / "quran")):
+        assert client.get("/api/quran/surahs").status_code == 503
+
+    ayahs = [{"number": n, "numberInSurah": n, "text": f"ayah {n}"} for n in range(1, 6)]
+    edition = {"data": {"surahs": [{"number": 1, "name": "الفاتحة", "englishName": "Al-Faatiha", "ayahs": ayahs}]}}
+    (tmp_path / "edition.json").write_text(json.dumps(edition))
+    ingest_quran(tmp_path / "edition.json", tmp_path / "edition.json", tmp_path / "quran")
+    with patch('backend.server.quran_store', QuranStore(tmp_path / "quran")):
+        assert client.get("/api/quran/surahs").json()[0]["numberOfAyahs"] == 5
+
+        response = client.get("/api/quran/surahs/1", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip" and response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["cache-control"].startswith("public, max-age=")
+        assert response.json()["ayahs"][4] == {"number": 5, "global_number": 5, "arabic": "ayah 5", "translation": "ayah 5"}
+        etag = response.headers["etag"]
+        assert etag.endswith('-gzip"')
+        assert client.get("/api/quran/surahs/1", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+        # A different encoding is a different representation.
+        assert client.get("/api/quran/surahs/1", headers={"Accept-Encoding": "br", "If-None-Match": etag}).status_code == 200
+
+        sliced = client.get("/api/quran/surahs/1?from=2&to=3")
+        assert [a["number"] for a in sliced.json()["ayahs"]] == [2, 3]
+        assert client.get("/api/quran/surahs/1?from=4", headers={"If-None-Match": '"x", ' + sliced.headers["etag"]}).status_code == 200
+        assert client.get("/api/quran/surahs/1?from=2&to=3", headers={"If-None-Match": sliced.headers["etag"]}).status_code == 304
+        assert client.get("/api/quran/surahs/1?from=3&to=9").status_code == 400
+        assert client.get("/api/quran/surahs/2").status_code == 404
+
+def test_metrics_endpoint_reports_routes_storage_and_password_timing(client: TestClient):
+    headers = _register(client, "metrics@example.com")
+    post = client.post("/api/posts", json={"content": "hello"}, headers=headers).json()
+    client.get(f"/api/posts/{post['id']}", headers=headers)
+    client.get("/no/such/path")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/api/posts/{post_id}",status="200"}' in text
+    assert post["id"] not in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert 'storage_operation_duration_seconds_count{operation="insert",collection="posts"}' in text
+    assert 'storage_written_bytes_total{operation="insert",collection="posts"}' in text
+    assert 'password_hash_duration_seconds_count{operation="hash"}' in text
+    assert "http_requests_in_flight" in text and "events_subscribers 0" in text
+    assert "# TYPE storage_compacted_bytes_total counter" in text
+    assert client.get("/metrics/profile").status_code == 404
+
+    with patch('backend.server.METRICS_TOKEN', 'scrape-secret'):
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+def test_read_endpoints_answer_conditional_gets_from_versions(client: TestClient):
+    headers = _register(client, "etag@example.com")
+    me = client.get("/api/auth/me", headers=headers).json()
+    post = client.post("/api/posts", json={"content": "first"}, headers=headers).json()
+    other = client.post("/api/posts", json={"content": "second"}, headers=headers).json()
+
+    def revalidate(url, etag):
+        return client.get(url, headers={**headers, "If-None-Match": etag})
+
+    feed = client.get("/api/posts", headers=headers)
+    thread = client.get(f"/api/posts/{post['id']}/comments", headers=headers)
+    profile = client.get(f"/api/users/{me['id']}", headers=headers)
+    for response in (feed, thread, profile):
+        assert response.headers["etag"].startswith('W/"')
+        assert response.headers["cache-control"] == "private, no-cache"
+    # Only counters some ETag reads are written.
+    written = {doc["id"] for doc in server.store.all(server.versions.COLLECTION)}
+    assert {"posts", f"users:{me['id']}"} <= written and not written & {"users", "stats", "timelines"}
+    unchanged = revalidate("/api/posts", feed.headers["etag"])
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert revalidate(f"/api/users/{me['id']}", profile.headers["etag"]).status_code == 304
+
+    client.post(f"/api/posts/{other['id']}/comments", json={"content": "elsewhere"}, headers=headers)
+    assert revalidate(f"/api/posts/{post['id']}/comments", thread.headers["etag"]).status_code == 304
+    # comments_count on the other post changed, so the feed did too
+    changed = revalidate("/api/posts", feed.headers["etag"])
+    assert changed.status_code == 200 and changed.headers["etag"] != feed.headers["etag"]
+
+    client.post(f"/api/posts/{post['id']}/comments", json={"content": "here"}, headers=headers)
+    refreshed = revalidate(f"/api/posts/{post['id']}/comments", thread.headers["etag"])
+    assert refreshed.status_code == 200 and [c["content"] for c in refreshed.json()] == ["here"]
+
+    client.put("/api/users/me", json={"bio": "Updated"}, headers=headers)
+    assert revalidate(f"/api/users/{me['id']}", profile.headers["etag"]).status_code == 200
+
+    assert revalidate("/api/users/nope", "*").status_code == 404
+    assert revalidate("/api/posts?before=garbage", "*").status_code == 400
+    assert revalidate(f"/api/users/{me['id']}", "*").status_code == 200
+
+def test_image_upload_serves_immutable_variants(client: TestClient, tmp_path):
+    headers = _register(client, "images@example.com")
+    buffer = io.BytesIO()
+    Image.new("RGB", (1500, 1500), (200, 40, 40)).save(buffer, "JPEG")
+    with patch('backend.server.image_store', ImageStore(tmp_path / "images", max_bytes=1_000_000, use_processes=False)):
+        uploaded = client.post("/api/images", content=buffer.getvalue(),
+                               headers={**headers, "Content-Type": "image/jpeg"})
+        assert uploaded.status_code == 201
+        urls = uploaded.json()["urls"]
+        again = client.post("/api/images", content=buffer.getvalue(), headers=headers)
+        assert again.status_code == 200 and again.json()["id"] == uploaded.json()["id"]
+
+        feed = client.get(urls["feed"])
+        assert feed.headers["content-type"] == "image/webp"
+        assert feed.headers["cache-control"] == "public, max-age=31536000, immutable"
+        with Image.open(io.BytesIO(feed.content)) as image:
+            assert image.size == (1080, 1080)
+        assert client.get(urls["feed"], headers={"If-None-Match": feed.headers["etag"]}).status_code == 304
+        assert client.get(urls["original"]).content == buffer.getvalue()
+
+        assert client.post("/api/images", content=b"GIF89a" + b"\0" * 2_000_000, headers=headers).status_code == 413
+        assert client.post("/api/images", content=b"plain text, not an image", headers=headers).status_code == 415
+        assert client.get(urls["feed"].replace("/feed", "/huge")).status_code == 404
+        assert client.get("/api/images/../../secret/original").status_code == 404
+
+def test_follows_build_home_timelines_with_pull_fallback(client: TestClient):
+    """Follows fan new posts out to home timelines, and accounts past the fan-out limit are pulled instead."""
+    alice = _register(client, "alice@example.com")
+    bob = _register(client, "bob@example.com")
+    carol = _register(client, "carol@example.com")
+    bob_id = client.get("/api/auth/me", headers=bob).json()["id"]
+    carol_id = client.get("/api/auth/me", headers=carol).json()["id"]
+    client.post("/api/posts", headers=bob, json={"content": "bob before"})
+
+    assert client.post(f"/api/users/{bob_id}/follow", headers=alice).json()["followers_count"] == 1
+    assert client.post(f"/api/users/{bob_id}/follow", headers=alice).json()["followers_count"] == 1
+    assert client.get("/api/auth/me", headers=alice).json()["following_count"] == 1
+    assert client.get(f"/api/users/{bob_id}/follow", headers=alice).json() == {"following": True}
+    assert client.post(f"/api/users/{bob_id}/follow", headers=bob).status_code == 400
+    assert client.post("/api/users/missing/follow", headers=alice).status_code == 404
+
+    client.post(f"/api/users/{carol_id}/follow", headers=alice)
+    client.post(f"/api/users/{carol_id}/follow", headers=bob)
+    with patch('backend.server.TIMELINE_FANOUT_LIMIT', 1):
+        client.post("/api/posts", headers=carol, json={"content": "carol pulled"})
+    client.post("/api/posts", headers=alice, json={"content": "alice own"})
+    client.post("/api/posts", headers=bob, json={"content": "bob after"})
+
+    first = client.get("/api/timeline?limit=2", headers=alice)
+    assert [p["content"] for p in first.json()] == ["bob after", "alice own"]
+    rest = client.get(f"/api/timeline?before={first.headers['x-next-cursor']}", headers=alice)
+    assert [p["content"] for p in rest.json()] == ["carol pulled", "bob before"]
+    assert "x-next-cursor" not in rest.headers
+
+    assert client.delete(f"/api/users/{bob_id}/follow", headers=alice).json()["followers_count"] == 0
+    assert client.get(f"/api/users/{bob_id}/follow", headers=alice).json() == {"following": False}
+    assert client.delete(f"/api/users/{carol_id}/follow", headers=alice).json()["followers_count"] == 1
+    assert [p["content"] for p in client.get("/api/timeline", headers=alice).json()] == ["alice own"]
@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.migrate import migrate
+from backend.sqlite_store import SQLiteStore, _field
+from backend.storage import DuplicateKeyError, IndexSpec, JsonStore
+
+INDEXES = {"posts": [IndexSpec("id", unique=True), IndexSpec("created_at", kind="sorted")]}
+
+
+def test_increments_from_concurrent_connections_are_not_lost(tmp_path):
+    """Separate connections (as separate workers would hold) never overwrite each other's $inc."""
+    db = tmp_path / "app.db"
+    SQLiteStore(db, INDEXES).insert("posts", {"id": "p1", "comments_count": 0})
+
+    def worker():
+        store = SQLiteStore(db, INDEXES)
+        for _ in range(50):
+            store.update("posts", {"id": "p1"}, {"$inc": {"comments_count": 1}})
+        store.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert SQLiteStore(db).find_one("posts", {"id": "p1"})["comments_count"] == 200
+
+
+def test_queries_use_expression_indexes_and_enforce_uniqueness(tmp_path):
+    """Equality lookups hit the declared index, and unique indexes reject duplicates."""
+    store = SQLiteStore(tmp_path / "app.db", INDEXES)
+    store.insert("posts", {"id": "p1", "created_at": "2024-01-01T00:00:00"})
+    with pytest.raises(DuplicateKeyError):
+        store.insert("posts", {"id": "p1"})
+
+    plan = store._conn.execute(f'EXPLAIN QUERY PLAN SELECT doc FROM "posts" WHERE {_field("id")} = ?', ["p1"]).fetchall()
+    assert any("posts__id" in row[-1] for row in plan)
+    store.update("posts", {"id": "p1"}, {"$set": {"tags": ["a", "b"], "title": None}})
+    assert store.find("posts", {"tags": {"$all": ["b"]}}, limit=5)[0]["tags"] == ["a", "b"]
+    assert store.count("posts", {"title": None}) == 1
+
+
+def test_migration_imports_json_collections(tmp_path):
+    """The migration tool copies every JSON collection, journal included, and skips non-empty tables."""
+    data_dir = tmp_path / "data"
+    source = JsonStore(data_dir)
+    source.insert("users", {"id": "u1", "email": "a@example.com"})
+    source.insert("posts", {"id": "p1", "author_id": "u1"})
+    source.update("posts", {"id": "p1"}, {"$inc": {"likes_count": 3}})
+
+    db = tmp_path / "app.db"
+    assert migrate(data_dir, db) == {"posts": 1, "users": 1}
+    assert SQLiteStore(db).find_one("posts", {"id": "p1"})["likes_count"] == 3
+    assert migrate(data_dir, db) == {}
+    assert migrate(data_dir, db, ["users"], force=True) == {"users": 1}
+
+
+def test_capped_push_matches_the_json_store(tmp_path):
+    """``$push`` with ``$each``/``$slice`` appends and keeps the tail the same way on both backends."""
+    results = []
+    for store in (SQLiteStore(tmp_path / "app.db", INDEXES), JsonStore(tmp_path / "data", indexes=INDEXES)):
+        store.insert("posts", {"id": "p1", "seen": [["a", 1], "b"]})
+        store.insert("posts", {"id": "p2"})
+        store.update("posts", {"id": "p1"}, {"$push": {"seen": {"$each": ["c", {"d": None}], "$slice": -3}}})
+        store.update("posts", {"id": "p2"}, {"$push": {"seen": "x"}, "$inc": {"rev": 1}})
+        results.append(store.all("posts"))
+    assert results[0] == results[1] == [{"id": "p1", "seen": ["b", "c", {"d": None}]},
+                                        {"id": "p2", "seen": ["x"], "rev": 1}]
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.storage import DuplicateKeyError, IndexSpec, JsonStore
+
+
+def test_journal_is_replayed_on_restart(tmp_path):
+    """Writes that were only journaled are recovered by a fresh store."""
+    store = JsonStore(tmp_path)
+    store.insert("posts", {"id": "p1", "comments_count": 0, "created_at": datetime(2024, 1, 1)})
+    store.update("posts", {"id": "p1"}, {"$inc": {"comments_count": 2}, "$set": {"content": "hi"}})
+
+    reopened = JsonStore(tmp_path)
+    post = reopened.find_one("posts", {"id": "p1"})
+    assert post == {"id": "p1", "comments_count": 2, "content": "hi", "created_at": "2024-01-01T00:00:00"}
+
+
+def test_compaction_runs_in_the_background_without_blocking_writes(tmp_path):
+    """A journal past its threshold is set aside and snapshotted off the write path, as of that moment."""
+    store = JsonStore(tmp_path, compact_min_bytes=1000)
+    comments = store.collection("comments")
+    for i in range(3):
+        store.insert("comments", {"id": str(i), "post_id": "p1", "likes": 0})
+    assert comments._compaction is None
+
+    with comments._snapshot_lock:  # hold the writer back, as a slow snapshot would
+        store.insert("comments", {"id": "3", "post_id": "p1", "likes": 0, "text": "x" * 1000})
+        assert comments._compaction is not None and (tmp_path / "comments.journal.compacting").exists()
+        # Writes carry on meanwhile, into a fresh journal.
+        store.update("comments", {"id": "0"}, {"$inc": {"likes": 1}})
+        store.insert("comments", {"id": "4", "post_id": "p1", "likes": 0})
+        written = store.io.bytes_written
+    comments.wait_for_compaction()
+
+    assert not (tmp_path / "comments.journal.compacting").exists()
+    # The snapshot is counted apart from the operations' own writes.
+    assert store.io.bytes_written == written
+    assert store.io.compacted_bytes == (tmp_path / "comments.json").stat().st_size
+    snapshot = json.loads((tmp_path / "comments.json").read_text())
+    assert snapshot["seq"] == 4
+    assert [(doc["id"], doc["likes"]) for doc in snapshot["docs"]] == [("0", 0), ("1", 0), ("2", 0), ("3", 0)]
+    reopened = JsonStore(tmp_path)
+    assert reopened.count("comments", {"post_id": "p1"}) == 5
+    assert reopened.find_one("comments", {"id": "0"})["likes"] == 1
+
+
+def test_unfinished_compaction_is_recovered_on_restart(tmp_path):
+    """If the process dies mid-compaction, the set-aside journal is replayed before the current one."""
+    store = JsonStore(tmp_path)
+    store.insert("posts", {"id": "p1", "likes": 0})
+    store.collection("posts")._close_journal()
+    os.replace(tmp_path / "posts.journal", tmp_path / "posts.journal.compacting")
+    store.update("posts", {"id": "p1"}, {"$inc": {"likes": 2}})
+
+    reopened = JsonStore(tmp_path)
+    assert reopened.find_one("posts", {"id": "p1"})["likes"] == 2
+    assert reopened.collections() == ["posts"]
+    assert not (tmp_path / "posts.journal.compacting").exists()
+
+
+def test_legacy_snapshot_and_torn_journal_tail(tmp_path):
+    """Plain-list files from the old writer load, and a half-written record is dropped."""
+    (tmp_path / "users.json").write_text(json.dumps([{"id": "u1", "email": "a@example.com"}], indent=4))
+    store = JsonStore(tmp_path)
+    store.insert("users", {"id": "u2", "email": "b@example.com"})
+    with open(tmp_path / "users.journal", "a") as f:
+        f.write('{"op": "insert", "doc": {"id": "u3"')
+
+    reopened = JsonStore(tmp_path)
+    assert [u["id"] for u in reopened.all("users")] == ["u1", "u2"]
+    reopened.insert("users", {"id": "u4"})
+    assert [u["id"] for u in JsonStore(tmp_path).all("users")] == ["u1", "u2", "u4"]
+
+
+def test_indexes_follow_inserts_and_updates(tmp_path):
+    """Indexed lookups see updated values and unique indexes reject duplicates."""
+    store = JsonStore(tmp_path, indexes={
+        "users": [IndexSpec("id", unique=True), IndexSpec("email", unique=True)],
+        "comments": [IndexSpec("post_id"), IndexSpec("created_at", kind="sorted")],
+    })
+    store.insert("users", {"id": "u1", "email": "a@example.com"})
+    store.update("users", {"id": "u1"}, {"$set": {"email": "b@example.com"}})
+    assert store.find_one("users", {"email": "a@example.com"}) is None
+    assert store.find_one("users", {"email": "b@example.com"})["id"] == "u1"
+    with pytest.raises(DuplicateKeyError):
+        store.insert("users", {"id": "u2", "email": "b@example.com"})
+
+    for i, ts in enumerate(["2024-01-03", "2024-01-01", "2024-01-02"]):
+        store.insert("comments", {"id": str(i), "post_id": "p1" if i != 1 else "p2", "created_at": ts})
+    assert [c["id"] for c in store.find("comments", {"post_id": "p1"}, limit=10)] == ["0", "2"]
+    newest = store.find("comments", {}, limit=2, sort=("created_at", -1))
+    assert [c["id"] for c in newest] == ["0", "2"]
+
+    reopened = JsonStore(tmp_path, indexes=store.indexes)
+    assert reopened.find_one("users", {"email": "b@example.com"})["id"] == "u1"
+    assert reopened.count("comments", {"post_id": "p1"}) == 2
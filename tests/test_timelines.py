@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import timelines
+from backend.storage import IndexSpec, JsonStore
+
+INDEXES = {timelines.COLLECTION: [IndexSpec("id", unique=True)],
+           "posts": [IndexSpec("id", unique=True), IndexSpec("author_id")]}
+
+
+def _post(store, n, author_id):
+    return store.insert("posts", {"id": f"p{n}", "author_id": author_id, "created_at": f"2024-01-01T00:00:{n:02d}"})
+
+
+def test_fan_out_pull_fallback_and_paging(tmp_path):
+    store = JsonStore(tmp_path, indexes=INDEXES)
+    old = _post(store, 1, "star")  # written before the star had an outbox
+    for n in range(2, 6):
+        timelines.publish(store, _post(store, n, "friend"), ["friend", "me"], size=3)
+    # Buffers keep only the newest `size` entries.
+    assert [item[1] for item in timelines.home(store, "me", 10, size=3)] == ["p5", "p4", "p3"]
+
+    timelines.follow(store, "me", "star", pulled=True, size=3)
+    timelines.publish(store, _post(store, 6, "star"), ["star"], size=3)
+    page = timelines.home(store, "me", 2, size=3)
+    assert [item[1] for item in page] == ["p6", "p5"]
+    rest = timelines.home(store, "me", 10, size=3, before=(page[-1][0], page[-1][1]))
+    assert [item[1] for item in rest] == ["p4", "p3", old["id"]]
+
+    timelines.unfollow(store, "me", "friend")
+    timelines.unfollow(store, "me", "star")
+    assert timelines.home(store, "me", 10, size=3) == []
+
+    # Following again backfills the author's recent posts.
+    timelines.follow(store, "me", "friend", pulled=False, size=3)
+    assert [item[1] for item in timelines.home(store, "me", 10, size=3)] == ["p5", "p4", "p3"]
+    store.close()
+    assert [item[1] for item in timelines.home(JsonStore(tmp_path, indexes=INDEXES), "me", 1, size=3)] == ["p5"]
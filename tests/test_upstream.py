@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.upstream import UpstreamCache, UpstreamError
+from tests.stubs import StubServer, json_route
+
+
+async def _fetch_many(cache: UpstreamCache, url: str, n: int):
+    try:
+        return await asyncio.gather(*(cache.get_json(url) for _ in range(n)))
+    finally:
+        await cache.close()
+
+
+def test_concurrent_misses_share_one_fetch(tmp_path):
+    """Hundreds of simultaneous cold requests cause a single upstream hit."""
+    with StubServer({"/names.json": json_route({"names": 99}, delay=0.2)}) as stub:
+        results = asyncio.run(_fetch_many(UpstreamCache(tmp_path), f"{stub.url}/names.json", 500))
+        assert all(r == {"names": 99} for r in results)
+        assert stub.hits["/names.json"] == 1
+
+
+def test_disk_cache_survives_restart_and_upstream_outage(tmp_path):
+    """A new cache instance serves what an earlier one stored, even past its TTL when upstream fails."""
+    with StubServer({"/names.json": json_route([1, 2, 3])}) as stub:
+        url = f"{stub.url}/names.json"
+        asyncio.run(_fetch_many(UpstreamCache(tmp_path), url, 1))
+        asyncio.run(_fetch_many(UpstreamCache(tmp_path), url, 1))
+        assert stub.hits["/names.json"] == 1
+
+    record = json.loads(next(tmp_path.glob("*.json")).read_text())
+    assert record["url"] == url
+    # The stub is gone now; an expired entry is still better than an error.
+    expired = UpstreamCache(tmp_path, ttl=0, stale_ttl=0, timeout=1)
+    assert asyncio.run(_fetch_many(expired, url, 1)) == [[1, 2, 3]]
+    with pytest.raises(UpstreamError):
+        asyncio.run(_fetch_many(UpstreamCache(tmp_path / "empty", timeout=1), url, 1))
+
+
+def test_stale_entry_is_served_while_refreshing(tmp_path):
+    """Within the stale window the old copy is returned at once and refreshed in the background."""
+    payload = {"version": 1}
+    with StubServer({"/data.json": lambda request: json_route(payload)(request)}) as stub:
+        url = f"{stub.url}/data.json"
+
+        async def scenario():
+            cache = UpstreamCache(tmp_path, ttl=0.05, stale_ttl=60)
+            try:
+                assert await cache.get_json(url) == {"version": 1}
+                payload["version"] = 2
+                time.sleep(0.1)
+                assert await cache.get_json(url) == {"version": 1}
+                await asyncio.sleep(0.2)
+                assert await cache.get_json(url, ttl=60) == {"version": 2}
+            finally:
+                await cache.close()
+
+        asyncio.run(scenario())
+        assert stub.hits["/data.json"] == 2
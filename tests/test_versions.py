@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import versions
+from backend.storage import IndexSpec, JsonStore
+
+
+def test_bumps_count_per_key_and_etags_follow_them(tmp_path):
+    store = JsonStore(tmp_path, indexes={versions.COLLECTION: [IndexSpec("id", unique=True)]})
+    keys = versions.keys_for("comments", [{"post_id": "p1"}, {"post_id": "p2"}, {"post_id": "p1"}])
+    assert keys == ["comments", "comments:p1", "comments:p2"]
+    assert versions.keys_for("posts", [{"id": "p1"}]) == ["posts"]
+    assert versions.keys_for("users", [{"id": "u1"}]) == ["users:u1"]
+    assert versions.keys_for("stats", [{"id": "counters"}]) == []
+
+    before = versions.etag(store, ["comments:p1"])
+    versions.bump(store, keys)
+    versions.bump(store, ["comments:p1"])
+    assert versions.current(store, ["comments", "comments:p1", "comments:p3"]) == [1, 2, 0]
+    after = versions.etag(store, ["comments:p1"])
+    assert after != before and after.startswith('W/"') and after.endswith('-2"')
+    assert versions.etag(store, ["comments:p3"]) == before  # untouched scopes keep their ETag
+
+    store.close()
+    reopened = JsonStore(tmp_path, indexes={versions.COLLECTION: [IndexSpec("id", unique=True)]})
+    assert versions.etag(reopened, ["comments:p1"]) == after
+    # A different data directory gets a different epoch, so old ETags never match it.
+    assert versions.etag(JsonStore(tmp_path / "other"), ["comments:p1"]) != before